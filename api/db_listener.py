@@ -0,0 +1,243 @@
+# api/db_listener.py
+import sys
+import os
+import json
+import signal
+import threading
+import time
+from pymongo.errors import OperationFailure
+
+# Add ml folder to path to import train_model
+ML_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../ml"))
+sys.path.append(ML_DIR)
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+import train_model
+import metrics
+from incremental_aggregates import DistrictAggregates
+from refresh_scheduler import RefreshScheduler
+
+# ------------------------
+# DB
+# ------------------------
+# Watched collections; train_model.get_db() connects on first use, from main()
+COLLECTIONS = ['patients', 'disease_cases']
+
+# Read by the web workers' /refresh_status
+STATUS_FILE = os.path.join(os.path.dirname(__file__), '../district_data/listener_status.json')
+STATUS_INTERVAL_SECONDS = float(os.getenv("LISTENER_STATUS_SECONDS", 5.0))
+# Prometheus text for the refresh pipeline, appended to the web workers' /metrics
+METRICS_FILE = os.path.join(os.path.dirname(__file__), '../district_data/listener_metrics.prom')
+# Aggregate state + resume tokens, so a restart replays only the events it missed
+CHECKPOINT_FILE = os.path.join(os.path.dirname(__file__), '../district_data/listener_checkpoint.pkl')
+CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("LISTENER_CHECKPOINT_SECONDS", 60.0))
+# The resume token is older than the oplog (ChangeStreamHistoryLost; 280 on servers before 4.4)
+HISTORY_LOST_CODES = (286, 280)
+
+EVENTS_RECEIVED = metrics.REGISTRY.counter('district_change_events_total', 'Change stream events received', ['collection'])
+EVENTS_FAILED = metrics.REGISTRY.counter('district_change_events_failed_total', 'Change stream events that could not be applied', ['collection'])
+REBUILDS = metrics.REGISTRY.counter('district_rebuilds_total', 'Full aggregate rebuilds', ['reason'])
+RESUMES = metrics.REGISTRY.counter('district_resumes_total', 'Startups resumed from a checkpoint instead of a full rebuild')
+PUBLISHES = metrics.REGISTRY.counter('district_publishes_total', 'Snapshots published from incremental aggregates')
+SCHEDULER = metrics.REGISTRY.gauge('district_refresh_scheduler', 'Refresh scheduler stats', ['field'])
+
+# ------------------------
+# Incremental aggregates
+# ------------------------
+aggregates = DistrictAggregates()
+# Generation of the last snapshot this process published
+generation = None
+started_at = time.time()
+checkpointed_at = None
+# Hospital records for the hospital index; re-read on every rebuild and restart
+hospitals = []
+
+def publish(district_data):
+    global generation
+    generation = train_model.write_district_json(district_data)
+    # Daily counts behind /district_info?from=&to=, and the /cases/cube counts
+    aggregates.write_rollup(train_model.DISTRICT_ROLLUP_PATH)
+    aggregates.write_cube(train_model.DISTRICT_CUBE_PATH)
+    aggregates.write_hospitals(train_model.HOSPITAL_INDEX_PATH, hospitals)
+    aggregates.write_alerts(train_model.ALERTS_PATH)
+
+@metrics.timed('rebuild')
+def rebuild_aggregates(reason='startup'):
+    global hospitals
+    # Full rebuild: only on startup or when the incremental state can't be trusted
+    REBUILDS.inc(reason=reason)
+    # The local snapshot catches inserts and deletes by itself, but not updates. Every
+    # rebuild here means events may have been missed (no usable checkpoint, an oplog
+    # gap, a failed consistency check), and updates may be among them, so re-download it.
+    # The watch threads keep delivering during the fetch: hold their events (and
+    # tokens) and let rebuild() replay them over the fetched state
+    aggregates.hold_events()
+    try:
+        hospitals = train_model.fetch_hospitals()
+        clustered_df, scaler, kmeans = train_model.load_and_cluster()
+        df_patients, df_cases = train_model.fetch_analytics_data(include_ids=True, reconcile=True)
+        aggregates.rebuild(df_patients, df_cases, clustered_df)
+    finally:
+        # No-op after a rebuild; after a failed fetch the old state takes the events
+        aggregates.release_events()
+    publish(aggregates.to_district_data())
+
+@metrics.timed('publish')
+def publish_aggregates():
+    # Document counts only line up once the stream has caught up with the writes
+    check_counts = refresh_scheduler.pending_events == 0
+    db = train_model.get_db()
+    if not aggregates.is_consistent(db.patients, db.disease_cases, check_counts=check_counts):
+        print("⚠️ Incremental aggregates out of sync, running full rebuild...")
+        rebuild_aggregates(reason='inconsistent')
+        return
+    PUBLISHES.inc()
+    publish(aggregates.to_district_data())
+
+# ------------------------
+# Refresh Scheduler
+# ------------------------
+refresh_scheduler = RefreshScheduler(
+    publish_aggregates,
+    window=float(os.getenv("REFRESH_WINDOW_SECONDS", 0.5)),
+    max_delay=float(os.getenv("REFRESH_MAX_DELAY_SECONDS", 5.0)),
+    name="district-json-refresh"
+)
+
+def write_status():
+    stats = refresh_scheduler.stats()
+    status = {
+        'generation': generation,
+        'pid': os.getpid(),
+        'started_at': started_at,
+        'updated_at': time.time(),
+        'events_applied': aggregates.events_applied,
+        'checkpointed_at': checkpointed_at,
+        **stats
+    }
+    tmp = STATUS_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp, STATUS_FILE)
+
+    for field, value in stats.items():
+        if value is not None:
+            SCHEDULER.set(float(value), field=field)
+    metrics.REGISTRY.write_textfile(METRICS_FILE)
+
+@metrics.timed('checkpoint')
+def write_checkpoint():
+    global checkpointed_at
+    size = aggregates.checkpoint(CHECKPOINT_FILE)
+    if size is not None:
+        metrics.BYTES_WRITTEN.inc(size, artifact='checkpoint')
+        checkpointed_at = time.time()
+
+# ------------------------
+# DB Listener
+# ------------------------
+def open_streams(resume_tokens):
+    """
+    Open a change stream per collection, resuming after the given tokens.
+    Returns None if a token has aged out of the oplog.
+    """
+    db = train_model.get_db()
+    streams = {}
+    try:
+        for name in COLLECTIONS:
+            streams[name] = db[name].watch(full_document='updateLookup', resume_after=resume_tokens.get(name))
+    except OperationFailure as e:
+        for stream in streams.values():
+            stream.close()
+        if e.code not in HISTORY_LOST_CODES:
+            raise
+        return None
+    return streams
+
+def start_streams():
+    """
+    Resume from the checkpoint when its tokens are still in the oplog; otherwise
+    open fresh streams and rebuild. The fresh streams are opened before the
+    rebuild reads the collections, so writes made during the read are replayed.
+    """
+    global hospitals
+    clustered_df, scaler, kmeans = train_model.load_and_cluster()
+    hospitals = train_model.fetch_hospitals()
+    reason = 'startup'
+    if aggregates.restore(CHECKPOINT_FILE, clustered_df) and set(aggregates.resume_tokens) == set(COLLECTIONS):
+        streams = open_streams(aggregates.resume_tokens)
+        if streams is not None:
+            print(f"⏩ Resumed from checkpoint ({aggregates.events_applied} events applied so far)")
+            RESUMES.inc()
+            publish(aggregates.to_district_data())
+            return streams
+        print("⚠️ Checkpointed resume token has aged out of the oplog, running full rebuild...")
+        reason = 'history_lost'
+    streams = open_streams({})
+    # Positions before the read: a checkpoint taken before any event still resumes from here
+    for name, stream in streams.items():
+        aggregates.advance_token(name, stream.resume_token)
+    rebuild_aggregates(reason=reason)
+    write_checkpoint()
+    return streams
+
+def watch_collection(stream, name):
+    print(f"👀 Listening for changes in {name}...")
+    with stream:
+        while stream.alive:
+            try:
+                change = stream.try_next()
+            except OperationFailure as e:
+                if e.code in HISTORY_LOST_CODES:
+                    # Fell behind the oplog: no checkpoint from here on, the restart rebuilds
+                    aggregates.mark_dirty()
+                raise
+            if change is None:
+                aggregates.advance_token(name, stream.resume_token)
+                continue
+            EVENTS_RECEIVED.inc(collection=name)
+            try:
+                aggregates.apply_change(name, change)
+            except Exception as e:
+                EVENTS_FAILED.inc(collection=name)
+                print(f"❌ Error applying change from {name}: {e}")
+            # Coalesced with the rest of the burst; the scheduler runs the write
+            refresh_scheduler.notify()
+
+def start_listener(streams):
+    threads = [
+        threading.Thread(target=watch_collection, args=(stream, name), daemon=True)
+        for name, stream in streams.items()
+    ]
+    for thread in threads:
+        thread.start()
+    print("✅ DB listener threads started.")
+    return threads
+
+def main():
+    # train_model's paths (CSV, models, district JSON) are relative to ml/
+    os.chdir(ML_DIR)
+    # kill -USR1 <pid> turns cProfile capture of each rebuild/publish on or off
+    signal.signal(signal.SIGUSR1, lambda signum, frame: metrics.toggle_profiling())
+    print("⚡ Loading district aggregates on startup...")
+    streams = start_streams()
+    print("✅ District JSON ready.")
+
+    threads = start_listener(streams)
+    try:
+        while all(thread.is_alive() for thread in threads):
+            write_status()
+            if checkpointed_at is None or time.time() - checkpointed_at >= CHECKPOINT_INTERVAL_SECONDS:
+                write_checkpoint()
+            time.sleep(STATUS_INTERVAL_SECONDS)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        refresh_scheduler.stop()
+        # Whatever was applied is kept; the next start resumes after it
+        write_checkpoint()
+    # A dead change stream means missed events: exit so the process manager restarts us
+    print("❌ DB listener thread stopped, exiting.")
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
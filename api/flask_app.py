@@ -1,92 +1,287 @@
 # api/flask_app.py
 import sys
 import os
-import threading
+import json
+import math
 import time
-from pymongo import MongoClient
-from dotenv import load_dotenv
 
-# Add ml folder to path to import train_model
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../ml")))
-import train_model
+from snapshot_cache import DistrictSnapshotCache, MappedFileCache
+import daily_rollups
+import count_cube
+import hospital_index
+import outbreak_detector
+import metrics
 
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, current_app, request, jsonify, Response, g
 from flask_cors import CORS
-import json
 
 # ------------------------
-# Load env & DB
+# Published data
 # ------------------------
-load_dotenv()
-MONGO_URI = os.getenv("MONGODB_CONNECTION_STRING")
-DB_NAME = "kerala_health_system"
+# Web workers only read what the db_listener worker (api/db_listener.py) publishes:
+# no DB connection, model fit or change stream in this process.
+DISTRICT_DATA_DIR = os.path.join(os.path.dirname(__file__), '../district_data')
+# Map every published file when the app is created instead of on first request
+WARM_UP = os.getenv("WARM_UP", "0") == "1"
 
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
-patients_col = db.patients
-disease_col = db.disease_cases
+class PublishedData:
+    """
+    Readers for everything the listener publishes in one directory. Creating
+    them opens nothing; each file is mapped on the first request that needs it.
+    """
 
-# ------------------------
-# Flask Setup
-# ------------------------
-app = Flask(__name__)
-CORS(app)
-DISTRICT_DATA_FILE = os.path.join(os.path.dirname(__file__), '../district_data/district_data.json')
+    def __init__(self, data_dir):
+        path = lambda name: os.path.join(data_dir, name)
+        self.snapshot = DistrictSnapshotCache(path('district_data.snap'), fallback_path=path('district_data.json'))
+        self.rollup = MappedFileCache(path('district_rollup.bin'), daily_rollups.RollupReader, daily_rollups.read_generation)
+        self.cube = MappedFileCache(path('district_cube.bin'), count_cube.CubeReader, count_cube.read_generation)
+        self.hospitals = MappedFileCache(path('hospitals.bin'), hospital_index.HospitalReader, hospital_index.read_generation)
+        self.alerts = MappedFileCache(path('alerts.bin'), outbreak_detector.AlertsReader, outbreak_detector.read_generation)
+        self.status_file = path('listener_status.json')
+        self.metrics_file = path('listener_metrics.prom')
 
-def load_district_data():
-    with open(DISTRICT_DATA_FILE, 'r') as f:
-        return json.load(f)
+    def warm_up(self):
+        # Also builds the summary and the hospital BallTree (importing sklearn)
+        self.snapshot.summary()
+        for cache in (self.rollup, self.cube, self.hospitals, self.alerts):
+            cache.reader()
 
-# ------------------------
-# DB Listener
-# ------------------------
-def watch_collection(collection, name):
-    print(f"👀 Listening for changes in {name}...")
-    with collection.watch() as stream:
-        for change in stream:
-            print(f"\n⚡ Change detected in {name}: {change['operationType']}")
-            try:
-                train_model.regenerate_district_json()
-                print(f"✅ District JSON updated due to change in {name}")
-            except Exception as e:
-                print(f"❌ Error regenerating district JSON: {e}")
-
-def start_listener():
-    threading.Thread(target=watch_collection, args=(patients_col, "patients"), daemon=True).start()
-    threading.Thread(target=watch_collection, args=(disease_col, "disease_cases"), daemon=True).start()
-    print("✅ DB listener threads started.")
+def published():
+    return current_app.extensions['published_data']
+
+api = Blueprint('api', __name__)
 
 # ------------------------
-# Prepopulate JSON on startup
+# Metrics
 # ------------------------
-try:
-    print("⚡ Regenerating district JSON on startup...")
-    train_model.regenerate_district_json()
-    print("✅ District JSON ready.")
-except Exception as e:
-    print(f"❌ Failed to regenerate district JSON on startup: {e}")
+# Per web worker, so labelled with its pid; the refresh pipeline's metrics come from the listener's file
+web_metrics = metrics.Registry(worker_label=True)
+REQUEST_SECONDS = web_metrics.histogram('api_request_duration_seconds', 'API request latency',
+                                        ['endpoint', 'status'])
+
+@api.before_app_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@api.after_app_request
+def record_latency(response):
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                endpoint=request.endpoint or 'unknown', status=response.status_code)
+    return response
 
-# Start listener threads
-start_listener()
 
 # ------------------------
 # Routes
 # ------------------------
-@app.route('/')
+@api.route('/')
 def home():
     return jsonify({"message": "API alive. No sugar-coating, only raw power."})
 
-@app.route('/district_info', methods=['GET'])
+@api.route('/district_info', methods=['GET'])
 def get_district_info():
-    district = request.args.get('district')
-    if not district:
+    districts = request.args.getlist('district')
+    if not districts or not all(districts):
         return jsonify({"error": "Missing 'district' query parameter"}), 400
 
-    district_data = load_district_data()
-    if district not in district_data:
-        return jsonify({"error": f"No data found for district '{district}'"}), 404
+    if any(param in request.args for param in ('from', 'to', 'days')):
+        return district_range_response(districts)
+
+    if not published().snapshot.available():
+        return jsonify({"error": "District data is not available yet"}), 503
+
+    if len(districts) == 1:
+        district = districts[0]
+        entry = published().snapshot.get(district)
+        if entry is None:
+            return jsonify({"error": f"No data found for district '{district}'"}), 404
+        return district_response(entry)
+
+    # Batch mode: ?district=A&district=B -> {"A": {...}, "B": {...}}
+    entries = published().snapshot.get_many(dict.fromkeys(districts))
+    missing = [district for district, entry in entries.items() if entry is None]
+    if missing:
+        return jsonify({"error": f"No data found for districts {missing}"}), 404
+    body = b'{' + b','.join(json.dumps(d).encode() + b':' + e.body for d, e in entries.items()) + b'}'
+    return Response(body, mimetype='application/json')
+
+def district_range_response(districts):
+    # ?from=YYYY-MM-DD&to=YYYY-MM-DD (inclusive), or ?days=N ending at `to` / the latest admission day
+    reader = published().rollup.reader()
+    if reader is None:
+        return jsonify({"error": "Date-range data is not available yet"}), 503
+    try:
+        to_day = daily_rollups.date_to_day(request.args['to']) if 'to' in request.args else None
+        from_day = daily_rollups.date_to_day(request.args['from']) if 'from' in request.args else None
+        days = int(request.args['days']) if 'days' in request.args else None
+        if days is not None and days < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "'from'/'to' must be YYYY-MM-DD and 'days' a positive integer"}), 400
+
+    last_day = to_day if to_day is not None else reader.last_day
+    if last_day is None:
+        # Nothing admitted yet: every range is empty
+        first_day = last_day = 0
+    elif days is not None:
+        first_day = last_day - days + 1
+    else:
+        first_day = from_day if from_day is not None else reader.first_day
+    if first_day > last_day:
+        return jsonify({"error": "'from' is after 'to'"}), 400
+
+    summaries = {district: reader.district_summary(district, first_day, last_day) for district in dict.fromkeys(districts)}
+    missing = [district for district, summary in summaries.items() if summary is None]
+    if missing:
+        return jsonify({"error": f"No data found for districts {missing}"}), 404
+    body = summaries[districts[0]] if len(summaries) == 1 else summaries
+    return Response(json.dumps(body, separators=(',', ':')), mimetype='application/json')
+
+@api.route('/cases/cube', methods=['GET'])
+def get_case_counts():
+    """
+    Filter and group the case count cube, e.g.
+    /cases/cube?district=Ernakulam&disease=Dengue&migrant=true&severity=Severe&by=hospital
+    Every dimension (and disease 'category') takes one or more values; 'by' takes
+    any subset of dimensions, repeated or comma-separated.
+    """
+    reader = published().cube.reader()
+    if reader is None:
+        return jsonify({"error": "Case counts are not available yet"}), 503
+
+    by = [dim for value in request.args.getlist('by') for dim in value.split(',') if dim]
+    unknown = [dim for dim in by if dim not in count_cube.DIMENSIONS]
+    if unknown or len(set(by)) != len(by):
+        return jsonify({"error": f"'by' must be distinct dimensions from {count_cube.DIMENSIONS}"}), 400
+
+    filters = {}
+    for dim in count_cube.DIMENSIONS + ['category']:
+        values = request.args.getlist(dim)
+        if not values:
+            continue
+        if dim == 'migrant':
+            values = [value if value == count_cube.UNKNOWN else value.lower() in ('true', '1', 'yes')
+                      for value in values]
+        # 'true' and 'yes' are the same filter value
+        filters[dim] = list(dict.fromkeys(values))
+
+    total, rows = reader.query(filters, by)
+    return jsonify({"filters": filters, "by": by, "total": total, "rows": rows})
+
+@api.route('/hospitals/nearest', methods=['GET'])
+def get_nearest_hospitals():
+    # ?lat=&lon=&k= -> the k closest hospitals with distance and latest monthly load
+    reader = published().hospitals.reader()
+    if reader is None:
+        return jsonify({"error": "Hospital data is not available yet"}), 503
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        k = int(request.args.get('k', 5))
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 1 <= k <= 100):
+            raise ValueError
+    except (KeyError, ValueError):
+        return jsonify({"error": "'lat'/'lon' must be valid coordinates and 'k' an integer from 1 to 100"}), 400
+    return jsonify({"lat": lat, "lon": lon, "hospitals": reader.nearest(lat, lon, k)})
+
+@api.route('/hospitals/utilization', methods=['GET'])
+def get_hospital_utilization():
+    # ?month=YYYY-MM (default: latest)&min_ratio=1.0&limit=N -> hospitals at or over min_ratio of capacity
+    reader = published().hospitals.reader()
+    if reader is None:
+        return jsonify({"error": "Hospital data is not available yet"}), 503
+    month = request.args.get('month', reader.latest_month)
+    try:
+        min_ratio = float(request.args.get('min_ratio', 1.0))
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+        # float() also parses 'nan' and 'inf'
+        if not math.isfinite(min_ratio) or (limit is not None and limit < 1):
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "'min_ratio' must be a finite number and 'limit' a positive integer"}), 400
+    hospitals = reader.overloaded(month, min_ratio, limit) if month is not None else None
+    if hospitals is None:
+        return jsonify({"error": f"No admissions recorded for month '{month}'"}), 404
+    return jsonify({"month": month, "min_ratio": min_ratio, "hospitals": hospitals})
+
+@api.route('/alerts', methods=['GET'])
+def get_alerts():
+    # Currently anomalous district x disease series; optional ?district=&disease= filters (repeatable)
+    reader = published().alerts.reader()
+    if reader is None:
+        return jsonify({"error": "Outbreak alerts are not available yet"}), 503
+    districts = set(request.args.getlist('district'))
+    diseases = set(request.args.getlist('disease'))
+    alerts = [alert for alert in reader.alerts
+              if (not districts or alert['district'] in districts) and (not diseases or alert['disease'] in diseases)]
+    return jsonify({"latest_date": reader.latest_date, "alerts": alerts})
+
+@api.route('/districts/summary', methods=['GET'])
+def get_districts_summary():
+    # Totals and severity for every district in one precomputed response
+    if not published().snapshot.available():
+        return jsonify({"error": "District data is not available yet"}), 503
+    return district_response(published().snapshot.summary())
+
+def district_response(entry):
+    # Body bytes, gzip/msgpack variants and ETag are built once per snapshot generation
+    use_msgpack = entry.msgpack_body is not None and 'application/msgpack' in request.headers.get('Accept', '')
+    use_gzip = not use_msgpack and 'gzip' in request.headers.get('Accept-Encoding', '')
+    # Each representation gets its own strong ETag: their bytes differ
+    etag = entry.etag + ('-msgpack' if use_msgpack else '-gzip' if use_gzip else '')
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif use_msgpack:
+        response = Response(entry.msgpack_body, mimetype='application/msgpack')
+    elif use_gzip:
+        response = Response(entry.gzip_body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(entry.body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    return response
+
+@api.route('/refresh_status', methods=['GET'])
+def get_refresh_status():
+    try:
+        with open(published().status_file) as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return jsonify({"error": "DB listener status not available"}), 503
+    return jsonify(status), 200
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    body = web_metrics.render()
+    try:
+        with open(published().metrics_file) as f:
+            body += f.read()
+    except OSError:
+        pass
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+# ------------------------
+# App factory
+# ------------------------
+def create_app(data_dir=DISTRICT_DATA_DIR, warm_up=WARM_UP):
+    """
+    Build an app serving the files published in `data_dir`. Nothing is opened
+    unless warm_up is set (worth it in a gunicorn --preload master, so forked
+    workers share the mappings and the imported libraries).
+    """
+    app = Flask(__name__)
+    CORS(app)
+    app.extensions['published_data'] = PublishedData(data_dir)
+    app.register_blueprint(api)
+    if warm_up:
+        app.extensions['published_data'].warm_up()
+    return app
 
-    return jsonify(district_data[district]), 200
+# gunicorn api.flask_app:app
+app = create_app()
 
 # ------------------------
 # Run Server
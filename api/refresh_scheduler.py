@@ -0,0 +1,152 @@
+# api/refresh_scheduler.py
+import threading
+import time
+
+class RefreshScheduler:
+    """
+    Debounces change events into refreshes.
+    Events arriving within `window` seconds of each other are coalesced into one
+    refresh (forced after `max_delay` seconds of sustained load). A single worker
+    thread runs the refreshes, so at most one is in flight and everything that
+    arrives meanwhile collapses into one trailing refresh. A refresh that raises
+    puts its events back in the queue and is retried after an exponential
+    backoff (`retry_backoff` doubling up to `max_backoff` seconds).
+    The thread is started by the first notify(), so constructing one (e.g. at
+    module import) has no side effects.
+    """
+
+    def __init__(self, refresh_fn, window=0.5, max_delay=5.0, name="refresh", retry_backoff=1.0, max_backoff=60.0):
+        self.refresh_fn = refresh_fn
+        self.window = window
+        self.max_delay = max_delay
+        self.name = name
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._first_event_at = None
+        self._last_event_at = None
+        self._in_flight = False
+        self._stopped = False
+        # No refresh before this monotonic time (set after a failure)
+        self._retry_at = 0.0
+
+        self.events_received = 0
+        self.events_coalesced = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_latency = None
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+        self._thread = None
+
+    @property
+    def pending_events(self):
+        return self._pending
+
+    def notify(self, count=1):
+        """
+        Record `count` change events. Never blocks on the refresh itself.
+        """
+        with self._cond:
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            now = time.monotonic()
+            if self._pending == 0:
+                self._first_event_at = now
+            self._pending += count
+            self._last_event_at = now
+            self.events_received += count
+            self._cond.notify_all()
+
+    def _wait_for_batch(self):
+        with self._cond:
+            while not self._stopped:
+                if self._pending == 0:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                quiet_until = self._last_event_at + self.window
+                deadline = self._first_event_at + self.max_delay
+                due = max(min(quiet_until, deadline), self._retry_at)
+                if now >= due:
+                    batch, self._pending = self._pending, 0
+                    self._in_flight = True
+                    return batch
+                self._cond.wait(due - now)
+            return 0
+
+    def _run(self):
+        while True:
+            batch = self._wait_for_batch()
+            if not batch:
+                return
+            start = time.perf_counter()
+            error = None
+            try:
+                self.refresh_fn()
+            except Exception as e:
+                error = e
+            latency = time.perf_counter() - start
+
+            with self._cond:
+                self._in_flight = False
+                self.refreshes += 1
+                if error is None:
+                    self.consecutive_failures = 0
+                    self._retry_at = 0.0
+                    self.events_coalesced += batch - 1
+                else:
+                    # Put the batch back so its events still get a refresh
+                    self.failures += 1
+                    self.consecutive_failures += 1
+                    delay = min(self.retry_backoff * 2 ** (self.consecutive_failures - 1), self.max_backoff)
+                    self._retry_at = time.monotonic() + delay
+                    if self._pending == 0:
+                        self._first_event_at = self._last_event_at = time.monotonic()
+                    self._pending += batch
+                    print(f"❌ {self.name} failed: {error}; retrying in {delay:.1f}s")
+                self.last_latency = latency
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Block until every event received so far has been covered by a refresh.
+        False on timeout, or if the scheduler was stopped with events still pending.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                if self._stopped and not self._in_flight:
+                    return False
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queue_depth': self._pending,
+                'in_flight': self._in_flight,
+                'events_received': self.events_received,
+                'events_coalesced': self.events_coalesced,
+                'refreshes': self.refreshes,
+                'failures': self.failures,
+                'consecutive_failures': self.consecutive_failures,
+                'last_latency_seconds': self.last_latency,
+                'avg_latency_seconds': self.total_latency / self.refreshes if self.refreshes else None,
+                'max_latency_seconds': self.max_latency
+            }
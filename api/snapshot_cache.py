@@ -0,0 +1,162 @@
+# api/snapshot_cache.py
+import json
+import gzip
+import hashlib
+import threading
+from district_snapshot import SnapshotReader, JsonSnapshotReader, SnapshotFormatError, read_generation
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Same cut-offs the map uses for marker colors
+SEVERITY_THRESHOLDS = [(2500, 'low'), (4500, 'medium')]
+
+def get_severity(total_cases):
+    for limit, severity in SEVERITY_THRESHOLDS:
+        if total_cases < limit:
+            return severity
+    return 'high'
+
+class DistrictEntry:
+    """
+    Pre-serialized response for one district: compact JSON, its gzip variant
+    and (when msgpack is installed) a msgpack encoding.
+    """
+    __slots__ = ('body', 'gzip_body', 'msgpack_body', 'etag')
+
+    def __init__(self, body, data=None):
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+        if msgpack is not None:
+            self.msgpack_body = msgpack.packb(json.loads(body) if data is None else data)
+        else:
+            self.msgpack_body = None
+        self.etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(json.dumps(data, separators=(',', ':')).encode(), data)
+
+class _Generation:
+    __slots__ = ('reader', 'entries', 'summary')
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.entries = {}
+        self.summary = None
+
+class DistrictSnapshotCache:
+    """
+    Read-through cache over the memory-mapped district snapshot.
+    Each request polls the generation in the snapshot header; when it moves, the
+    new file is mapped and the old entries are dropped. A district's entry is
+    built the first time it is asked for in a generation, from just its own bytes.
+    Until a snapshot is published the districts come from `fallback_path`
+    (district_data.json), read once.
+    """
+
+    def __init__(self, path, fallback_path=None):
+        self.path = path
+        self.fallback_path = fallback_path
+        self._lock = threading.Lock()
+        self._current = _Generation(None)
+        self._fallback_tried = False
+
+    def _load_fallback(self):
+        with self._lock:
+            if self._current.reader is None and not self._fallback_tried:
+                self._fallback_tried = True
+                try:
+                    self._current = _Generation(JsonSnapshotReader(self.fallback_path))
+                except (OSError, ValueError) as e:
+                    print(f"⚠️ No district snapshot and '{self.fallback_path}' is unreadable: {e}")
+            return self._current
+
+    def _generation(self):
+        current = self._current
+        on_disk = read_generation(self.path)
+        if on_disk is None and current.reader is None and self.fallback_path is not None:
+            return self._load_fallback()
+        loaded = current.reader.generation if current.reader is not None else None
+        if on_disk == loaded or on_disk is None:
+            return current
+        with self._lock:
+            current = self._current
+            if current.reader is None or current.reader.generation != on_disk:
+                try:
+                    reader = SnapshotReader(self.path)
+                except (FileNotFoundError, SnapshotFormatError):
+                    return current
+                # The old mapping is released once in-flight requests drop it
+                current = self._current = _Generation(reader)
+        return current
+
+    def _entry(self, current, district):
+        entry = current.entries.get(district)
+        if entry is None and current.reader is not None:
+            body = current.reader.raw(district)
+            if body is not None:
+                entry = current.entries[district] = DistrictEntry(body)
+        return entry
+
+    def _build_summary(self, reader):
+        summary = {}
+        for district in (reader.districts() if reader is not None else []):
+            diseases = reader.get(district).get('disease_summary', {})
+            total_cases = sum(d['cases'] for d in diseases.values())
+            summary[district] = {
+                'total_cases': total_cases,
+                'severity': get_severity(total_cases),
+                'top_disease': max(diseases, key=lambda d: diseases[d]['cases']) if diseases else None
+            }
+        return DistrictEntry.from_data(summary)
+
+    def available(self):
+        """
+        False until there is a published snapshot (or a readable fallback) to serve.
+        """
+        return self._generation().reader is not None
+
+    def summary(self):
+        current = self._generation()
+        if current.summary is None:
+            current.summary = self._build_summary(current.reader)
+        return current.summary
+
+    def get(self, district):
+        return self._entry(self._generation(), district)
+
+    def get_many(self, districts):
+        """
+        Entries for several districts from one generation; unknown names map to None.
+        """
+        current = self._generation()
+        return {district: self._entry(current, district) for district in districts}
+
+class MappedFileCache:
+    """
+    Current reader for a published framed file (daily rollup, count cube),
+    re-mapped when the generation in its header moves.
+    """
+
+    def __init__(self, path, reader_class, read_generation):
+        self.path = path
+        self.reader_class = reader_class
+        self.read_generation = read_generation
+        self._lock = threading.Lock()
+        self._reader = None
+
+    def reader(self):
+        reader = self._reader
+        on_disk = self.read_generation(self.path)
+        if on_disk is None or (reader is not None and reader.generation == on_disk):
+            return reader
+        with self._lock:
+            if self._reader is None or self._reader.generation != on_disk:
+                try:
+                    self._reader = self.reader_class(self.path)
+                except (FileNotFoundError, ValueError):
+                    pass
+            return self._reader
@@ -0,0 +1,129 @@
+# test_db_listener.py
+import os
+import tempfile
+import contextlib
+import pandas as pd
+import pytest
+
+import db_listener
+import train_model
+from incremental_aggregates import DistrictAggregates
+from bench_analyze import make_synthetic_data
+
+CLUSTERED_CSV = os.path.join(db_listener.ML_DIR, "../data/kerala_clustered_districts.csv")
+
+class FakeStream:
+    # What start_streams needs from a change stream before the watch threads start
+    def __init__(self, name):
+        self.resume_token = {'_data': f"{name}-start"}
+
+@contextlib.contextmanager
+def listener(db, workdir):
+    """
+    db_listener wired to `db` (mongomock) with every published file, the local
+    snapshot and the checkpoint under `workdir`. Change streams are faked:
+    mongomock has no watch().
+    """
+    clustered_df = pd.read_csv(CLUSTERED_CSV)
+    with pytest.MonkeyPatch.context() as mp:
+        # Registered first so the database binding is put back too
+        mp.setattr(train_model, '_db', train_model._db)
+        mp.setattr(train_model.patients_snapshot, 'collection', train_model.patients_snapshot.collection)
+        mp.setattr(train_model.cases_snapshot, 'collection', train_model.cases_snapshot.collection)
+        train_model.use_database(db)
+        mp.setattr(train_model, 'LOCAL_SNAPSHOT', True)
+        mp.setattr(train_model.patients_snapshot, 'root', os.path.join(workdir, 'snapshot', 'patients'))
+        mp.setattr(train_model.cases_snapshot, 'root', os.path.join(workdir, 'snapshot', 'disease_cases'))
+        for name in ('DISTRICT_JSON_PATH', 'DISTRICT_SNAPSHOT_PATH', 'DISTRICT_ROLLUP_PATH',
+                     'DISTRICT_CUBE_PATH', 'HOSPITAL_INDEX_PATH', 'ALERTS_PATH'):
+            mp.setattr(train_model, name, os.path.join(workdir, os.path.basename(getattr(train_model, name))))
+        # The tracked models are never loaded (or refit) by a test
+        mp.setattr(train_model, 'load_and_cluster', lambda: (clustered_df, None, None))
+        mp.setattr(db_listener, 'CHECKPOINT_FILE', os.path.join(workdir, 'listener_checkpoint.pkl'))
+        mp.setattr(db_listener, 'open_streams', lambda tokens: {name: FakeStream(name) for name in db_listener.COLLECTIONS})
+        mp.setattr(db_listener, 'aggregates', DistrictAggregates())
+        yield mp, clustered_df
+
+def seed_db(n_cases=300):
+    import mongomock
+    db = mongomock.MongoClient().kerala_health_test
+    df_patients, df_cases = make_synthetic_data(n_cases, list(pd.read_csv(CLUSTERED_CSV)['district']))
+    db.patients.insert_many(df_patients.to_dict('records'))
+    db.disease_cases.insert_many(df_cases.to_dict('records'))
+    return db
+
+def expected_district_data(db, clustered_df):
+    df_patients = pd.DataFrame(list(db.patients.find({}, {'_id': 0})))
+    df_cases = pd.DataFrame(list(db.disease_cases.find({}, {'_id': 0})))
+    return train_model.analyze_disease_patterns(df_patients, df_cases, clustered_df)
+
+def test_restart_after_dirty_exit_picks_up_updates():
+    pytest.importorskip("mongomock")
+    db = seed_db()
+    with tempfile.TemporaryDirectory() as workdir, listener(db, workdir) as (mp, clustered_df):
+        db_listener.start_streams()
+        assert os.path.exists(db_listener.CHECKPOINT_FILE)
+
+        # An old document (below the snapshot watermark) changes while the stream is down
+        patient = db.patients.find_one({'patient_id': 'KL00000001'})
+        district = next(d for d in clustered_df['district'] if d != patient['district'])
+        db.patients.update_one({'_id': patient['_id']}, {'$set': {'district': district, 'gender': 'Other'}})
+        db_listener.aggregates.mark_dirty()
+        db_listener.write_checkpoint()
+        assert not os.path.exists(db_listener.CHECKPOINT_FILE)
+
+        # Restart: no checkpoint to resume from
+        mp.setattr(db_listener, 'aggregates', DistrictAggregates())
+        db_listener.start_streams()
+        assert db_listener.aggregates.patient_info['KL00000001'][::2] == (district, 'Other')
+        assert db_listener.aggregates.to_district_data() == expected_district_data(db, clustered_df)
+
+def change(op, doc_id, doc=None, token=None):
+    event = {'_id': token, 'operationType': op, 'documentKey': {'_id': doc_id}}
+    if doc is not None:
+        event['fullDocument'] = doc
+    return event
+
+def test_events_during_a_rebuild_are_replayed():
+    pytest.importorskip("mongomock")
+    db = seed_db()
+    with tempfile.TemporaryDirectory() as workdir, listener(db, workdir) as (mp, clustered_df):
+        db_listener.start_streams()
+        aggregates = db_listener.aggregates
+        fetch = train_model.fetch_analytics_data
+
+        def fetch_then_write(**kwargs):
+            # Writes land after the fetch has read the collections; their events arrive meanwhile
+            frames = fetch(**kwargs)
+            old = db.patients.find_one({'patient_id': 'KL00000002'})
+            db.patients.update_one({'_id': old['_id']}, {'$set': {'gender': 'Other'}})
+            patient = {'patient_id': 'KL99999999', 'age': 70, 'gender': 'Female', 'district': old['district']}
+            case = {'patient_id': 'KL99999999', 'district': old['district'], 'disease_name': 'Nipah'}
+            # A second case inserted and deleted again before the rebuild finishes
+            temporary = dict(case)
+            db.patients.insert_one(patient)
+            db.disease_cases.insert_one(case)
+            db.disease_cases.insert_one(temporary)
+            db.disease_cases.delete_one({'_id': temporary['_id']})
+            aggregates.apply_change('patients', change('update', old['_id'], db.patients.find_one({'_id': old['_id']}), 'p-1'))
+            aggregates.apply_change('patients', change('insert', patient['_id'], patient, 'p-2'))
+            aggregates.apply_change('disease_cases', change('insert', case['_id'], case, 'c-1'))
+            aggregates.apply_change('disease_cases', change('insert', temporary['_id'], temporary, 'c-2'))
+            aggregates.apply_change('disease_cases', change('delete', temporary['_id'], token='c-3'))
+            aggregates.advance_token('patients', 'p-3')
+            return frames
+
+        mp.setattr(train_model, 'fetch_analytics_data', fetch_then_write)
+        db_listener.rebuild_aggregates(reason='inconsistent')
+
+        assert not aggregates.dirty
+        assert aggregates.resume_tokens == {'patients': 'p-3', 'disease_cases': 'c-3'}
+        assert aggregates.to_district_data() == expected_district_data(db, clustered_df)
+        nipah = db.disease_cases.find_one({'disease_name': 'Nipah'})
+        assert aggregates.to_district_data()[nipah['district']]['disease_summary']['Nipah']['cases'] == 1
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,72 @@
+# test_refresh_scheduler.py
+import time
+import threading
+from refresh_scheduler import RefreshScheduler
+
+def test_coalesces_a_burst():
+    calls = []
+    scheduler = RefreshScheduler(lambda: calls.append(1), window=0.05)
+    for _ in range(100):
+        scheduler.notify()
+    assert scheduler.flush(5)
+    assert len(calls) == 1
+    assert scheduler.stats()['events_coalesced'] == 99
+    scheduler.stop()
+
+def test_events_during_a_refresh_get_one_trailing_refresh():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+
+    scheduler = RefreshScheduler(refresh, window=0.01)
+    scheduler.notify()
+    assert started.wait(5)
+    for _ in range(10):
+        scheduler.notify()
+    release.set()
+    assert scheduler.flush(5)
+    assert len(calls) == 2
+    scheduler.stop()
+
+def test_failed_refresh_is_retried_with_backoff():
+    calls = []
+
+    def refresh():
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            raise RuntimeError("publish failed")
+
+    scheduler = RefreshScheduler(refresh, window=0.01, retry_backoff=0.05)
+    scheduler.notify(5)
+    assert scheduler.flush(5)
+    stats = scheduler.stats()
+    assert len(calls) == 3
+    assert stats['failures'] == 2 and stats['consecutive_failures'] == 0
+    assert stats['queue_depth'] == 0 and stats['events_coalesced'] == 4
+    # 0.05s, then 0.1s
+    assert calls[1] - calls[0] >= 0.05 and calls[2] - calls[1] >= 0.1
+    scheduler.stop()
+
+def test_flush_returns_when_stopped_with_pending_events():
+    scheduler = RefreshScheduler(lambda: None, window=60)
+    scheduler.notify()
+    scheduler.stop()
+    start = time.monotonic()
+    assert scheduler.flush() is False
+    assert time.monotonic() - start < 1
+
+def test_construction_starts_no_thread():
+    scheduler = RefreshScheduler(lambda: None)
+    assert scheduler._thread is None
+    assert scheduler.flush(0.1)
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
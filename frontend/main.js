@@ -5,19 +5,21 @@ L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
   attribution: '&copy; OpenStreetMap contributors'
 }).addTo(map);
 
-// Function to calculate total cases for a district and return color
-function calculateSeverityColor(diseaseSummary) {
-  const totalCases = Object.values(diseaseSummary)
-    .reduce((sum, disease) => sum + disease.cases, 0);
-
-  if (totalCases < 2500) return '#2ecc71';       // low risk - blue
-  else if (totalCases < 4500) return '#f39c12'; // medium risk - orange
-  else return '#e74c3c';                         // high risk - red
-}
+const API_BASE = 'http://127.0.0.1:5000';
+
+// Severity buckets are precomputed by the API (/districts/summary)
+const SEVERITY_COLORS = {
+  low: '#2ecc71',     // low risk - green
+  medium: '#f39c12',  // medium risk - orange
+  high: '#e74c3c'     // high risk - red
+};
+
+// District details already fetched, so a second click doesn't hit the API again
+const districtInfoCache = new Map();
 
 // Create radar marker as a divIcon
-function createRadarMarker(latlng, district, diseaseSummary) {
-  const color = calculateSeverityColor(diseaseSummary);
+function createRadarMarker(latlng, district, severity) {
+  const color = SEVERITY_COLORS[severity] || SEVERITY_COLORS.low;
 
   const html = `
     <div class="radar-marker">
@@ -39,28 +41,37 @@ function createRadarMarker(latlng, district, diseaseSummary) {
   return marker;
 }
 
-// Load GeoJSON and add colored radar markers
-fetch('kerala_districts.geojson')
-  .then(res => res.json())
-  .then(data => {
-    data.features.forEach(feature => {
-      const coords = [feature.geometry.coordinates[1], feature.geometry.coordinates[0]];
-      const district = feature.properties.district;
-
-      // Fetch disease info to decide marker color
-      fetch(`http://127.0.0.1:5000/district_info?district=${district}`)
-        .then(res => res.json())
-        .then(data => {
-          const diseaseSummary = data.disease_summary || {};
-          const marker = createRadarMarker(coords, district, diseaseSummary);
-          marker.addTo(map);
-        })
-        .catch(() => {
-          const marker = createRadarMarker(coords, district, {}); // default blue if fetch fails
-          marker.addTo(map);
-        });
-    });
+// Load GeoJSON and the per-district summary (one request) and add colored radar markers
+Promise.all([
+  fetch('kerala_districts.geojson').then(res => res.json()),
+  fetch(`${API_BASE}/districts/summary`)
+    .then(res => res.json())
+    .catch(() => ({})) // default green if fetch fails
+]).then(([geojson, summary]) => {
+  geojson.features.forEach(feature => {
+    const coords = [feature.geometry.coordinates[1], feature.geometry.coordinates[0]];
+    const district = feature.properties.district;
+    const severity = summary[district] ? summary[district].severity : 'low';
+    createRadarMarker(coords, district, severity).addTo(map);
   });
+});
+
+function getDistrictInfo(district) {
+  if (!districtInfoCache.has(district)) {
+    const request = fetch(`${API_BASE}/district_info?district=${encodeURIComponent(district)}`)
+      .then(res => res.json())
+      .then(data => {
+        if (data.error) districtInfoCache.delete(district);
+        return data;
+      })
+      .catch(err => {
+        districtInfoCache.delete(district);
+        throw err;
+      });
+    districtInfoCache.set(district, request);
+  }
+  return districtInfoCache.get(district);
+}
 
 // Fetch district info from API and display in widget
 function fetchDistrictInfo(district) {
@@ -72,8 +83,7 @@ function fetchDistrictInfo(district) {
     infoDiv.classList.add('show');
   }, 10);
 
-  fetch(`http://127.0.0.1:5000/district_info?district=${district}`)
-    .then(res => res.json())
+  getDistrictInfo(district)
     .then(data => {
       if(data.error) {
         infoDiv.innerHTML = `<button class="close-btn" onclick="closeDistrictInfo()">&times;</button><strong>${district}</strong>: ${data.error}`;
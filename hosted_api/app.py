@@ -1,35 +1,223 @@
 # hosted_api/app.py
-from flask import Flask, send_from_directory, request, jsonify
+from flask import Flask, request, jsonify, Response
+from concurrent.futures import Future
+from requests.adapters import HTTPAdapter
+from werkzeug.http import unquote_etag
 import requests
+import threading
+import mimetypes
+import hashlib
+import gzip
+import time
+import re
 import os
 
-app = Flask(__name__, static_folder='../frontend', static_url_path='/')
+FRONTEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../frontend'))
+# Static files go through serve_static (precompressed, versioned), not Flask's static route
+app = Flask(__name__, static_folder=None)
+
+INTERNAL_API_URL = os.environ.get('INTERNAL_API_URL', 'http://127.0.0.1:5000')
+# (connect, read) seconds for calls to the internal API
+UPSTREAM_TIMEOUT = (float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 2.0)),
+                    float(os.environ.get('UPSTREAM_READ_TIMEOUT', 10.0)))
+# Upstream responses are reused for this long; the internal API publishes at most every few seconds anyway
+PROXY_CACHE_TTL = float(os.environ.get('PROXY_CACHE_TTL_SECONDS', 5.0))
+PROXY_CACHE_MAX_ENTRIES = 1024
+# Versioned assets (?v=<content hash>) never change, so browsers may keep them for a year
+STATIC_MAX_AGE = 365 * 24 * 3600
+PASSTHROUGH_HEADERS = ('Content-Type', 'Content-Encoding', 'ETag', 'Vary')
+
+# One keep-alive pool shared by every request thread
+session = requests.Session()
+session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=int(os.environ.get('UPSTREAM_POOL_SIZE', 32))))
+
+# ------------------------
+# Upstream cache + single-flight
+# ------------------------
+class UpstreamResponse:
+    __slots__ = ('status', 'body', 'headers', 'expires')
+
+    def __init__(self, status, body, headers):
+        self.status = status
+        self.body = body
+        self.headers = headers
+        self.expires = time.monotonic() + PROXY_CACHE_TTL
+
+_cache = {}
+_in_flight = {}
+_cache_lock = threading.Lock()
+
+def _fetch_upstream(path, params, accept):
+    # Always ask for gzip and keep the body compressed; it is passed on as is
+    resp = session.get(INTERNAL_API_URL + path, params=params, timeout=UPSTREAM_TIMEOUT, stream=True,
+                       headers={'Accept': accept, 'Accept-Encoding': 'gzip'})
+    with resp:
+        body = resp.raw.read(decode_content=False)
+    headers = {name: resp.headers[name] for name in PASSTHROUGH_HEADERS if name in resp.headers}
+    return UpstreamResponse(resp.status_code, body, headers)
+
+def get_upstream(path, params, accept):
+    """
+    Cached upstream response for (path, params, accept).
+    Concurrent misses for the same key share one upstream call.
+    """
+    key = (path, params, accept)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached.expires > time.monotonic():
+            return cached
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+
+    if not leader:
+        return future.result()
+
+    try:
+        result = _fetch_upstream(path, params, accept)
+    except BaseException as e:
+        with _cache_lock:
+            _in_flight.pop(key, None)
+        future.set_exception(e)
+        raise
+    with _cache_lock:
+        # Server errors are retried by the next request instead of being cached
+        if result.status < 500:
+            if len(_cache) >= PROXY_CACHE_MAX_ENTRIES:
+                _cache.clear()
+            _cache[key] = result
+        _in_flight.pop(key, None)
+    future.set_result(result)
+    return result
+
+def proxy(path, params):
+    accept = 'application/msgpack' if 'application/msgpack' in request.headers.get('Accept', '') else 'application/json'
+    try:
+        upstream = get_upstream(path, params, accept)
+    except requests.exceptions.RequestException as e:
+        return jsonify({'error': f'Failed to reach internal API: {e}'}), 502
+
+    headers = dict(upstream.headers)
+    body = upstream.body
+    decompress = headers.get('Content-Encoding') == 'gzip' and 'gzip' not in request.headers.get('Accept-Encoding', '')
+    if decompress and 'ETag' in headers:
+        # The internal API tags its gzip body '<etag>-gzip'; the identity body is '<etag>'
+        headers['ETag'] = headers['ETag'].replace('-gzip"', '"')
+    etag = headers.get('ETag')
+    if upstream.status == 200 and etag and request.if_none_match.contains(unquote_etag(etag)[0]):
+        return Response(status=304, headers={'ETag': etag, 'Vary': headers.get('Vary', 'Accept-Encoding')})
+    if decompress:
+        body = gzip.decompress(body)
+        del headers['Content-Encoding']
+    return Response(body, status=upstream.status, headers=headers)
+
+# ------------------------
+# Static files
+# ------------------------
+class StaticAsset:
+    __slots__ = ('mtime_ns', 'body', 'gzip_body', 'mimetype', 'version', 'deps')
+
+    def __init__(self, path, mtime_ns):
+        with open(path, 'rb') as f:
+            self.body = f.read()
+        self.mtime_ns = mtime_ns
+        self.gzip_body = gzip.compress(self.body, compresslevel=9)
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if path.endswith('.geojson'):
+            self.mimetype = 'application/geo+json'
+        self.version = hashlib.blake2b(self.body, digest_size=8).hexdigest()
+        self.deps = {}
+
+_assets = {}
+LOCAL_ASSET_RE = re.compile(r'(src|href)="(?!https?:|//)([^"?#]+)"')
+
+def get_asset(name):
+    """
+    Asset bytes plus a gzip variant, built once per file version.
+    """
+    path = os.path.abspath(os.path.join(FRONTEND_DIR, name))
+    if not path.startswith(FRONTEND_DIR + os.sep):
+        return None
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    asset = _assets.get(path)
+    if asset is None or asset.mtime_ns != mtime_ns or _deps_changed(asset):
+        if name == 'index.html':
+            asset = _build_index(path, mtime_ns)
+        else:
+            asset = StaticAsset(path, mtime_ns)
+        _assets[path] = asset
+    return asset
+
+def _deps_changed(asset):
+    for name, version in asset.deps.items():
+        dep = get_asset(name)
+        if dep is None or dep.version != version:
+            return True
+    return False
+
+def _build_index(path, mtime_ns):
+    # Point index.html at versioned asset URLs so they can be cached for good
+    asset = StaticAsset(path, mtime_ns)
+    def versioned(match):
+        target = get_asset(match.group(2))
+        if target is None:
+            return match.group(0)
+        asset.deps[match.group(2)] = target.version
+        return f'{match.group(1)}="{match.group(2)}?v={target.version}"'
+    asset.body = LOCAL_ASSET_RE.sub(versioned, asset.body.decode()).encode()
+    asset.gzip_body = gzip.compress(asset.body, compresslevel=9)
+    asset.version = hashlib.blake2b(asset.body, digest_size=8).hexdigest()
+    return asset
+
+def static_response(name):
+    asset = get_asset(name)
+    if asset is None:
+        return jsonify({'error': 'Not found'}), 404
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    # The gzip body is a different representation: its own strong ETag
+    etag = asset.version + '-gzip' if use_gzip else asset.version
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif use_gzip:
+        response = Response(asset.gzip_body, mimetype=asset.mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(asset.body, mimetype=asset.mimetype)
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    if name != 'index.html' and request.args.get('v') == asset.version:
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    else:
+        # index.html and unversioned URLs are revalidated against the ETag
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 # Serve frontend files
 @app.route('/')
 def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return static_response('index.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
     # Serve JS, CSS, GeoJSON, etc.
-    return send_from_directory(app.static_folder, path)
+    return static_response(path)
 
-# Proxy district_info API calls to internal API
+# Proxy API calls to internal API
 @app.route('/district_info')
 def proxy_district_info():
-    internal_api_url = 'http://127.0.0.1:5000/district_info'
-    district = request.args.get('district')
-
-    if not district:
+    districts = request.args.getlist('district')
+    if not districts or not all(districts):
         return jsonify({'error': 'No district provided'}), 400
+    # Every parameter (district, from/to/days) is forwarded and is part of the cache key
+    return proxy('/district_info', tuple(request.args.items(multi=True)))
 
-    try:
-        # Forward request to internal API
-        resp = requests.get(internal_api_url, params={'district': district})
-        return jsonify(resp.json())
-    except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Failed to reach internal API: {e}'}), 500
+@app.route('/districts/summary')
+def proxy_districts_summary():
+    return proxy('/districts/summary', ())
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))  # default 8000
@@ -0,0 +1,101 @@
+# bench_analyze.py
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from train_model import analyze_disease_patterns, get_possible_causes, build_district_entry, CLUSTERED_CSV
+
+DISEASES = ['Cholera', 'Typhoid', 'Hepatitis A', 'Diarrhea', 'Dengue', 'Chikungunya',
+            'Malaria', 'Tuberculosis', 'Pneumonia', 'Bronchitis']
+
+# --- Previous implementation, kept only as the benchmark baseline ---
+def analyze_disease_patterns_legacy(df_patients, df_cases, clustered_df):
+    summary = {}
+    if df_patients.empty or df_cases.empty:
+        return summary
+
+    districts = clustered_df['district'].unique()
+    for district in districts:
+        district_patients = df_patients[df_patients['district'] == district]
+        district_cases = df_cases[df_cases['district'] == district]
+        district_info = clustered_df[clustered_df['district'] == district].iloc[0]
+
+        disease_summary = {}
+        diseases = district_cases['disease_name'].unique() if not district_cases.empty else []
+
+        for disease in diseases:
+            disease_cases = district_cases[district_cases['disease_name'] == disease]
+            affected_patients = district_patients[district_patients['patient_id'].isin(disease_cases['patient_id'])]
+
+            age_counts = {
+                '0-14': len(affected_patients[affected_patients['age'] <= 14]),
+                '15-24': len(affected_patients[(affected_patients['age'] >= 15) & (affected_patients['age'] <= 24)]),
+                '25-44': len(affected_patients[(affected_patients['age'] >= 25) & (affected_patients['age'] <= 44)]),
+                '45-64': len(affected_patients[(affected_patients['age'] >= 45) & (affected_patients['age'] <= 64)]),
+                '65+': len(affected_patients[affected_patients['age'] >= 65])
+            }
+            max_age_group = max(age_counts, key=age_counts.get)
+
+            gender_counts = affected_patients['gender'].value_counts().to_dict()
+            main_gender = max(gender_counts, key=gender_counts.get) if gender_counts else None
+
+            disease_summary[disease] = {
+                'cases': len(disease_cases),
+                'mainly_affected': {'age_group': max_age_group, 'gender': main_gender},
+                'possible_causes': get_possible_causes(district_info)
+            }
+
+        summary[district] = build_district_entry(district_info, disease_summary)
+
+    return summary
+
+# --- Synthetic data shaped like atlas_setup output (one patient per case) ---
+def make_synthetic_data(n_cases, districts, seed=42):
+    rng = np.random.default_rng(seed)
+    patient_ids = pd.Series(np.arange(1, n_cases + 1)).map('KL{:08d}'.format)
+    district = np.asarray(districts, dtype=object)[rng.integers(0, len(districts), n_cases)]
+    df_patients = pd.DataFrame({
+        'patient_id': patient_ids,
+        'age': np.maximum(1, rng.normal(35, 20, n_cases).astype(int)),
+        'gender': np.array(['Male', 'Female'], dtype=object)[rng.integers(0, 2, n_cases)],
+        'district': district
+    })
+    df_cases = pd.DataFrame({
+        'case_id': patient_ids.str.replace('KL', 'CASE', regex=False),
+        'patient_id': patient_ids,
+        'district': district,
+        'disease_name': np.asarray(DISEASES, dtype=object)[rng.integers(0, len(DISEASES), n_cases)]
+    })
+    return df_patients, df_cases
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark legacy vs vectorized analyze_disease_patterns")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--skip-legacy-above", type=int, default=None,
+                        help="only time the vectorized path for larger sizes")
+    args = parser.parse_args()
+
+    clustered_df = pd.read_csv(CLUSTERED_CSV)
+    districts = clustered_df['district'].tolist()
+
+    for n in args.sizes:
+        df_patients, df_cases = make_synthetic_data(n, districts)
+        new_summary, new_time = timed(analyze_disease_patterns, df_patients, df_cases, clustered_df)
+        new_json = json.dumps(new_summary, default=str, indent=4)
+
+        if args.skip_legacy_above is not None and n > args.skip_legacy_above:
+            print(f"📊 {n:>11,} cases | vectorized {new_time:8.2f}s | legacy skipped")
+            continue
+
+        old_summary, old_time = timed(analyze_disease_patterns_legacy, df_patients, df_cases, clustered_df)
+        old_json = json.dumps(old_summary, default=str, indent=4)
+
+        identical = "✅ identical" if old_json == new_json else "❌ OUTPUT DIFFERS"
+        print(f"📊 {n:>11,} cases | legacy {old_time:8.2f}s | vectorized {new_time:8.2f}s "
+              f"| {old_time / new_time:6.1f}x | {identical}")
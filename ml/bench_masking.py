@@ -0,0 +1,74 @@
+# bench_masking.py
+import argparse
+import time
+import random
+import string
+import hashlib
+import numpy as np
+import pandas as pd
+from utils_masking import MASK_FIELDS, mask_patient_data, unmask_patient_data
+
+# --- Previous per-cell implementation, kept only as the benchmark baseline ---
+def mask_patient_data_legacy(df):
+    df = df.copy()
+    mask_map = {}
+    for field in MASK_FIELDS:
+        if field in df.columns:
+            masked_values = []
+            for val in df[field]:
+                if field == 'address':
+                    masked_val = ''.join(random.choices(string.ascii_letters + string.digits, k=max(5, len(str(val)))))
+                else:
+                    masked_val = hashlib.sha256(str(val).encode()).hexdigest()[:10]
+                masked_values.append(masked_val)
+                mask_map[masked_val] = val
+            df[field] = masked_values
+    return df, mask_map
+
+def unmask_patient_data_legacy(df, mask_map):
+    df = df.copy()
+    for field in MASK_FIELDS:
+        if field in df.columns:
+            df[field] = df[field].apply(lambda x: mask_map.get(x, x))
+    return df
+
+def make_patients(n_rows, seed=42):
+    rng = np.random.default_rng(seed)
+    ids = pd.Series(np.arange(1, n_rows + 1))
+    first = np.array(['Arun', 'Anjali', 'Fathima', 'Joseph', 'Lakshmi', 'Mohammed', 'Priya', 'Rahul'], dtype=object)
+    last = np.array(['Nair', 'Menon', 'Pillai', 'Kurian', 'Thomas', 'Varghese', 'Rahman', 'Das'], dtype=object)
+    return pd.DataFrame({
+        'patient_id': ids.map('KL{:08d}'.format),
+        'name': first[rng.integers(0, len(first), n_rows)] + ' ' + last[rng.integers(0, len(last), n_rows)]
+                + ' ' + ids.astype(str).to_numpy(dtype=object),
+        'age': np.maximum(1, rng.normal(35, 20, n_rows).astype(int)),
+        'gender': np.array(['Male', 'Female'], dtype=object)[rng.integers(0, 2, n_rows)],
+        'address': ids.map('House {}, Ward 7, MG Road'.format)
+    })
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Masking throughput benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    df = make_patients(args.rows)
+
+    (masked, mask_map), mask_time = timed(mask_patient_data, df)
+    unmasked, unmask_time = timed(unmask_patient_data, masked, mask_map)
+    assert unmasked[MASK_FIELDS].equals(df[MASK_FIELDS]), "round trip changed the data"
+    print(f"📊 batched: mask {mask_time:6.2f}s ({args.rows / mask_time:,.0f} rows/s) | "
+          f"unmask {unmask_time:6.2f}s ({args.rows / unmask_time:,.0f} rows/s) | "
+          f"map {mask_map.nbytes() / 1e6:,.1f} MB")
+
+    if not args.skip_legacy:
+        (masked, legacy_map), mask_time = timed(mask_patient_data_legacy, df)
+        _, unmask_time = timed(unmask_patient_data_legacy, masked, legacy_map)
+        print(f"📊 legacy:  mask {mask_time:6.2f}s ({args.rows / mask_time:,.0f} rows/s) | "
+              f"unmask {unmask_time:6.2f}s ({args.rows / unmask_time:,.0f} rows/s) | "
+              f"map {len(legacy_map):,} entries in one dict")
@@ -0,0 +1,225 @@
+# bench_pipeline.py
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import shutil
+import resource
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import requests
+
+from bench_analyze import make_synthetic_data
+
+# Stages of regenerate_district_json, in pipeline order
+STAGES = ['fetch', 'fetch_snapshot', 'mask', 'cluster', 'analyze', 'serialize']
+INSERT_CHUNK = 50_000
+# Stages faster than this are too noisy to compare between runs
+MIN_COMPARE_SECONDS = 0.01
+
+def connect(mongo_uri):
+    """
+    A throwaway database: mongomock in-process by default, or a local mongod.
+    """
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri)
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("❌ mongomock is not installed: pip install mongomock, or pass --mongo-uri for a local mongod")
+        client = mongomock.MongoClient()
+    client.drop_database('kerala_health_bench')
+    return client, client['kerala_health_bench']
+
+def seed(db, n_cases, districts):
+    df_patients, df_cases = make_synthetic_data(n_cases, districts)
+    ids = df_patients['patient_id']
+    df_patients['name'] = 'Patient ' + ids
+    df_patients['address'] = ids.map('House {}, Ward 7, MG Road'.format)
+    for collection, df in ((db.patients, df_patients), (db.disease_cases, df_cases)):
+        records = df.to_dict('records')
+        for start in range(0, len(records), INSERT_CHUNK):
+            collection.insert_many(records[start:start + INSERT_CHUNK], ordered=False)
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def measure_latency(snapshot_path, districts, concurrency, n_requests):
+    """
+    /district_info latency from `concurrency` keep-alive clients against a threaded server.
+    """
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../api")))
+    import flask_app
+
+    app = flask_app.create_app(os.path.dirname(snapshot_path))
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/district_info"
+
+    def client(count):
+        session = requests.Session()
+        rng = np.random.default_rng(count)
+        latencies = []
+        for district in np.asarray(districts, dtype=object)[rng.integers(0, len(districts), count)]:
+            start = time.perf_counter()
+            resp = session.get(url, params={'district': district}, headers={'Accept-Encoding': 'gzip'})
+            resp.content
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code != 200:
+                raise RuntimeError(f"/district_info?district={district} returned {resp.status_code}")
+        return latencies
+
+    per_client = [n_requests // concurrency + (i < n_requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = np.concatenate([np.asarray(l) for l in pool.map(client, per_client)])
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    return {
+        'concurrency': concurrency,
+        'requests': int(len(latencies)),
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p95_ms': float(np.percentile(latencies, 95) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'max_ms': float(latencies.max() * 1000)
+    }
+
+def run_scale(n_cases, mongo_uri, concurrency, n_requests):
+    """
+    One scale, run in its own process so peak RSS belongs to this scale alone.
+    """
+    import train_model
+    from utils_masking import mask_patient_data
+
+    # Every file the pipeline writes goes to a scratch dir. The committed models are
+    # copied there, so the cluster stage loads them and never rewrites the tracked ones
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    models_dir = shutil.copytree(os.path.dirname(train_model.KMEANS_MODEL_PATH), os.path.join(workdir, "models"))
+    train_model.KMEANS_MODEL_PATH = os.path.join(models_dir, os.path.basename(train_model.KMEANS_MODEL_PATH))
+    train_model.SCALER_PATH = os.path.join(models_dir, os.path.basename(train_model.SCALER_PATH))
+    train_model.CLUSTERED_CSV = os.path.join(workdir, "kerala_clustered_districts.csv")
+
+    client, db = connect(mongo_uri)
+    train_model.use_database(db)
+    clustered_df, _, _ = train_model.load_and_cluster()
+    districts = clustered_df['district'].tolist()
+    _, seed_time = timed(seed, db, n_cases, districts)
+
+    train_model.DISTRICT_JSON_PATH = os.path.join(workdir, "district_data.json")
+    train_model.DISTRICT_SNAPSHOT_PATH = os.path.join(workdir, "district_data.snap")
+    train_model.patients_snapshot.root = os.path.join(workdir, "snapshot", "patients")
+    train_model.cases_snapshot.root = os.path.join(workdir, "snapshot", "disease_cases")
+
+    stages = {}
+    train_model.LOCAL_SNAPSHOT = False
+    (df_patients, df_cases), stages['fetch'] = timed(train_model.fetch_analytics_data)
+    # Warm local snapshot: the first sync downloads everything, the timed one only checks for new documents
+    train_model.LOCAL_SNAPSHOT = True
+    train_model.fetch_analytics_data()
+    _, stages['fetch_snapshot'] = timed(train_model.fetch_analytics_data)
+
+    df_raw, _, _ = train_model.fetch_live_data(mask=False)
+    _, stages['mask'] = timed(mask_patient_data, df_raw)
+    del df_raw
+
+    train_model.model_registry._models.clear()
+    _, stages['cluster'] = timed(train_model.load_and_cluster)
+    district_data, stages['analyze'] = timed(train_model.analyze_disease_patterns, df_patients, df_cases, clustered_df)
+    _, stages['serialize'] = timed(train_model.write_district_json, district_data)
+
+    latency = measure_latency(train_model.DISTRICT_SNAPSHOT_PATH, districts, concurrency, n_requests)
+    client.drop_database('kerala_health_bench')
+    return {
+        'cases': n_cases,
+        'seed_seconds': seed_time,
+        'stages': stages,
+        'total_seconds': sum(stages.values()),
+        'district_info': latency,
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path, tolerance):
+    """
+    Print per-stage ratios against a previous run; returns the regressions found.
+    """
+    with open(baseline_path) as f:
+        baseline = {r['cases']: r for r in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        old = baseline.get(result['cases'])
+        if old is None:
+            continue
+        checks = {**{f"stage {s}": (result['stages'][s], old['stages'].get(s)) for s in STAGES},
+                  'district_info p95': (result['district_info']['p95_ms'], old['district_info']['p95_ms']),
+                  'peak RSS': (result['peak_rss_mb'], old['peak_rss_mb'])}
+        for name, (new_value, old_value) in checks.items():
+            if not old_value or (name.startswith('stage') and old_value < MIN_COMPARE_SECONDS):
+                continue
+            ratio = new_value / old_value
+            flag = "❌" if ratio > 1 + tolerance else "  "
+            print(f"{flag} {result['cases']:>11,} cases | {name:<22} {old_value:10.4f} -> {new_value:10.4f} ({ratio:5.2f}x)")
+            if ratio > 1 + tolerance:
+                regressions.append((result['cases'], name, ratio))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end refresh pipeline and API benchmark against a local MongoDB stand-in")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--mongo-uri", default=None, help="local mongod to use instead of in-process mongomock")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--output", default="bench_pipeline.json")
+    parser.add_argument("--baseline", default=None, help="previous --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a stage counts as a regression")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            result = pool.submit(run_scale, n, args.mongo_uri, args.concurrency, args.requests).result()
+        results.append(result)
+        stages = " | ".join(f"{s} {result['stages'][s]:7.3f}s" for s in STAGES)
+        latency = result['district_info']
+        print(f"📊 {n:>11,} cases | {stages} | /district_info p50 {latency['p50_ms']:.2f}ms "
+              f"p95 {latency['p95_ms']:.2f}ms {latency['throughput_rps']:,.0f} req/s | peak RSS {result['peak_rss_mb']:,.0f} MB")
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'backend': 'mongod' if args.mongo_uri else 'mongomock',
+        'results': results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to '{args.output}'")
+
+    if args.baseline and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
@@ -0,0 +1,103 @@
+# bench_startup.py
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ML_DIR = os.path.abspath(os.path.dirname(__file__))
+API_DIR = os.path.abspath(os.path.join(ML_DIR, "../api"))
+# Unresolvable on purpose: an import that connects (or even resolves SRV records) fails or stalls
+OFFLINE_URI = "mongodb+srv://startup-bench.invalid/"
+# Libraries a web worker must not pay for before it serves a request
+HEAVY_MODULES = ['sklearn', 'pandas', 'pymongo']
+# Seconds, best of --repeat fresh interpreters
+BUDGETS = {
+    'import flask_app': 0.5,
+    'import train_model': 1.0,
+    'import db_listener': 1.0,
+    'worker boot': 0.75
+}
+
+# Each probe runs in a fresh interpreter and prints one JSON line
+IMPORT_PROBE = """
+import sys, json, time
+sys.path[:0] = [{ml!r}, {api!r}]
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+train_model = sys.modules.get('train_model')
+print(json.dumps({{
+    'seconds': seconds,
+    'loaded': [m for m in {heavy!r} if m in sys.modules],
+    'connected': train_model is not None and train_model._db is not None
+}}))
+"""
+
+BOOT_PROBE = """
+import sys, json, time, tempfile
+start = time.perf_counter()
+sys.path[:0] = [{ml!r}, {api!r}]
+import flask_app
+app = flask_app.create_app(tempfile.mkdtemp())
+status = app.test_client().get('/alerts').status_code
+print(json.dumps({{
+    'seconds': time.perf_counter() - start,
+    'status': status,
+    'loaded': [m for m in {heavy!r} if m in sys.modules],
+    'connected': False
+}}))
+"""
+
+def probe(code):
+    env = dict(os.environ, MONGODB_CONNECTION_STRING=OFFLINE_URI)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, timeout=60)
+    if result.returncode != 0:
+        sys.exit(f"❌ Startup probe failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure(code, repeat):
+    runs = [probe(code) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run['seconds'])
+    best['loaded'] = sorted({m for run in runs for m in run['loaded']})
+    best['connected'] = any(run['connected'] for run in runs)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time and web worker boot time, checked against startup budgets")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement; the fastest counts")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="multiply every budget, e.g. 2 on a slow CI runner")
+    parser.add_argument("--output", default=None, help="write the measurements as JSON")
+    args = parser.parse_args()
+
+    fmt = dict(ml=ML_DIR, api=API_DIR, heavy=HEAVY_MODULES)
+    probes = {f"import {m}": IMPORT_PROBE.format(module=m, **fmt) for m in ('flask_app', 'train_model', 'db_listener')}
+    probes['worker boot'] = BOOT_PROBE.format(**fmt)
+
+    results = {}
+    failures = []
+    for name, code in probes.items():
+        result = results[name] = measure(code, args.repeat)
+        budget = BUDGETS[name] * args.budget_scale
+        flag = "✅" if result['seconds'] <= budget else "❌"
+        loaded = ", ".join(result['loaded']) or "-"
+        print(f"{flag} {name:<20} {result['seconds'] * 1000:8.1f}ms (budget {budget * 1000:.0f}ms) | loaded: {loaded}")
+        if result['seconds'] > budget:
+            failures.append(f"{name} took {result['seconds']:.3f}s, over its {budget:.3f}s budget")
+        if result['connected']:
+            failures.append(f"{name} opened a MongoDB client")
+        if name in ('import flask_app', 'worker boot') and result['loaded']:
+            failures.append(f"{name} imported {', '.join(result['loaded'])}")
+    # Nothing is published in the temp dir: 503 is the expected answer, anything else is a bug
+    if results['worker boot']['status'] not in (200, 503):
+        failures.append(f"first request failed with HTTP {results['worker boot']['status']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'budget_scale': args.budget_scale, 'results': results}, f, indent=2)
+        print(f"✅ Results written to '{args.output}'")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
@@ -0,0 +1,150 @@
+# ml/columnar_loader.py
+import os
+import datetime
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Documents decoded per chunk before they are packed into typed columns
+CHUNK_SIZE = int(os.getenv("LOADER_CHUNK_SIZE", 100_000))
+# Documents per cursor round-trip
+BATCH_SIZE = int(os.getenv("LOADER_BATCH_SIZE", 10_000))
+
+# Column kinds:
+#   'key'      -> pandas Categorical of the full id string (patient_id), NaN when missing
+#   'category' -> pandas Categorical
+#   'age'      -> nullable UInt8, $numberInt dicts unwrapped
+#   'day'      -> int32 days since 1970-01-01 (-1 when missing)
+#   'object'   -> left as is (e.g. _id)
+
+def patient_key(value):
+    """
+    Key for a patient_id, shared by every path that joins on it: the whole id as
+    a string, so 'TN00000042' and 'KL00000042' (or non-numeric ids) never collide.
+    None when missing.
+    """
+    if value is None or value != value:
+        return None
+    return str(value)
+
+def key_categorical(values):
+    """
+    patient_key over a whole column at once: a Categorical of the str() of every
+    present value, NaN where it's missing. The column is hash-factorized once and
+    only its distinct values are turned into strings, instead of a Python call per row.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values)
+    if pd.api.types.infer_dtype(uniques, skipna=True) != 'string':
+        # Distinct values with the same str() (30 and '30') share one key
+        remap, uniques = pd.factorize(pd.Index(uniques, dtype=object).map(str))
+        codes = np.append(remap, -1)[codes]
+    return pd.Categorical.from_codes(codes, categories=uniques)
+
+def shared_codes(*columns):
+    """
+    int codes for key columns over one shared set of categories, so frames can be
+    joined on plain ints. -1 where the key is missing.
+    Every column is factorized in one pass (a categorical column by its categories).
+    """
+    parts = [pd.Series(c.cat.categories, dtype=object) if isinstance(c.dtype, pd.CategoricalDtype) else c
+             for c in columns]
+    keys = key_categorical(pd.concat(parts, ignore_index=True)).codes
+    results = []
+    start = 0
+    for column, part in zip(columns, parts):
+        codes = keys[start:start + len(part)]
+        start += len(part)
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Missing values (code -1) stay -1
+            codes = np.append(codes, -1)[column.cat.codes.to_numpy()]
+        results.append(codes)
+    return results
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+def day_number(value):
+    """
+    int day (days since 1970-01-01) for a stored date, shared by every path that buckets by day.
+    """
+    if value is None or value != value:
+        return -1
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, dict):
+        value = value.get('$date')
+        if isinstance(value, dict):
+            value = int(value.get('$numberLong', 0))
+        if isinstance(value, (int, float)):
+            # Extended JSON: milliseconds since the epoch
+            return int(value // 86_400_000)
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return -1
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.toordinal() - EPOCH_ORDINAL
+    return -1
+
+def _age(value):
+    if isinstance(value, dict):
+        value = value.get('$numberInt', 0)
+    try:
+        return min(max(int(value), 0), 255)
+    except (TypeError, ValueError):
+        return None
+
+def _pack(kind, values):
+    if kind == 'key':
+        return key_categorical(values)
+    if kind == 'day':
+        return np.fromiter((day_number(v) for v in values), dtype=np.int32, count=len(values))
+    if kind == 'category':
+        return pd.Categorical(values)
+    if kind == 'age':
+        return pd.array([_age(v) for v in values], dtype='UInt8')
+    return np.array(values, dtype=object)
+
+def _concat(kind, parts):
+    if kind in ('key', 'category'):
+        return union_categoricals(parts) if parts else pd.Categorical([])
+    if kind == 'age':
+        return pd.array(np.concatenate([p.to_numpy(dtype='float64', na_value=np.nan) for p in parts]),
+                        dtype='UInt8') if parts else pd.array([], dtype='UInt8')
+    dtype = np.int32 if kind == 'day' else object
+    return np.concatenate(parts) if parts else np.array([], dtype=dtype)
+
+def load_columns(collection, schema, query=None, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, include_ids=False):
+    """
+    Stream `collection` into a DataFrame of typed columns.
+    Only the fields in `schema` are projected; documents are decoded `chunk_size`
+    at a time and packed, so peak memory is the typed columns plus one chunk.
+    """
+    schema = dict(schema)
+    if include_ids:
+        schema['_id'] = 'object'
+    projection = {'_id': 1 if include_ids else 0, **{field: 1 for field in schema if field != '_id'}}
+
+    parts = {field: [] for field in schema}
+    buffers = {field: [] for field in schema}
+
+    def flush():
+        for field, kind in schema.items():
+            if buffers[field]:
+                parts[field].append(_pack(kind, buffers[field]))
+                buffers[field] = []
+
+    cursor = collection.find(query or {}, projection, batch_size=batch_size)
+    filled = 0
+    for doc in cursor:
+        for field in schema:
+            buffers[field].append(doc.get(field))
+        filled += 1
+        if filled == chunk_size:
+            flush()
+            filled = 0
+    flush()
+
+    return pd.DataFrame({field: _concat(kind, parts[field]) for field, kind in schema.items()})
@@ -0,0 +1,116 @@
+# ml/count_cube.py
+import numpy as np
+
+from district_snapshot import write_frame, open_frame, read_frame_generation
+
+MAGIC = b'KLCUBE01'
+DIMENSIONS = ['district', 'disease', 'migrant', 'severity', 'hospital']
+# Label for cases missing a migrant flag, severity or hospital
+UNKNOWN = 'unknown'
+
+class CountCube:
+    """
+    Case counts over district x disease x migrant x severity x hospital, kept as a
+    dense int32 array and updated with +1/-1 deltas. The district axis is fixed;
+    the others grow as new labels show up.
+    """
+
+    def __init__(self, districts):
+        self.labels = {dim: [] for dim in DIMENSIONS}
+        self.labels['district'] = list(districts)
+        self.index = {dim: {label: i for i, label in enumerate(labels)} for dim, labels in self.labels.items()}
+        self.disease_categories = {}
+        self.counts = np.zeros((len(self.labels['district']), 0, 0, 0, 0), dtype=np.int32)
+
+    def _position(self, dim, label):
+        index = self.index[dim]
+        position = index.get(label)
+        if position is None:
+            position = index[label] = len(self.labels[dim])
+            self.labels[dim].append(label)
+            widths = [(0, 0)] * len(DIMENSIONS)
+            widths[DIMENSIONS.index(dim)] = (0, 1)
+            self.counts = np.pad(self.counts, widths)
+        return position
+
+    def add(self, district, disease, migrant, severity, hospital, category=None, sign=1):
+        d = self.index['district'].get(district)
+        if d is None or disease is None:
+            return
+        if category is not None:
+            self.disease_categories[disease] = category
+        position = (
+            d,
+            self._position('disease', disease),
+            self._position('migrant', UNKNOWN if migrant is None else bool(migrant)),
+            self._position('severity', UNKNOWN if severity is None else severity),
+            self._position('hospital', UNKNOWN if hospital is None else hospital)
+        )
+        self.counts[position] += sign
+
+    def write(self, path, generation=None):
+        header = {
+            'labels': self.labels,
+            'disease_categories': self.disease_categories,
+            'shape': list(self.counts.shape)
+        }
+        return write_frame(path, MAGIC, header, [self.counts.astype(np.int64).tobytes()], generation)
+
+def read_generation(path):
+    return read_frame_generation(path, MAGIC)
+
+class CubeReader:
+    """
+    Memory-mapped count cube. A query takes the filtered slices one axis at a
+    time and sums out every dimension not grouped by.
+    """
+
+    def __init__(self, path):
+        self._mmap, self.generation, header, data_start = open_frame(path, MAGIC)
+        self.labels = header['labels']
+        self.index = {dim: {label: i for i, label in enumerate(labels)} for dim, labels in self.labels.items()}
+        self.disease_categories = header['disease_categories']
+        shape = header['shape']
+        self.counts = np.frombuffer(self._mmap, dtype=np.int64, count=int(np.prod(shape)),
+                                    offset=data_start).reshape(shape)
+
+    def query(self, filters, by=()):
+        """
+        filters: {dimension: [labels]} (plus 'category': [disease categories]);
+        by: dimensions to group by. Returns (total, rows) with rows sorted by count.
+        """
+        filters = dict(filters)
+        categories = filters.pop('category', None)
+        if categories is not None:
+            in_category = [d for d, c in self.disease_categories.items() if c in categories]
+            diseases = filters.get('disease')
+            filters['disease'] = in_category if diseases is None else [d for d in diseases if d in in_category]
+
+        counts = self.counts
+        kept = {}
+        # Most selective first: district and disease shrink the cube the most
+        for dim, labels in filters.items():
+            axis = DIMENSIONS.index(dim)
+            # A label repeated in the filter (?district=A&district=A) is still one slice
+            positions = list(dict.fromkeys(self.index[dim][label] for label in labels if label in self.index[dim]))
+            counts = counts.take(positions, axis=axis)
+            kept[dim] = [self.labels[dim][p] for p in positions]
+
+        by = list(by)
+        axes = [DIMENSIONS.index(dim) for dim in by]
+        reduced = counts.sum(axis=tuple(a for a in range(len(DIMENSIONS)) if a not in axes))
+        total = int(reduced.sum())
+        if not by:
+            return total, []
+        # sum() leaves the kept axes in DIMENSIONS order; put them in `by` order
+        reduced = reduced.transpose([sorted(axes).index(a) for a in axes])
+
+        labels = [kept.get(dim, self.labels[dim]) for dim in by]
+        nonzero = np.nonzero(reduced)
+        values = reduced[nonzero]
+        rows = []
+        for i in np.argsort(-values, kind='stable'):
+            row = {dim: labels[j][nonzero[j][i]] for j, dim in enumerate(by)}
+            row['cases'] = int(values[i])
+            rows.append(row)
+        return total, rows
@@ -0,0 +1,242 @@
+# ml/daily_rollups.py
+import datetime
+import numpy as np
+
+from district_snapshot import write_frame, open_frame, read_frame_generation
+
+# Published with the district_snapshot framing. The arrays are prefix sums over
+# the day axis with a leading zero row, so the counts for days [first, last]
+# are P[last + 1] - P[first]. The header also carries the gender tie-break order.
+MAGIC = b'KLROLL02'
+# Days since 1970-01-01, as columnar_loader.day_number produces (not imported from
+# there: that would pull pandas into the web workers)
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+# Day capacity at least doubles when it runs out (and never grows by less than a
+# chunk), so adding days in any order is amortized O(1)
+DAY_CHUNK = 64
+
+def day_to_date(day):
+    return datetime.date.fromordinal(day + EPOCH_ORDINAL)
+
+def date_to_day(value):
+    return datetime.date.fromisoformat(value).toordinal() - EPOCH_ORDINAL
+
+class DailyRollup:
+    """
+    Dense daily counts: cases[day, district, disease] plus affected patients by
+    age group and by gender, [day, district, disease, age_group|gender].
+    Kept up to date with +1/-1 deltas. A patient counts once per disease per day,
+    so over a range a patient admitted on several days counts once for each day.
+    Gender ties go to the gender first seen for the district/disease, i.e. the
+    insertion order of DistrictAggregates.gender_counts (a gender whose count
+    drops to zero is seen anew), not to the global gender order.
+    """
+
+    def __init__(self, districts, age_groups):
+        self.districts = list(districts)
+        self.district_index = {name: i for i, name in enumerate(self.districts)}
+        self.age_groups = list(age_groups)
+        self.age_index = {name: i for i, name in enumerate(self.age_groups)}
+        self.diseases = []
+        self.disease_index = {}
+        self.genders = []
+        self.gender_index = {}
+        # Array row 0 is base_day; published days are start_day .. start_day + n_days - 1.
+        # Spare capacity sits on either side of them.
+        self.base_day = None
+        self.start_day = None
+        self.n_days = 0
+        self.cases = np.zeros((0, len(self.districts), 0), dtype=np.int32)
+        self.ages = np.zeros((0, len(self.districts), 0, len(self.age_groups)), dtype=np.int32)
+        self.gender_counts = np.zeros((0, len(self.districts), 0, 0), dtype=np.int32)
+        # Over all days: affected patients per [district, disease, gender] and the
+        # order each gender was first seen in (-1: not currently seen)
+        self.gender_totals = np.zeros((len(self.districts), 0, 0), dtype=np.int64)
+        self.gender_rank = np.zeros((len(self.districts), 0, 0), dtype=np.int64)
+        self.gender_seen = 0
+
+    # --- Axes ---
+    def _grow(self, axis, before=0, after=0):
+        def pad(array, axis):
+            widths = [(0, 0)] * array.ndim
+            widths[axis] = (before, after)
+            return np.pad(array, widths)
+        self.cases = pad(self.cases, axis)
+        self.ages = pad(self.ages, axis)
+        self.gender_counts = pad(self.gender_counts, axis)
+
+    def _day(self, day):
+        if self.start_day is None:
+            self.base_day = self.start_day = day
+        capacity = self.cases.shape[0]
+        if day < self.base_day:
+            grow = max(self.base_day - day, capacity, DAY_CHUNK)
+            self._grow(0, before=grow)
+            self.base_day -= grow
+        elif day - self.base_day >= capacity:
+            self._grow(0, after=max(day - self.base_day + 1 - capacity, capacity, DAY_CHUNK))
+        if day < self.start_day:
+            self.n_days += self.start_day - day
+            self.start_day = day
+        self.n_days = max(self.n_days, day - self.start_day + 1)
+        return day - self.base_day
+
+    @property
+    def rows(self):
+        """
+        Slice of the day axis holding the published days.
+        """
+        first = 0 if self.start_day is None else self.start_day - self.base_day
+        return slice(first, first + self.n_days)
+
+    def _disease(self, disease):
+        index = self.disease_index.get(disease)
+        if index is None:
+            index = self.disease_index[disease] = len(self.diseases)
+            self.diseases.append(disease)
+            self._grow(2, after=1)
+            self.gender_totals = np.pad(self.gender_totals, [(0, 0), (0, 1), (0, 0)])
+            self.gender_rank = np.pad(self.gender_rank, [(0, 0), (0, 1), (0, 0)], constant_values=-1)
+        return index
+
+    def _gender(self, gender):
+        index = self.gender_index.get(gender)
+        if index is None:
+            index = self.gender_index[gender] = len(self.genders)
+            self.genders.append(gender)
+            self.gender_counts = np.pad(self.gender_counts, [(0, 0), (0, 0), (0, 0), (0, 1)])
+            self.gender_totals = np.pad(self.gender_totals, [(0, 0), (0, 0), (0, 1)])
+            self.gender_rank = np.pad(self.gender_rank, [(0, 0), (0, 0), (0, 1)], constant_values=-1)
+        return index
+
+    # --- Deltas ---
+    def add_case(self, district, disease, day, sign=1):
+        d = self.district_index.get(district)
+        if d is None or day < 0 or disease is None:
+            return
+        k = self._disease(disease)
+        t = self._day(day)
+        self.cases[t, d, k] += sign
+
+    def add_patient(self, district, disease, day, age_group, gender, sign=1):
+        d = self.district_index.get(district)
+        if d is None or day < 0 or disease is None:
+            return
+        k = self._disease(disease)
+        t = self._day(day)
+        if age_group is not None:
+            self.ages[t, d, k, self.age_index[age_group]] += sign
+        if gender is not None:
+            g = self._gender(gender)
+            self.gender_counts[t, d, k, g] += sign
+            self.gender_totals[d, k, g] += sign
+            if sign > 0 and self.gender_totals[d, k, g] == sign:
+                self.gender_rank[d, k, g] = self.gender_seen
+                self.gender_seen += 1
+            elif self.gender_totals[d, k, g] == 0:
+                self.gender_rank[d, k, g] = -1
+
+    # --- Publishing ---
+    def write(self, path, district_records, generation=None):
+        """
+        Write prefix sums plus the per-district records to a temp file and rename it into place.
+        district_records: {district: {'district_info': {...}, 'possible_causes': [...]}}
+        """
+        arrays = {
+            'cases': self.cases[self.rows],
+            'ages': self.ages[self.rows],
+            'genders': self.gender_counts[self.rows]
+        }
+        layout = {}
+        blobs = []
+        offset = 0
+        for name, counts in arrays.items():
+            prefix = np.zeros((counts.shape[0] + 1,) + counts.shape[1:], dtype=np.int64)
+            np.cumsum(counts, axis=0, out=prefix[1:])
+            blob = prefix.tobytes()
+            layout[name] = {'offset': offset, 'shape': list(prefix.shape)}
+            blobs.append(blob)
+            offset += len(blob)
+
+        header = {
+            'start_day': self.start_day,
+            'n_days': self.n_days,
+            'districts': self.districts,
+            'diseases': self.diseases,
+            'genders': self.genders,
+            'age_groups': self.age_groups,
+            'gender_rank': self.gender_rank.tolist(),
+            'district_records': district_records,
+            'arrays': layout
+        }
+        return write_frame(path, MAGIC, header, blobs, generation)
+
+def read_generation(path):
+    return read_frame_generation(path, MAGIC)
+
+class RollupReader:
+    """
+    Memory-mapped prefix sums; a date-range query is two slices and a subtraction.
+    """
+
+    def __init__(self, path):
+        self._mmap, self.generation, header, data_start = open_frame(path, MAGIC)
+        self.start_day = header['start_day']
+        self.n_days = header['n_days']
+        self.district_index = {name: i for i, name in enumerate(header['districts'])}
+        self.diseases = header['diseases']
+        self.genders = header['genders']
+        self.age_groups = header['age_groups']
+        self.gender_rank = np.array(header['gender_rank'], dtype=np.int64).reshape(
+            len(header['districts']), len(self.diseases), len(self.genders))
+        self.district_records = header['district_records']
+        self.arrays = {
+            name: np.frombuffer(self._mmap, dtype=np.int64, count=int(np.prod(spec['shape'])),
+                                offset=data_start + spec['offset']).reshape(spec['shape'])
+            for name, spec in header['arrays'].items()
+        }
+
+    @property
+    def first_day(self):
+        return self.start_day
+
+    @property
+    def last_day(self):
+        return None if self.start_day is None else self.start_day + self.n_days - 1
+
+    def __contains__(self, district):
+        return district in self.district_index
+
+    def district_summary(self, district, first_day, last_day):
+        """
+        Same shape as a district_data entry, for admissions on days [first_day, last_day].
+        """
+        d = self.district_index.get(district)
+        if d is None:
+            return None
+        record = self.district_records.get(district, {})
+        summary = {'district_info': record.get('district_info', {}), 'disease_summary': {}}
+        if self.start_day is None:
+            return summary
+        lo = min(max(first_day - self.start_day, 0), self.n_days)
+        hi = min(max(last_day - self.start_day + 1, 0), self.n_days)
+        if hi <= lo:
+            return summary
+
+        cases = self.arrays['cases'][hi, d] - self.arrays['cases'][lo, d]
+        ages = self.arrays['ages'][hi, d] - self.arrays['ages'][lo, d]
+        genders = self.arrays['genders'][hi, d] - self.arrays['genders'][lo, d]
+        possible_causes = record.get('possible_causes', [])
+        for k in np.flatnonzero(cases):
+            # Ties go to the first age group, and to the gender first seen for this
+            # district/disease, like build_disease_entry over DistrictAggregates counts
+            main_gender = None
+            if genders.shape[1] and genders[k].any():
+                tied = np.flatnonzero(genders[k] == genders[k].max())
+                main_gender = self.genders[int(tied[self.gender_rank[d, k, tied].argmin()])]
+            summary['disease_summary'][self.diseases[k]] = {
+                'cases': int(cases[k]),
+                'mainly_affected': {'age_group': self.age_groups[int(ages[k].argmax())], 'gender': main_gender},
+                'possible_causes': possible_causes
+            }
+        return summary
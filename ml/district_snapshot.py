@@ -0,0 +1,166 @@
+# ml/district_snapshot.py
+import os
+import mmap
+import json
+import struct
+
+# File layout:
+#   magic (8 bytes) | generation (uint64) | header length (uint32) | header JSON | blobs
+# For the district snapshot the header indexes each district's compact JSON body
+# by (offset, length) relative to the end of the header. Everything is little-endian.
+MAGIC = b'KLDSNAP1'
+HEADER = struct.Struct('<8sQI')
+
+class SnapshotFormatError(ValueError):
+    pass
+
+# --- Framing shared by every published file (snapshot, rollup, cube) ---
+def read_frame_generation(path, magic):
+    """
+    Generation from a framed file's fixed-size header, or None if there is none.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < HEADER.size:
+        return None
+    file_magic, generation, _ = HEADER.unpack(header)
+    return generation if file_magic == magic else None
+
+def write_frame(path, magic, header, blobs, generation=None):
+    """
+    Write header (JSON) and blobs to a temp file next to `path` and rename it into
+    place, so readers only ever see a complete file. Blobs start 8-byte aligned.
+    Returns the generation written (one past the current file's when not given).
+    """
+    if generation is None:
+        generation = (read_frame_generation(path, magic) or 0) + 1
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    header_bytes += b' ' * (-(HEADER.size + len(header_bytes)) % 8)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(magic, generation, len(header_bytes)))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return generation
+
+def open_frame(path, magic):
+    """
+    mmap a framed file: (mapping, generation, header, offset of the first blob).
+    """
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        file_magic, generation, header_length = HEADER.unpack_from(mapping)
+    except struct.error:
+        mapping.close()
+        raise SnapshotFormatError(f"'{path}' is too short to be a published file")
+    if file_magic != magic:
+        mapping.close()
+        raise SnapshotFormatError(f"'{path}' is not a {magic.decode()} file")
+    header = json.loads(mapping[HEADER.size:HEADER.size + header_length])
+    return mapping, generation, header, HEADER.size + header_length
+
+def read_generation(path):
+    return read_frame_generation(path, MAGIC)
+
+def write_snapshot(path, district_data, schema_version, generation=None):
+    """
+    Publish `district_data` at `path`, one compact JSON body per district.
+    Returns the generation written.
+    """
+    bodies = []
+    index = {}
+    offset = 0
+    for district, info in district_data.items():
+        body = json.dumps(info, separators=(',', ':')).encode()
+        index[district] = [offset, len(body)]
+        bodies.append(body)
+        offset += len(body)
+    return write_frame(path, MAGIC, {'schema_version': schema_version, 'districts': index}, bodies, generation)
+
+class SnapshotReader:
+    """
+    Memory-mapped view of one snapshot generation.
+    Only the header index is parsed on open; district bodies are sliced out of
+    the shared page cache on demand. The mapping keeps the file it was opened on
+    alive after a newer generation is renamed over it.
+    """
+
+    def __init__(self, path):
+        self._mmap, self.generation, index, self._data_start = open_frame(path, MAGIC)
+        self.schema_version = index['schema_version']
+        self._index = index['districts']
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, district):
+        return district in self._index
+
+    def districts(self):
+        return list(self._index)
+
+    def raw(self, district):
+        """
+        Compact JSON bytes for one district, or None if it isn't in the snapshot.
+        """
+        location = self._index.get(district)
+        if location is None:
+            return None
+        offset, length = location
+        start = self._data_start + offset
+        return self._mmap[start:start + length]
+
+    def get(self, district):
+        body = self.raw(district)
+        return json.loads(body) if body is not None else None
+
+    def close(self):
+        self._mmap.close()
+
+class JsonSnapshotReader:
+    """
+    SnapshotReader over a district_data.json file, for workers that have no
+    published snapshot (a fresh checkout, or a web dyno that doesn't share the
+    listener's disk). It has generation 0, so any published snapshot replaces it.
+    """
+    generation = 0
+
+    def __init__(self, path):
+        with open(path) as f:
+            payload = json.load(f)
+        # v1 files are the bare {district: {...}} mapping
+        if 'schema_version' in payload and 'districts' in payload:
+            self.schema_version = payload['schema_version']
+            payload = payload['districts']
+        else:
+            self.schema_version = 1
+        self._bodies = {district: json.dumps(info, separators=(',', ':')).encode()
+                        for district, info in payload.items()}
+
+    def __len__(self):
+        return len(self._bodies)
+
+    def __contains__(self, district):
+        return district in self._bodies
+
+    def districts(self):
+        return list(self._bodies)
+
+    def raw(self, district):
+        return self._bodies.get(district)
+
+    def get(self, district):
+        body = self.raw(district)
+        return json.loads(body) if body is not None else None
+
+    def close(self):
+        pass
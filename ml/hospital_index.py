@@ -0,0 +1,127 @@
+# ml/hospital_index.py
+import numpy as np
+
+from daily_rollups import day_to_date
+from district_snapshot import write_frame, open_frame, read_frame_generation
+
+MAGIC = b'KLHOSP01'
+EARTH_RADIUS_KM = 6371.0088
+# Hospital fields published with the index (coordinates go in their own array)
+HOSPITAL_FIELDS = ['hospital_id', 'name', 'district', 'type', 'bed_capacity', 'monthly_capacity']
+
+def day_to_month(day):
+    return day_to_date(day).strftime('%Y-%m')
+
+class HospitalLoad:
+    """
+    Admissions per hospital per month, kept up to date with +1/-1 case deltas.
+    """
+
+    def __init__(self):
+        # hospital_id -> {'YYYY-MM': cases}
+        self.counts = {}
+
+    def add(self, hospital, day, sign=1):
+        if hospital is None or day < 0:
+            return
+        months = self.counts.setdefault(hospital, {})
+        month = day_to_month(day)
+        months[month] = months.get(month, 0) + sign
+        if months[month] == 0:
+            del months[month]
+
+    def write(self, path, hospitals, generation=None):
+        """
+        Publish hospital records (dicts from the hospitals collection) with their
+        coordinates and a [hospital, month] load matrix. Hospitals without
+        coordinates are left out.
+        """
+        hospitals = [h for h in hospitals if (h.get('coordinates') or {}).get('lat') is not None]
+        months = sorted({month for counts in self.counts.values() for month in counts})
+        month_index = {month: i for i, month in enumerate(months)}
+
+        coordinates = np.zeros((len(hospitals), 2), dtype=np.float64)
+        load = np.zeros((len(hospitals), len(months)), dtype=np.int64)
+        for i, hospital in enumerate(hospitals):
+            coordinates[i] = hospital['coordinates']['lat'], hospital['coordinates']['lon']
+            for month, count in self.counts.get(hospital['hospital_id'], {}).items():
+                load[i, month_index[month]] = count
+
+        header = {
+            'hospitals': [{field: hospital.get(field) for field in HOSPITAL_FIELDS} for hospital in hospitals],
+            'months': months
+        }
+        return write_frame(path, MAGIC, header, [coordinates.tobytes(), load.tobytes()], generation)
+
+def read_generation(path):
+    return read_frame_generation(path, MAGIC)
+
+class HospitalReader:
+    """
+    One published generation: a haversine BallTree over hospital coordinates and
+    load/capacity ratios with a per-month sort order, both built once on open,
+    so nearest-facility and overload queries are O(log n).
+    """
+
+    def __init__(self, path):
+        self._mmap, self.generation, header, data_start = open_frame(path, MAGIC)
+        self.hospitals = header['hospitals']
+        self.months = header['months']
+        self.month_index = {month: i for i, month in enumerate(self.months)}
+        n, m = len(self.hospitals), len(self.months)
+        self.coordinates = np.frombuffer(self._mmap, dtype=np.float64, count=n * 2,
+                                         offset=data_start).reshape(n, 2)
+        self.load = np.frombuffer(self._mmap, dtype=np.int64, count=n * m,
+                                  offset=data_start + self.coordinates.nbytes).reshape(n, m)
+        # sklearn costs about a second to import: only the first reader in a worker pays it
+        from sklearn.neighbors import BallTree
+        self.tree = BallTree(np.radians(self.coordinates), metric='haversine') if n else None
+
+        capacity = np.array([h.get('monthly_capacity') or 0 for h in self.hospitals], dtype=np.float64)
+        # Hospitals with no recorded capacity never count as overloaded
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.ratio = np.where(capacity[:, None] > 0, self.load / capacity[:, None], 0.0)
+        self.order = np.argsort(self.ratio, axis=0, kind='stable')
+        self.sorted_ratio = np.take_along_axis(self.ratio, self.order, axis=0)
+
+    @property
+    def latest_month(self):
+        return self.months[-1] if self.months else None
+
+    def _record(self, i, month):
+        record = dict(self.hospitals[i])
+        j = self.month_index.get(month)
+        record['month'] = month
+        record['cases'] = int(self.load[i, j]) if j is not None else 0
+        record['utilization'] = round(float(self.ratio[i, j]), 4) if j is not None else 0.0
+        return record
+
+    def nearest(self, lat, lon, k=5):
+        """
+        The k hospitals closest to (lat, lon), nearest first, with distance_km and
+        the latest month's load.
+        """
+        if self.tree is None:
+            return []
+        k = min(k, len(self.hospitals))
+        distances, positions = self.tree.query(np.radians([[lat, lon]]), k=k)
+        results = []
+        for distance, i in zip(distances[0], positions[0]):
+            record = self._record(int(i), self.latest_month)
+            record['distance_km'] = round(float(distance) * EARTH_RADIUS_KM, 3)
+            results.append(record)
+        return results
+
+    def overloaded(self, month, min_ratio=1.0, limit=None):
+        """
+        Hospitals whose load/capacity for `month` is at least min_ratio, busiest
+        first. None if nothing was admitted that month.
+        """
+        j = self.month_index.get(month)
+        if j is None:
+            return None
+        start = int(np.searchsorted(self.sorted_ratio[:, j], min_ratio, side='left'))
+        positions = self.order[start:, j][::-1]
+        if limit is not None:
+            positions = positions[:limit]
+        return [self._record(int(i), month) for i in positions]
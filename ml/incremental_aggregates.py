@@ -0,0 +1,438 @@
+# ml/incremental_aggregates.py
+import os
+import pickle
+import threading
+from collections import defaultdict
+import pandas as pd
+
+from train_model import (AGE_GROUPS, get_age_group, get_possible_causes, get_district_record,
+                         build_disease_entry, build_district_entry)
+from columnar_loader import patient_key, day_number
+from daily_rollups import DailyRollup
+from count_cube import CountCube
+from hospital_index import HospitalLoad
+from outbreak_detector import OutbreakDetector
+
+def _normalize_age(age):
+    # Same $numberInt handling as fetch_live_data
+    if isinstance(age, dict):
+        age = age.get('$numberInt', 0)
+    try:
+        return int(age)
+    except (TypeError, ValueError):
+        return None
+
+# Bumped whenever the pickled state layout changes; older checkpoints are ignored
+CHECKPOINT_VERSION = 6
+
+def _empty_age_counts():
+    # Module-level (not a lambda) so the defaultdict can be pickled into a checkpoint
+    return dict.fromkeys(AGE_GROUPS, 0)
+
+def _clean(value):
+    # pandas gives NaN/NA for missing fields when seeding from DataFrames
+    if value is None or (not isinstance(value, dict) and pd.isna(value)):
+        return None
+    return value
+
+class DistrictAggregates:
+    """
+    In-memory per-district/per-disease counts kept in sync with change-stream events.
+    Each insert/update/delete is applied as an O(1) delta; the district JSON is
+    derived from this state instead of re-reading both collections.
+    The same deltas keep a DailyRollup of counts per admission day, a
+    CountCube over migrant flag, severity and hospital, monthly HospitalLoad and
+    an OutbreakDetector (backfilled from the rollup on rebuild).
+    The state is checkpointed together with the change-stream resume token of
+    the last event applied from each collection, so a restart only replays the
+    events it missed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clustered_df = None
+        self.rollup = None
+        self.cube = None
+        self.hospital_load = None
+        self.detector = None
+        # collection name -> resume token; not reset by a rebuild, the streams keep going
+        self.resume_tokens = {}
+        # Events (and idle tokens) that arrive while a rebuild fetches; see hold_events()
+        self._held = None
+        self._reset()
+
+    def _reset(self):
+        # patients: _id -> patient_id, patient_id -> (district, age_group, gender)
+        self.patient_keys = {}
+        self.patient_info = {}
+        # cases: _id -> (district, disease, patient_id, day, cube labels)
+        self.cases = {}
+        self.case_counts = {}
+        # number of cases per (district, disease, patient_id) and pairs per patient
+        self.pair_refs = defaultdict(int)
+        self.patient_pairs = defaultdict(set)
+        # the same per admission day, for the rollup
+        self.day_refs = defaultdict(int)
+        self.patient_days = defaultdict(set)
+        self.age_counts = defaultdict(_empty_age_counts)
+        self.gender_counts = defaultdict(dict)
+        self.dirty = False
+        self.events_applied = 0
+
+    # --- Seeding ---
+    def hold_events(self):
+        """
+        Queue change events instead of applying them until the next rebuild() (or
+        release_events()). A rebuild's fetch runs while the streams keep delivering;
+        events applied then would be wiped by the reset, with their tokens already
+        recorded. Held events are replayed over the rebuilt state instead.
+        """
+        with self.lock:
+            if self._held is None:
+                self._held = []
+
+    def release_events(self):
+        """
+        Apply the held events to the current state, e.g. when the rebuild's fetch failed.
+        """
+        with self.lock:
+            self._replay_held()
+
+    def _replay_held(self):
+        held, self._held = self._held, None
+        for collection_name, change, token in held or ():
+            if change is None:
+                self.resume_tokens[collection_name] = token
+            else:
+                # The fetch may already have seen these: deletes of documents it never had are expected
+                self._apply(collection_name, change, replay=True)
+
+    def rebuild(self, df_patients, df_cases, clustered_df):
+        """
+        Reset the state from full (unmasked) DataFrames, e.g. after a consistency failure.
+        Events held since hold_events() are replayed on top.
+        """
+        with self.lock:
+            self._reset()
+            self.clustered_df = clustered_df
+            self.rollup = DailyRollup(clustered_df['district'].unique(), AGE_GROUPS)
+            self.cube = CountCube(clustered_df['district'].unique())
+            self.hospital_load = HospitalLoad()
+            # Replaying history one case at a time would be out of day order; backfill in one pass instead
+            self.detector = None
+            # Cases first: each patient then contributes to all of its pairs in patient
+            # row order, so gender ties go the way analyze_disease_patterns breaks them
+            for doc in df_cases.to_dict('records'):
+                self._add_case(doc)
+            for doc in df_patients.to_dict('records'):
+                self._add_patient(doc)
+            self.detector = OutbreakDetector.from_rollup(self.rollup)
+            self._replay_held()
+
+    # --- Contributions of one patient to one (district, disease) pair ---
+    def _contribute(self, pair, patient_id, sign):
+        info = self.patient_info.get(patient_id)
+        if info is None or info[0] != pair[0]:
+            return
+        _, age_group, gender = info
+        if age_group is not None:
+            self.age_counts[pair][age_group] += sign
+        if gender is not None:
+            genders = self.gender_counts[pair]
+            genders[gender] = genders.get(gender, 0) + sign
+            if genders[gender] == 0:
+                del genders[gender]
+
+    def _contribute_day(self, pair, day, patient_id, sign):
+        info = self.patient_info.get(patient_id)
+        if self.rollup is None or info is None or info[0] != pair[0]:
+            return
+        _, age_group, gender = info
+        self.rollup.add_patient(pair[0], pair[1], day, age_group, gender, sign)
+
+    # --- Patients ---
+    def _add_patient(self, doc):
+        # Same keys the columnar loader produces, so seeded and streamed docs agree
+        patient_id = patient_key(doc.get('patient_id'))
+        if patient_id is None:
+            return
+        if '_id' in doc:
+            self.patient_keys[doc['_id']] = patient_id
+        self.patient_info[patient_id] = (
+            _clean(doc.get('district')),
+            get_age_group(_normalize_age(_clean(doc.get('age')))),
+            _clean(doc.get('gender'))
+        )
+        for pair in self.patient_pairs.get(patient_id, ()):
+            self._contribute(pair, patient_id, 1)
+        for pair, day in self.patient_days.get(patient_id, ()):
+            self._contribute_day(pair, day, patient_id, 1)
+
+    def _remove_patient(self, doc_id, replay=False):
+        patient_id = self.patient_keys.pop(doc_id, None)
+        if patient_id is None:
+            self.dirty = self.dirty or not replay
+            return
+        for pair in self.patient_pairs.get(patient_id, ()):
+            self._contribute(pair, patient_id, -1)
+        for pair, day in self.patient_days.get(patient_id, ()):
+            self._contribute_day(pair, day, patient_id, -1)
+        self.patient_info.pop(patient_id, None)
+
+    # --- Cases ---
+    def _add_case(self, doc):
+        district = _clean(doc.get('district'))
+        disease = _clean(doc.get('disease_name'))
+        patient_id = patient_key(doc.get('patient_id'))
+        day = day_number(doc.get('admission_date'))
+        cube_labels = tuple(_clean(doc.get(field)) for field in
+                            ('is_migrant_patient', 'severity', 'hospital_id', 'disease_category'))
+        if '_id' in doc:
+            self.cases[doc['_id']] = (district, disease, patient_id, day, cube_labels)
+        if self.cube is not None:
+            self.cube.add(district, disease, *cube_labels)
+            self.hospital_load.add(cube_labels[2], day)
+        if self.detector is not None:
+            self.detector.add(district, disease, day)
+
+        pair = (district, disease)
+        self.case_counts[pair] = self.case_counts.get(pair, 0) + 1
+        ref = (district, disease, patient_id)
+        self.pair_refs[ref] += 1
+        if self.pair_refs[ref] == 1:
+            self.patient_pairs[patient_id].add(pair)
+            self._contribute(pair, patient_id, 1)
+        self._add_case_day(pair, day, patient_id, 1)
+
+    def _add_case_day(self, pair, day, patient_id, sign):
+        if day < 0 or self.rollup is None:
+            return
+        self.rollup.add_case(pair[0], pair[1], day, sign)
+        ref = (pair, day, patient_id)
+        self.day_refs[ref] += sign
+        if sign > 0 and self.day_refs[ref] == 1:
+            self.patient_days[patient_id].add((pair, day))
+            self._contribute_day(pair, day, patient_id, 1)
+        elif sign < 0 and self.day_refs[ref] == 0:
+            del self.day_refs[ref]
+            self._contribute_day(pair, day, patient_id, -1)
+            self.patient_days[patient_id].discard((pair, day))
+            if not self.patient_days[patient_id]:
+                del self.patient_days[patient_id]
+
+    def _remove_case(self, doc_id, replay=False):
+        case = self.cases.pop(doc_id, None)
+        if case is None:
+            self.dirty = self.dirty or not replay
+            return
+        district, disease, patient_id, day, cube_labels = case
+        pair = (district, disease)
+        if self.cube is not None:
+            self.cube.add(district, disease, *cube_labels, sign=-1)
+            self.hospital_load.add(cube_labels[2], day, sign=-1)
+        if self.detector is not None:
+            self.detector.add(district, disease, day, sign=-1)
+        self._add_case_day(pair, day, patient_id, -1)
+        self.case_counts[pair] -= 1
+        if self.case_counts[pair] == 0:
+            del self.case_counts[pair]
+        ref = (district, disease, patient_id)
+        self.pair_refs[ref] -= 1
+        if self.pair_refs[ref] == 0:
+            del self.pair_refs[ref]
+            self._contribute(pair, patient_id, -1)
+            self.patient_pairs[patient_id].discard(pair)
+            if not self.patient_pairs[patient_id]:
+                del self.patient_pairs[patient_id]
+
+    # --- Change stream ---
+    def apply_change(self, collection_name, change):
+        """
+        Apply one change-stream event. Updates need full_document='updateLookup'.
+        Events that can't be applied as a delta mark the state dirty.
+        """
+        with self.lock:
+            if self._held is not None:
+                self._held.append((collection_name, change, None))
+                return
+            self._apply(collection_name, change)
+
+    def _apply(self, collection_name, change, replay=False):
+        op = change['operationType']
+        doc_id = change.get('documentKey', {}).get('_id')
+        doc = change.get('fullDocument')
+        is_patients = collection_name == 'patients'
+
+        self.events_applied += 1
+        if '_id' in change:
+            self.resume_tokens[collection_name] = change['_id']
+        if op in ('insert', 'update', 'replace', 'delete'):
+            # Inserts replayed over state that already has the document count once
+            known = self.patient_keys if is_patients else self.cases
+            if op != 'insert' or doc_id in known:
+                if is_patients:
+                    self._remove_patient(doc_id, replay)
+                else:
+                    self._remove_case(doc_id, replay)
+            if op != 'delete':
+                if doc is None:
+                    # document deleted before the update lookup ran; a replay's fetch already lacks it
+                    self.dirty = self.dirty or not replay
+                elif is_patients:
+                    self._add_patient(doc)
+                else:
+                    self._add_case(doc)
+        else:
+            # drop / rename / invalidate: nothing sensible to apply
+            self.dirty = True
+
+    def mark_dirty(self):
+        with self.lock:
+            self.dirty = True
+
+    def advance_token(self, collection_name, token):
+        """
+        Record a stream position with no events to apply (an idle post-batch token),
+        so the checkpointed token of a quiet collection doesn't age out of the oplog.
+        """
+        if token is None:
+            return
+        with self.lock:
+            if self._held is not None:
+                self._held.append((collection_name, None, token))
+                return
+            self.resume_tokens[collection_name] = token
+
+    # --- Checkpoints ---
+    def checkpoint(self, path):
+        """
+        Pickle the state and resume tokens to `path` (temp file + rename).
+        Returns the bytes written, or None before the first rebuild. A dirty state
+        can't be resumed from, so it removes the previous checkpoint instead.
+        """
+        with self.lock:
+            if self.clustered_df is None:
+                return None
+            if self.dirty:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                return None
+            state = {name: value for name, value in self.__dict__.items() if name not in ('lock', 'clustered_df', '_held')}
+            payload = pickle.dumps({'version': CHECKPOINT_VERSION, 'state': state}, protocol=pickle.HIGHEST_PROTOCOL)
+
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return len(payload)
+
+    def restore(self, path, clustered_df):
+        """
+        Load a checkpoint written by checkpoint(). Returns False (and leaves the state
+        alone) if there is none or it doesn't match this code or these districts.
+        """
+        try:
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, EOFError, AttributeError, ImportError, pickle.UnpicklingError) as e:
+            print(f"⚠️ Ignoring unreadable checkpoint '{path}': {e}")
+            return False
+        if not isinstance(saved, dict) or saved.get('version') != CHECKPOINT_VERSION:
+            return False
+        state = saved['state']
+        if state['rollup'] is None or set(state['rollup'].districts) != set(clustered_df['district'].unique()):
+            return False
+        with self.lock:
+            self.__dict__.update(state)
+            self.clustered_df = clustered_df
+        return True
+
+    # --- Consistency ---
+    def is_consistent(self, patients_col, disease_col, check_counts=True):
+        if self.dirty or self.clustered_df is None:
+            return False
+        if not check_counts:
+            return True
+        n_patients = patients_col.estimated_document_count()
+        n_cases = disease_col.estimated_document_count()
+        with self.lock:
+            return n_patients == len(self.patient_keys) and n_cases == len(self.cases)
+
+    # --- Output ---
+    def to_district_data(self):
+        """
+        Derive the same structure analyze_disease_patterns returns from the counts.
+        """
+        with self.lock:
+            district_data = {}
+            if not self.case_counts or not self.patient_info:
+                return district_data
+
+            diseases_by_district = defaultdict(list)
+            for district, disease in self.case_counts:
+                diseases_by_district[district].append(disease)
+
+            for district in self.clustered_df['district'].unique():
+                district_info = self.clustered_df[self.clustered_df['district'] == district].iloc[0]
+                disease_summary = {}
+                for disease in diseases_by_district.get(district, []):
+                    pair = (district, disease)
+                    disease_summary[disease] = build_disease_entry(
+                        self.case_counts[pair],
+                        self.age_counts.get(pair, {}),
+                        self.gender_counts.get(pair, {}),
+                        district_info
+                    )
+                district_data[district] = build_district_entry(district_info, disease_summary)
+            return district_data
+
+    def write_rollup(self, path):
+        """
+        Publish the daily rollup with the per-district fields range queries need.
+        Returns the rollup generation, or None before the first rebuild.
+        """
+        with self.lock:
+            if self.rollup is None:
+                return None
+            district_records = {}
+            for district in self.rollup.districts:
+                district_info = self.clustered_df[self.clustered_df['district'] == district].iloc[0]
+                district_records[district] = {
+                    'district_info': get_district_record(district_info),
+                    'possible_causes': get_possible_causes(district_info)
+                }
+            return self.rollup.write(path, district_records)
+
+    def write_cube(self, path):
+        """
+        Publish the migrant/severity/hospital count cube. None before the first rebuild.
+        """
+        with self.lock:
+            if self.cube is None:
+                return None
+            return self.cube.write(path)
+
+    def write_hospitals(self, path, hospitals):
+        """
+        Publish the hospital index with monthly load for `hospitals` (records from
+        the hospitals collection). None before the first rebuild.
+        """
+        with self.lock:
+            if self.hospital_load is None:
+                return None
+            return self.hospital_load.write(path, hospitals)
+
+    def write_alerts(self, path):
+        """
+        Publish the outbreak detector's current alerts. None before the first rebuild.
+        """
+        with self.lock:
+            if self.detector is None:
+                return None
+            return self.detector.write(path)
@@ -0,0 +1,219 @@
+# ml/local_snapshot.py
+import os
+import json
+import time
+import shutil
+import numpy as np
+import pandas as pd
+from bson import ObjectId, json_util
+from pymongo.errors import PyMongoError
+from pandas.api.types import union_categoricals
+
+import columnar_loader
+
+# Full re-download after this long, to pick up updates and deletes the watermark can't see
+RECONCILE_SECONDS = float(os.getenv("SNAPSHOT_RECONCILE_SECONDS", 6 * 3600))
+# Segments are merged back into one once there are more than this many
+MAX_SEGMENTS = int(os.getenv("SNAPSHOT_MAX_SEGMENTS", 32))
+# Bumped whenever a column's on-disk layout changes; older snapshots are re-downloaded
+SNAPSHOT_FORMAT = 3
+
+def _write_ids(base, ids):
+    # ObjectIds as an (n, 12) byte matrix; any other _id type as extended JSON
+    if all(isinstance(doc_id, ObjectId) for doc_id in ids):
+        raw = np.frombuffer(b''.join(doc_id.binary for doc_id in ids), dtype=np.uint8)
+        np.save(base + ".oid.npy", raw.reshape(len(ids), 12))
+    else:
+        with open(base + ".json", "w") as f:
+            f.write(json_util.dumps(list(ids)))
+
+def _read_ids(base):
+    if os.path.exists(base + ".oid.npy"):
+        raw = np.load(base + ".oid.npy").tobytes()
+        ids = [ObjectId(raw[i:i + 12]) for i in range(0, len(raw), 12)]
+    else:
+        with open(base + ".json") as f:
+            ids = json_util.loads(f.read())
+    column = np.empty(len(ids), dtype=object)
+    column[:] = ids
+    return column
+
+def _watermark(ids):
+    """
+    Extended JSON of the highest _id, so its BSON type (ObjectId, string, int...)
+    survives the round trip through meta.json. None when there is no single
+    order to resume from (no documents, or mixed _id types).
+    """
+    if not len(ids):
+        return None
+    try:
+        return json_util.dumps(max(ids))
+    except TypeError:
+        return None
+
+class LocalSnapshot:
+    """
+    On-disk columnar copy of one collection, kept in sync by _id high-watermark.
+
+    Each sync writes only the documents newer than the watermark as a new
+    segment directory of .npy columns, so refresh I/O is O(new documents).
+    meta.json lists the committed segments and is replaced atomically after
+    each segment is in place. Deletes and updates are caught by a document
+    count check and a periodic full reconcile.
+    Segments also keep each document's _id, so callers that track documents
+    (the listener's incremental aggregates) can seed from the local copy too.
+    """
+
+    def __init__(self, collection, schema, root):
+        self.collection = collection
+        self.schema = dict(schema)
+        self.root = root
+
+    # --- Metadata ---
+    @property
+    def meta_path(self):
+        return os.path.join(self.root, "meta.json")
+
+    def read_meta(self):
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('schema') == self.schema and meta.get('format') == SNAPSHOT_FORMAT else None
+
+    def _write_meta(self, meta):
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path)
+
+    # --- Segments ---
+    def _write_segment(self, name, df):
+        final = os.path.join(self.root, name)
+        tmp = final + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        _write_ids(os.path.join(tmp, "_id"), df['_id'].to_numpy(dtype=object))
+        for field, kind in self.schema.items():
+            column = df[field]
+            base = os.path.join(tmp, field)
+            if kind in ('key', 'category'):
+                np.save(base + ".codes.npy", column.cat.codes.to_numpy())
+                with open(base + ".categories.json", "w") as f:
+                    json.dump(column.cat.categories.tolist(), f)
+            elif kind == 'age':
+                np.save(base + ".npy", column.to_numpy(dtype=np.uint8, na_value=0))
+                np.save(base + ".mask.npy", column.isna().to_numpy())
+            else:
+                np.save(base + ".npy", column.to_numpy())
+        shutil.rmtree(final, ignore_errors=True)
+        os.rename(tmp, final)
+
+    def _read_segment(self, name, include_ids=False):
+        base_dir = os.path.join(self.root, name)
+        columns = {'_id': _read_ids(os.path.join(base_dir, "_id"))} if include_ids else {}
+        for field, kind in self.schema.items():
+            base = os.path.join(base_dir, field)
+            if kind in ('key', 'category'):
+                with open(base + ".categories.json") as f:
+                    categories = json.load(f)
+                codes = np.load(base + ".codes.npy", mmap_mode='r')
+                columns[field] = pd.Categorical.from_codes(codes, categories=categories)
+            elif kind == 'age':
+                values = np.load(base + ".npy", mmap_mode='r')
+                mask = np.load(base + ".mask.npy", mmap_mode='r')
+                columns[field] = pd.arrays.IntegerArray(np.array(values), np.array(mask))
+            else:
+                columns[field] = np.load(base + ".npy", mmap_mode='r')
+        return columns
+
+    def load(self, include_ids=False):
+        """
+        The local copy only: no network. Empty DataFrame if there is none yet.
+        """
+        meta = self.read_meta()
+        if not meta or not meta['segments']:
+            return pd.DataFrame({field: [] for field in (['_id'] if include_ids else []) + list(self.schema)})
+
+        segments = [self._read_segment(name, include_ids) for name in meta['segments']]
+        columns = {'_id': np.concatenate([segment['_id'] for segment in segments])} if include_ids else {}
+        for field, kind in self.schema.items():
+            parts = [segment[field] for segment in segments]
+            if kind in ('key', 'category'):
+                columns[field] = union_categoricals(parts)
+            elif kind == 'age':
+                columns[field] = pd.array(np.concatenate([p.to_numpy(dtype='float64', na_value=np.nan) for p in parts]),
+                                          dtype='UInt8')
+            else:
+                columns[field] = np.concatenate(parts)
+        return pd.DataFrame(columns)
+
+    # --- Sync ---
+    def _fetch(self, query):
+        df = columnar_loader.load_columns(self.collection, self.schema, query=query, include_ids=True)
+        return df, _watermark(df['_id'])
+
+    def _full_resync(self):
+        df, watermark = self._fetch(None)
+        os.makedirs(self.root, exist_ok=True)
+        old = self.read_meta()
+        # New name, so the segments the current meta.json points at stay intact until it's replaced
+        next_segment = old['next_segment'] if old else 0
+        name = f"seg-{next_segment:06d}"
+        self._write_segment(name, df)
+        now = time.time()
+        self._write_meta({'schema': self.schema, 'format': SNAPSHOT_FORMAT, 'segments': [name], 'next_segment': next_segment + 1,
+                          'watermark': watermark, 'rows': len(df), 'synced_at': now, 'reconciled_at': now})
+        self._remove_unlisted(old, [name])
+        print(f"💾 Snapshot of '{self.collection.name}' rebuilt: {len(df)} rows")
+
+    def _remove_unlisted(self, old_meta, keep):
+        for name in (old_meta or {}).get('segments', []):
+            if name not in keep:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def _compact(self, meta):
+        df = self.load(include_ids=True)
+        name = f"seg-{meta['next_segment']:06d}"
+        self._write_segment(name, df)
+        old_segments = meta['segments']
+        meta.update(segments=[name], next_segment=meta['next_segment'] + 1)
+        self._write_meta(meta)
+        self._remove_unlisted({'segments': old_segments}, [name])
+
+    def sync(self, include_ids=False, reconcile=False):
+        """
+        Pull documents newer than the watermark, append them and return the full frame.
+        reconcile forces a full re-download (for callers that know updates were missed).
+        Falls back to the local copy when MongoDB can't be reached.
+        """
+        meta = self.read_meta()
+        try:
+            # Without a watermark (mixed _id types) only a full download is safe
+            if (meta is None or reconcile or (meta['rows'] and meta['watermark'] is None)
+                    or time.time() - meta['reconciled_at'] > RECONCILE_SECONDS):
+                self._full_resync()
+                return self.load(include_ids)
+
+            query = {'_id': {'$gt': json_util.loads(meta['watermark'])}} if meta['watermark'] else None
+            df_new, watermark = self._fetch(query)
+            if len(df_new):
+                name = f"seg-{meta['next_segment']:06d}"
+                self._write_segment(name, df_new)
+                meta.update(segments=meta['segments'] + [name], next_segment=meta['next_segment'] + 1,
+                            watermark=watermark, rows=meta['rows'] + len(df_new))
+            meta['synced_at'] = time.time()
+            self._write_meta(meta)
+
+            # Deletes, or inserts that landed below the watermark, show up as a count mismatch
+            if self.collection.estimated_document_count() != meta['rows']:
+                print(f"⚠️ Snapshot of '{self.collection.name}' drifted from MongoDB, reconciling...")
+                self._full_resync()
+            elif len(meta['segments']) > MAX_SEGMENTS:
+                self._compact(meta)
+        except PyMongoError as e:
+            if meta is None:
+                raise
+            print(f"⚠️ MongoDB unreachable ({e}); using local snapshot of '{self.collection.name}'")
+        return self.load(include_ids)
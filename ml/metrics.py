@@ -0,0 +1,192 @@
+# ml/metrics.py
+import os
+import time
+import bisect
+import cProfile
+import threading
+import functools
+from contextlib import contextmanager
+
+# Seconds; the last bucket is +Inf
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# cProfile dumps of top-level spans go here while profiling is on (toggled at runtime by toggle_profiling)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "../profiles")
+profiling_enabled = os.getenv("PROFILE_REFRESH", "0") == "1"
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self, extra=()):
+        # extra: (name, value) label pairs added to every sample
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples(tuple(extra)))
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self, extra):
+        return [f"{self.name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    _samples = Counter._samples
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self, extra):
+        lines = []
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, extra + (('le', _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, extra)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Registry:
+    """
+    With worker_label set, every sample is labelled worker="<pid>" of the process
+    rendering it. Each gunicorn worker keeps its own registry, so without the
+    label its counters read as one series that jumps between workers' values.
+    """
+
+    def __init__(self, worker_label=False):
+        self.worker_label = worker_label
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        # The pid is read here, not at creation: a --preload master creates the registry before forking
+        extra = [('worker', os.getpid())] if self.worker_label else []
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(extra))
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        # Swapped in atomically so a reader never sees half a scrape
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+REGISTRY = Registry()
+
+# --- Refresh pipeline ---
+STAGE_SECONDS = REGISTRY.histogram('district_refresh_stage_seconds', 'Time spent in each refresh stage', ['stage'])
+STAGE_ROWS = REGISTRY.counter('district_refresh_rows_total', 'Rows handled by each refresh stage', ['stage'])
+BYTES_WRITTEN = REGISTRY.counter('district_refresh_bytes_written_total', 'Bytes written per published artifact', ['artifact'])
+
+# --- Spans and profiling ---
+_local = threading.local()
+
+def toggle_profiling():
+    global profiling_enabled
+    profiling_enabled = not profiling_enabled
+    print(f"🔬 Refresh profiling {'on' if profiling_enabled else 'off'} (dumps in '{PROFILE_DIR}')")
+
+@contextmanager
+def span(stage):
+    """
+    Time the block into district_refresh_stage_seconds{stage}.
+    With profiling on, the outermost span in a thread is also captured with cProfile.
+    """
+    depth = getattr(_local, 'depth', 0)
+    profiler = cProfile.Profile() if profiling_enabled and depth == 0 else None
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        _local.depth = depth
+        if profiler is not None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"{stage}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof"))
+
+def timed(stage):
+    """
+    Decorator form of span().
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count_rows(stage, rows):
+    STAGE_ROWS.inc(rows, stage=stage)
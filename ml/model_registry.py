@@ -0,0 +1,81 @@
+# ml/model_registry.py
+import os
+import json
+import pickle
+import hashlib
+from importlib.metadata import version
+
+# In-process copies keyed by fingerprint: {fingerprint: (df, scaler, kmeans)}
+_models = {}
+# Content hash per CSV, reused while (mtime, size) are unchanged
+_csv_digests = {}
+
+def csv_digest(csv_file):
+    stat = os.stat(csv_file)
+    key = (os.path.abspath(csv_file), stat.st_mtime_ns, stat.st_size)
+    if key not in _csv_digests:
+        with open(csv_file, "rb") as f:
+            _csv_digests[key] = hashlib.sha256(f.read()).hexdigest()
+    return _csv_digests[key]
+
+def compute_fingerprint(csv_file, features, n_clusters):
+    """
+    Hash of the inputs the fitted models depend on: CSV contents, feature list and
+    n_clusters. The installed sklearn version is left out, so another install
+    doesn't refit (and rewrite the tracked pickles); the version the pickles were
+    written with is recorded next to the fingerprint instead.
+    """
+    payload = json.dumps({
+        'csv_sha256': csv_digest(csv_file),
+        'features': list(features),
+        'n_clusters': n_clusters
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def sklearn_version():
+    # Read from package metadata: importing sklearn here would cost every importer a second
+    return version('scikit-learn')
+
+def fingerprint_path(model_path):
+    return os.path.join(os.path.dirname(model_path), "model_fingerprint.json")
+
+def get_cached(fingerprint):
+    cached = _models.get(fingerprint)
+    if cached is None:
+        return None
+    df, scaler, kmeans = cached
+    return df.copy(), scaler, kmeans
+
+def load_saved(fingerprint, kmeans_path, scaler_path):
+    """
+    Load the pickled models if they were saved for this fingerprint, else None.
+    """
+    try:
+        with open(fingerprint_path(kmeans_path)) as f:
+            saved = json.load(f)
+        if saved.get('fingerprint') != fingerprint:
+            return None
+        if saved.get('sklearn') != sklearn_version():
+            print(f"⚠️ Models in '{os.path.dirname(kmeans_path)}' were saved with scikit-learn {saved.get('sklearn')}, "
+                  f"running {sklearn_version()}; delete {os.path.basename(fingerprint_path(kmeans_path))} to refit")
+        with open(kmeans_path, "rb") as f:
+            kmeans = pickle.load(f)
+        with open(scaler_path, "rb") as f:
+            scaler = pickle.load(f)
+    except (OSError, ValueError, pickle.UnpicklingError):
+        return None
+    return scaler, kmeans
+
+def save(fingerprint, kmeans, scaler, kmeans_path, scaler_path):
+    os.makedirs(os.path.dirname(kmeans_path), exist_ok=True)
+    with open(kmeans_path, "wb") as f:
+        pickle.dump(kmeans, f)
+    with open(scaler_path, "wb") as f:
+        pickle.dump(scaler, f)
+    # Written last so a half-written pair of pickles never looks valid
+    with open(fingerprint_path(kmeans_path), "w") as f:
+        json.dump({'fingerprint': fingerprint, 'sklearn': sklearn_version()}, f)
+
+def remember(fingerprint, df, scaler, kmeans):
+    _models.clear()
+    _models[fingerprint] = (df.copy(), scaler, kmeans)
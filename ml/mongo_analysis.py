@@ -0,0 +1,106 @@
+# ml/mongo_analysis.py
+from collections import defaultdict
+
+from train_model import AGE_GROUPS, get_age_group, build_disease_entry, build_district_entry
+
+def _age_group(age):
+    # Age as stored by pymongo (int) or by an extended-JSON import ({'$numberInt': '30'});
+    # binned here rather than server-side, so the pipeline needs no $getField/$convert
+    if isinstance(age, dict):
+        age = age.get('$numberInt')
+    try:
+        return get_age_group(int(age))
+    except (TypeError, ValueError):
+        return None
+
+def case_count_pipeline():
+    # first_seen keeps diseases in the order pandas' unique() would see them
+    return [
+        {'$group': {
+            '_id': {'district': '$district', 'disease': '$disease_name'},
+            'cases': {'$sum': 1},
+            'first_seen': {'$min': '$_id'}
+        }},
+        {'$sort': {'first_seen': 1}}
+    ]
+
+def patient_breakdown_pipeline(patients_collection='patients'):
+    """
+    Affected patients per district/disease/age/gender (ages are binned by the caller).
+    A patient counts once per disease, and only when registered in the case's district.
+    Only stages and operators from MongoDB 3.6 on, which mongomock also runs, so
+    the offline parity check exercises this exact pipeline. An index on
+    patients.patient_id keeps the $lookup from scanning.
+    """
+    return [
+        {'$group': {'_id': {'district': '$district', 'disease': '$disease_name', 'patient_id': '$patient_id'}}},
+        {'$lookup': {
+            'from': patients_collection,
+            'localField': '_id.patient_id',
+            'foreignField': 'patient_id',
+            'as': 'patient'
+        }},
+        {'$unwind': '$patient'},
+        {'$project': {
+            '_id': 0,
+            'district': '$_id.district',
+            'disease': '$_id.disease',
+            'age': '$patient.age',
+            'gender': '$patient.gender',
+            'patient_oid': '$patient._id',
+            'same_district': {'$eq': ['$patient.district', '$_id.district']}
+        }},
+        {'$match': {'same_district': True}},
+        {'$group': {
+            '_id': {'district': '$district', 'disease': '$disease', 'age': '$age', 'gender': '$gender'},
+            'patients': {'$sum': 1},
+            'first_seen': {'$min': '$patient_oid'}
+        }}
+    ]
+
+def analyze_disease_patterns_pipeline(patients_col, disease_col, clustered_df):
+    """
+    Server-side equivalent of analyze_disease_patterns.
+    Only aggregated rows (districts x diseases x age groups x genders) leave MongoDB.
+    """
+    summary = {}
+    if patients_col.estimated_document_count() == 0:
+        return summary
+
+    case_rows = list(disease_col.aggregate(case_count_pipeline(), allowDiskUse=True))
+    if not case_rows:
+        return summary
+    breakdown_rows = disease_col.aggregate(patient_breakdown_pipeline(patients_col.name), allowDiskUse=True)
+
+    age_counts = defaultdict(lambda: dict.fromkeys(AGE_GROUPS, 0))
+    gender_seen = defaultdict(dict)
+    for row in breakdown_rows:
+        key = row['_id']
+        pair = (key['district'], key['disease'])
+        age_group = _age_group(key.get('age'))
+        if age_group is not None:
+            age_counts[pair][age_group] += row['patients']
+        gender = key.get('gender')
+        if gender is not None:
+            count, first_seen = gender_seen[pair].get(gender, (0, row['first_seen']))
+            gender_seen[pair][gender] = (count + row['patients'], min(first_seen, row['first_seen']))
+
+    diseases_by_district = defaultdict(list)
+    case_counts = {}
+    for row in case_rows:
+        pair = (row['_id'].get('district'), row['_id'].get('disease'))
+        diseases_by_district[pair[0]].append(pair[1])
+        case_counts[pair] = row['cases']
+
+    for district in clustered_df['district'].unique():
+        district_info = clustered_df[clustered_df['district'] == district].iloc[0]
+        disease_summary = {}
+        for disease in diseases_by_district.get(district, []):
+            pair = (district, disease)
+            # value_counts order: count descending, ties by first appearance
+            genders = sorted(gender_seen.get(pair, {}).items(), key=lambda g: (-g[1][0], g[1][1]))
+            gender_counts = {gender: count for gender, (count, _) in genders}
+            disease_summary[disease] = build_disease_entry(case_counts[pair], age_counts.get(pair, {}), gender_counts, district_info)
+        summary[district] = build_district_entry(district_info, disease_summary)
+
+    return summary
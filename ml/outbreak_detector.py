@@ -0,0 +1,232 @@
+# ml/outbreak_detector.py
+import math
+import numpy as np
+
+from daily_rollups import day_to_date
+from district_snapshot import write_frame, open_frame, read_frame_generation
+
+MAGIC = b'KLALRT01'
+# EWMA weight of the newest day for the baseline mean and variance
+ALPHA = 0.1
+# CUSUM slack and decision threshold, in standard deviations
+CUSUM_K = 0.5
+CUSUM_H = 5.0
+# Days of history a series needs before it can alert, and cases on the day
+WARMUP_DAYS = 14
+MIN_CASES = 5
+# Alerts stay listed this many days after the day they fired
+ALERT_WINDOW_DAYS = 3
+# Empty days folded in at once after a gap; past this the baseline is ~0 anyway
+MAX_GAP_DAYS = 90
+
+def _sd(mean, var):
+    # Counts are roughly Poisson: never trust a spread below sqrt(mean), or below 1
+    return math.sqrt(max(var, mean, 1.0))
+
+class SeriesState:
+    """
+    Detector state for one (district, disease) series: the open day's count and
+    the EWMA/CUSUM statistics over the closed days before it.
+    """
+    __slots__ = ('day', 'count', 'mean', 'var', 'cusum', 'days', 'alert_day', 'alert_cases', 'alert_score')
+
+    def __init__(self, day):
+        self.day = day
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.cusum = 0.0
+        self.days = 0
+        self.alert_day = None
+        self.alert_cases = 0
+        self.alert_score = 0.0
+
+    def score(self, count):
+        return max(0.0, self.cusum + (count - self.mean) / _sd(self.mean, self.var) - CUSUM_K)
+
+    def close_day(self):
+        """
+        Fold the open day into the baseline and move to the next day.
+        """
+        x = self.count
+        if self.days == 0:
+            self.mean = float(x)
+        else:
+            self.cusum = self.score(x)
+            if self.cusum > CUSUM_H:
+                if self.days >= WARMUP_DAYS and x >= MIN_CASES:
+                    self.alert_day, self.alert_cases, self.alert_score = self.day, x, self.cusum
+                self.cusum = 0.0
+            diff = x - self.mean
+            self.mean += ALPHA * diff
+            self.var = (1 - ALPHA) * (self.var + ALPHA * diff * diff)
+        self.days += 1
+        self.day += 1
+        self.count = 0
+
+    def advanced_to(self, day):
+        """
+        This series as it would be with every day before `day` closed (at most
+        MAX_GAP_DAYS of them), as a copy.
+        """
+        state = SeriesState(self.day)
+        for name in SeriesState.__slots__:
+            setattr(state, name, getattr(self, name))
+        if day > state.day:
+            for _ in range(min(day - state.day, MAX_GAP_DAYS)):
+                state.close_day()
+            state.day = day
+        return state
+
+class OutbreakDetector:
+    """
+    Streaming spike detection per district x disease over daily admissions.
+    Each case event is O(1): it bumps the open day's count, and a later day
+    first closes the open one (plus at most MAX_GAP_DAYS empty days) into the
+    EWMA baseline and CUSUM. Cases for days already closed can't revise them and
+    are skipped until the next rebuild backfills from the daily rollup.
+    """
+
+    def __init__(self):
+        self.series = {}
+        self.latest_day = None
+
+    # --- Streaming ---
+    def add(self, district, disease, day, sign=1):
+        if district is None or disease is None or day < 0:
+            return
+        key = (district, disease)
+        state = self.series.get(key)
+        if state is None:
+            if sign < 0:
+                return
+            state = self.series[key] = SeriesState(day)
+        if day < state.day:
+            return
+        if day > state.day:
+            for _ in range(min(day - state.day, MAX_GAP_DAYS)):
+                state.close_day()
+            state.day = day
+        state.count = max(0, state.count + sign)
+        self.latest_day = day if self.latest_day is None else max(self.latest_day, day)
+
+    # --- Backfill ---
+    @classmethod
+    def from_counts(cls, counts, start_day, keys):
+        """
+        Warm up every series at once from a dense [day, series] count matrix.
+        Days are folded in with whole-array numpy steps; the last day stays open.
+        A series starts on its first day with cases, like the streaming path.
+        """
+        detector = cls()
+        n_days = counts.shape[0]
+        if n_days == 0:
+            return detector
+        n = counts.shape[1]
+        mean = np.zeros(n)
+        var = np.zeros(n)
+        cusum = np.zeros(n)
+        days = np.zeros(n, dtype=np.int64)
+        alert_day = np.full(n, -1, dtype=np.int64)
+        alert_cases = np.zeros(n, dtype=np.int64)
+        alert_score = np.zeros(n)
+
+        for t in range(n_days - 1):
+            x = counts[t].astype(np.float64)
+            started = days > 0
+            first = ~started & (x > 0)
+            mean[first] = x[first]
+
+            sd = np.sqrt(np.maximum(np.maximum(var, mean), 1.0))
+            score = np.maximum(0.0, cusum + (x - mean) / sd - CUSUM_K)
+            fired = started & (score > CUSUM_H)
+            alerted = fired & (days >= WARMUP_DAYS) & (x >= MIN_CASES)
+            alert_day[alerted] = start_day + t
+            alert_cases[alerted] = x[alerted]
+            alert_score[alerted] = score[alerted]
+            cusum = np.where(started, np.where(fired, 0.0, score), cusum)
+
+            diff = x - mean
+            mean = np.where(started, mean + ALPHA * diff, mean)
+            var = np.where(started, (1 - ALPHA) * (var + ALPHA * diff * diff), var)
+            days += started | first
+
+        last = counts[n_days - 1]
+        for i, key in enumerate(keys):
+            if days[i] == 0 and last[i] <= 0:
+                continue
+            state = SeriesState(start_day + n_days - 1)
+            state.count = int(last[i])
+            state.mean, state.var, state.cusum, state.days = float(mean[i]), float(var[i]), float(cusum[i]), int(days[i])
+            if alert_day[i] >= 0:
+                state.alert_day, state.alert_cases, state.alert_score = int(alert_day[i]), int(alert_cases[i]), float(alert_score[i])
+            detector.series[key] = state
+        detector.latest_day = start_day + n_days - 1
+        return detector
+
+    @classmethod
+    def from_rollup(cls, rollup):
+        """
+        Backfill from a DailyRollup's cases[day, district, disease].
+        """
+        if rollup.start_day is None:
+            return cls()
+        counts = rollup.cases[rollup.rows]
+        keys = [(district, disease) for district in rollup.districts for disease in rollup.diseases]
+        return cls.from_counts(counts.reshape(counts.shape[0], -1), rollup.start_day, keys)
+
+    # --- Alerts ---
+    def alerts(self):
+        """
+        Series spiking on the open day, plus those that fired in the last
+        ALERT_WINDOW_DAYS, highest score first. A series with no cases since an
+        earlier day is judged with its days up to latest_day closed, the way
+        from_counts leaves it.
+        """
+        if self.latest_day is None:
+            return []
+        results = []
+        for (district, disease), state in self.series.items():
+            # Closing empty days can't fire, so a series idle since before the window has nothing to report
+            if state.day < self.latest_day - ALERT_WINDOW_DAYS + 1:
+                continue
+            state = state.advanced_to(self.latest_day)
+            score = state.score(state.count)
+            if state.days >= WARMUP_DAYS and state.count >= MIN_CASES and score > CUSUM_H:
+                day, cases, status = state.day, state.count, 'active'
+            elif state.alert_day is not None and state.alert_day > self.latest_day - ALERT_WINDOW_DAYS:
+                day, cases, score, status = state.alert_day, state.alert_cases, state.alert_score, 'recent'
+            else:
+                continue
+            results.append({
+                'district': district,
+                'disease': disease,
+                'date': day_to_date(day).isoformat(),
+                'cases': cases,
+                'expected': round(state.mean, 2),
+                'score': round(score, 2),
+                'status': status
+            })
+        results.sort(key=lambda alert: alert['score'], reverse=True)
+        return results
+
+    def write(self, path, generation=None):
+        header = {
+            'latest_date': day_to_date(self.latest_day).isoformat() if self.latest_day is not None else None,
+            'alerts': self.alerts()
+        }
+        return write_frame(path, MAGIC, header, [], generation)
+
+def read_generation(path):
+    return read_frame_generation(path, MAGIC)
+
+class AlertsReader:
+    """
+    One published generation of alerts (the list lives in the frame header).
+    """
+
+    def __init__(self, path):
+        mapping, self.generation, header, _ = open_frame(path, MAGIC)
+        mapping.close()
+        self.latest_date = header['latest_date']
+        self.alerts = header['alerts']
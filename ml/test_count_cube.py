@@ -0,0 +1,86 @@
+# test_count_cube.py
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+from count_cube import CountCube, CubeReader, UNKNOWN
+from incremental_aggregates import _clean
+
+DISTRICTS = ['Kollam', 'Kottayam', 'Idukki', 'Wayanad']
+CATEGORIES = {'Cholera': 'water_borne', 'Typhoid': 'water_borne', 'Dengue': 'vector_borne', 'Pneumonia': 'respiratory'}
+
+def make_cases(n, seed=3):
+    """
+    Cases with every cube field, some missing (UNKNOWN in the cube) and some in a
+    district the cube doesn't know.
+    """
+    rng = np.random.default_rng(seed)
+    diseases = list(CATEGORIES)
+    cases = pd.DataFrame({
+        'district': np.array(DISTRICTS + ['Elsewhere'], dtype=object)[rng.integers(0, len(DISTRICTS) + 1, n)],
+        'disease': np.array(diseases, dtype=object)[rng.integers(0, len(diseases), n)],
+        'migrant': np.array([True, False, None], dtype=object)[rng.integers(0, 3, n)],
+        'severity': np.array(['Mild', 'Moderate', 'Severe', None], dtype=object)[rng.integers(0, 4, n)],
+        'hospital': np.array([f"H{i:03d}" for i in range(12)] + [None], dtype=object)[rng.integers(0, 13, n)]
+    })
+    cases['category'] = cases['disease'].map(CATEGORIES)
+    return cases
+
+def add_rows(cube, cases, sign=1):
+    # Missing fields reach the cube as None, as DistrictAggregates passes them
+    for row in cases.to_dict('records'):
+        row = {field: _clean(value) for field, value in row.items()}
+        cube.add(row['district'], row['disease'], row['migrant'], row['severity'], row['hospital'],
+                 row['category'], sign=sign)
+
+def expected_query(cases, filters, by):
+    """
+    The same query as a pandas filter + groupby over the case rows.
+    """
+    labelled = cases[cases['district'].isin(DISTRICTS)].fillna(UNKNOWN)
+    for dim, labels in filters.items():
+        labelled = labelled[labelled[dim].isin(labels)]
+    if not by:
+        return len(labelled), {}
+    counts = labelled.groupby(list(by)).size()
+    return len(labelled), {key if isinstance(key, tuple) else (key,): int(n) for key, n in counts.items()}
+
+def test_queries_match_groupby():
+    cases = make_cases(5000)
+    cube = CountCube(DISTRICTS)
+    add_rows(cube, cases)
+    # Deletes take their counts back out
+    removed = cases.sample(500, random_state=1)
+    add_rows(cube, removed, sign=-1)
+    cases = cases.drop(removed.index)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'case_cube.bin')
+        cube.write(path)
+        reader = CubeReader(path)
+        queries = [
+            ({}, ()),
+            ({}, ('district',)),
+            ({'district': ['Kollam', 'Idukki']}, ('disease', 'severity')),
+            ({'migrant': [True]}, ('hospital', 'district')),
+            ({'severity': [UNKNOWN], 'migrant': [UNKNOWN]}, ('disease',)),
+            ({'category': ['water_borne']}, ('district', 'disease')),
+            ({'category': ['water_borne'], 'disease': ['Cholera', 'Dengue']}, ('migrant',)),
+            ({'district': ['Nowhere']}, ('disease',)),
+            # Repeated values count once
+            ({'district': ['Kollam', 'Kollam'], 'migrant': [True, True]}, ('hospital',)),
+            ({'category': ['water_borne', 'water_borne'], 'disease': ['Cholera', 'Cholera']}, ())
+        ]
+        for filters, by in queries:
+            total, rows = reader.query(filters, by)
+            expected_total, expected_rows = expected_query(cases, filters, by)
+            assert total == expected_total, (filters, by)
+            assert {tuple(row[dim] for dim in by): row['cases'] for row in rows} == expected_rows, (filters, by)
+            assert [row['cases'] for row in rows] == sorted((row['cases'] for row in rows), reverse=True)
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
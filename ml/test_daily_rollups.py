@@ -0,0 +1,102 @@
+# test_daily_rollups.py
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+from train_model import AGE_GROUPS, analyze_disease_patterns
+from columnar_loader import day_number
+from incremental_aggregates import DistrictAggregates
+from daily_rollups import DailyRollup, RollupReader, DAY_CHUNK
+from test_incremental_aggregates import CLUSTERED_CSV, make_frames
+
+def published_rollup(df_patients, df_cases, clustered_df, workdir):
+    aggregates = DistrictAggregates()
+    aggregates.rebuild(df_patients, df_cases, clustered_df)
+    path = os.path.join(workdir, 'district_rollup.bin')
+    aggregates.write_rollup(path)
+    return RollupReader(path)
+
+def range_summaries(reader, districts, first_day, last_day):
+    return {district: reader.district_summary(district, first_day, last_day) for district in districts}
+
+def test_full_range_matches_analysis():
+    clustered_df = pd.read_csv(CLUSTERED_CSV)
+    districts = list(clustered_df['district'])
+    # One case per patient, so per-day and per-range patient counts agree
+    df_patients, df_cases = make_frames(2000, districts)
+    expected = analyze_disease_patterns(df_patients, df_cases, clustered_df)
+    with tempfile.TemporaryDirectory() as workdir:
+        reader = published_rollup(df_patients, df_cases, clustered_df, workdir)
+        assert range_summaries(reader, districts, reader.first_day, reader.last_day) == expected
+
+def test_ranges_match_filtered_recompute():
+    clustered_df = pd.read_csv(CLUSTERED_CSV)
+    districts = list(clustered_df['district'])
+    df_patients, df_cases = make_frames(2000, districts)
+    days = df_cases['admission_date'].map(day_number)
+    with tempfile.TemporaryDirectory() as workdir:
+        reader = published_rollup(df_patients, df_cases, clustered_df, workdir)
+        for first_day, last_day in [(reader.first_day, reader.first_day), (reader.first_day + 10, reader.first_day + 29),
+                                    (reader.last_day - 6, reader.last_day), (reader.last_day + 1, reader.last_day + 5)]:
+            in_range = df_cases[(days >= first_day) & (days <= last_day)]
+            expected = analyze_disease_patterns(df_patients, in_range, clustered_df)
+            actual = range_summaries(reader, districts, first_day, last_day)
+            affected = in_range.merge(df_patients[['district', 'patient_id', 'gender']], on=['district', 'patient_id'])
+            for district in districts:
+                left = expected.get(district, {'disease_summary': {}})['disease_summary']
+                right = actual[district]['disease_summary']
+                assert left.keys() == right.keys()
+                for disease, entry in left.items():
+                    assert entry['cases'] == right[disease]['cases']
+                    assert entry['mainly_affected']['age_group'] == right[disease]['mainly_affected']['age_group']
+                    # Ties go to the first gender seen over all days, not within the range
+                    genders = affected[(affected['district'] == district) & (affected['disease_name'] == disease)]['gender'].value_counts()
+                    assert right[disease]['mainly_affected']['gender'] in genders[genders == genders.max()].index
+
+def test_gender_ties_go_to_the_first_seen_gender():
+    rollup = DailyRollup(['A', 'B'], AGE_GROUPS)
+    # Male is first in the global gender order, but A sees Female first
+    rollup.add_patient('B', 'Dengue', 10, '25-44', 'Male')
+    rollup.add_patient('A', 'Dengue', 10, '25-44', 'Female')
+    rollup.add_patient('A', 'Dengue', 11, '25-44', 'Male')
+    for district, day in [('A', 10), ('A', 11), ('B', 10)]:
+        rollup.add_case(district, 'Dengue', day)
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'district_rollup.bin')
+        rollup.write(path, {})
+        summary = RollupReader(path).district_summary('A', 10, 11)
+        assert summary['disease_summary']['Dengue']['mainly_affected']['gender'] == 'Female'
+
+        # Seen anew after its count drops to zero, like a gender_counts entry
+        rollup.add_patient('A', 'Dengue', 10, '25-44', 'Female', sign=-1)
+        rollup.add_patient('A', 'Dengue', 12, '25-44', 'Female')
+        rollup.add_case('A', 'Dengue', 12)
+        rollup.write(path, {})
+        summary = RollupReader(path).district_summary('A', 10, 12)
+        assert summary['disease_summary']['Dengue']['mainly_affected']['gender'] == 'Male'
+
+def test_days_in_any_order():
+    # Cases reach a rebuild in document order: earlier and later days interleave
+    days = np.random.default_rng(2).permutation(np.arange(1000, 3000))
+    rollup = DailyRollup(['A'], AGE_GROUPS)
+    sizes = set()
+    for day in days:
+        rollup.add_case('A', 'Dengue', int(day))
+        sizes.add(rollup.cases.shape[0])
+    # Capacity at least doubles each time it grows
+    assert len(sizes) <= 2 * np.log2(len(days) / DAY_CHUNK) + 2
+    assert rollup.start_day == 1000 and rollup.n_days == 2000
+    assert (rollup.cases[rollup.rows, 0, 0] == 1).all()
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'district_rollup.bin')
+        rollup.write(path, {})
+        reader = RollupReader(path)
+        assert (reader.first_day, reader.last_day) == (1000, 2999)
+        assert reader.district_summary('A', 1500, 1509)['disease_summary']['Dengue']['cases'] == 10
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,223 @@
+# test_incremental_aggregates.py
+import os
+import sys
+import datetime
+import tempfile
+import numpy as np
+import pandas as pd
+
+from train_model import analyze_disease_patterns, get_age_group
+from incremental_aggregates import DistrictAggregates
+from bench_analyze import make_synthetic_data, DISEASES
+
+CLUSTERED_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/kerala_clustered_districts.csv")
+START = datetime.datetime(2024, 1, 1)
+
+class Collections:
+    """
+    Plain copies of the patients/cases collections plus the change events that
+    produce them. Updates keep a document's position, like a MongoDB scan does.
+    """
+
+    def __init__(self, df_patients, df_cases):
+        self.docs = {
+            'patients': {doc['_id']: doc for doc in df_patients.to_dict('records')},
+            'disease_cases': {doc['_id']: doc for doc in df_cases.to_dict('records')}
+        }
+        self.events = []
+
+    def _event(self, collection, op, doc_id, doc=None):
+        event = {'_id': {'_data': f"{len(self.events):08d}"}, 'operationType': op, 'documentKey': {'_id': doc_id}}
+        if doc is not None:
+            event['fullDocument'] = dict(doc)
+        self.events.append((collection, event))
+
+    def insert(self, collection, doc):
+        self.docs[collection][doc['_id']] = doc
+        self._event(collection, 'insert', doc['_id'], doc)
+
+    def replay_insert(self, collection, doc_id):
+        # A resumed stream delivers an insert the state has already applied
+        self._event(collection, 'insert', doc_id, self.docs[collection][doc_id])
+
+    def update(self, collection, doc_id, **fields):
+        doc = self.docs[collection][doc_id] = {**self.docs[collection][doc_id], **fields}
+        self._event(collection, 'update', doc_id, doc)
+
+    def delete(self, collection, doc_id):
+        del self.docs[collection][doc_id]
+        self._event(collection, 'delete', doc_id)
+
+    def frames(self):
+        return (pd.DataFrame(list(self.docs['patients'].values())),
+                pd.DataFrame(list(self.docs['disease_cases'].values())))
+
+def make_frames(n, districts, seed=7):
+    rng = np.random.default_rng(seed)
+    df_patients, df_cases = make_synthetic_data(n, districts, seed)
+    df_patients.insert(0, '_id', [f"p{i}" for i in range(n)])
+    df_cases.insert(0, '_id', [f"c{i}" for i in range(n)])
+    df_cases['admission_date'] = [START + datetime.timedelta(days=int(d)) for d in rng.integers(0, 60, n)]
+    # Cases out of patient order, so gender ties depend on which order is used
+    return df_patients, df_cases.iloc[rng.permutation(n)].reset_index(drop=True)
+
+def seed_and_stream(n=2000, seed=7):
+    """
+    Rebuild from the first 80% of the documents, then the change events of the
+    rest: interleaved inserts, repeat cases, replayed inserts, patient/case
+    updates, district moves and deletes. Returns (clustered_df, seeded frames,
+    Collections, index of the first event after the checkpoint).
+    """
+    rng = np.random.default_rng(seed)
+    clustered_df = pd.read_csv(CLUSTERED_CSV)
+    districts = list(clustered_df['district'])
+    df_patients, df_cases = make_frames(n, districts, seed)
+    split = int(n * 0.8)
+    collections = Collections(df_patients.iloc[:split], df_cases.iloc[:split])
+    patients = df_patients.to_dict('records')
+    cases = df_cases.to_dict('records')
+
+    # --- Before the checkpoint: inserts only ---
+    for i in range(split, n):
+        # Either side of a pair may arrive first
+        first, second = ('patients', patients[i]), ('disease_cases', cases[i])
+        if rng.random() < 0.5:
+            first, second = second, first
+        collections.insert(*first)
+        collections.insert(*second)
+    for i, index in enumerate(rng.choice(n, 200, replace=False)):
+        patient = patients[index]
+        collections.insert('disease_cases', {
+            '_id': f"r{i}", 'case_id': f"REPEAT{i}", 'patient_id': patient['patient_id'],
+            'district': patient['district'], 'disease_name': DISEASES[i % len(DISEASES)],
+            'admission_date': START + datetime.timedelta(days=int(rng.integers(0, 60)))
+        })
+    for doc_id in rng.choice(list(collections.docs['patients']), 20, replace=False):
+        collections.replay_insert('patients', doc_id)
+    for doc_id in rng.choice(list(collections.docs['disease_cases']), 20, replace=False):
+        collections.replay_insert('disease_cases', doc_id)
+    checkpoint_at = len(collections.events)
+
+    # --- After the checkpoint: updates, moves and deletes ---
+    patient_ids = list(collections.docs['patients'])
+    case_ids = list(collections.docs['disease_cases'])
+    for doc_id in rng.choice(patient_ids, 100, replace=False):
+        collections.update('patients', doc_id, age=int(rng.integers(1, 90)),
+                           gender=str(rng.choice(['Male', 'Female'])))
+    for doc_id in rng.choice(patient_ids, 60, replace=False):
+        collections.update('patients', doc_id, district=str(rng.choice(districts)))
+    for doc_id in rng.choice(case_ids, 60, replace=False):
+        collections.update('disease_cases', doc_id, district=str(rng.choice(districts)))
+    for doc_id in rng.choice(case_ids, 40, replace=False):
+        collections.update('disease_cases', doc_id, disease_name=str(rng.choice(DISEASES)))
+    for doc_id in rng.choice(case_ids, 100, replace=False):
+        if doc_id in collections.docs['disease_cases']:
+            collections.delete('disease_cases', doc_id)
+    deleted = rng.choice(patient_ids, 60, replace=False)
+    for doc_id in deleted:
+        collections.delete('patients', doc_id)
+    # The same patient registered again under a new document
+    for i, doc_id in enumerate(deleted[:20]):
+        old = next(p for p in patients if p['_id'] == doc_id)
+        collections.insert('patients', {**old, '_id': f"again{i}", 'gender': 'Female'})
+    return clustered_df, df_patients.iloc[:split], df_cases.iloc[:split], collections, checkpoint_at
+
+def apply(aggregates, events):
+    for collection, event in events:
+        aggregates.apply_change(collection, event)
+
+def expected_counts(df_patients, df_cases):
+    """
+    Case, age group and gender counts per (district, disease), recomputed in pandas.
+    """
+    case_counts = df_cases.groupby(['district', 'disease_name']).size().to_dict()
+    affected = df_cases[['district', 'disease_name', 'patient_id']].drop_duplicates().merge(
+        df_patients[['district', 'patient_id', 'age', 'gender']], on=['district', 'patient_id'])
+    affected['age_group'] = affected['age'].map(get_age_group)
+    age_counts = {pair: group['age_group'].value_counts().to_dict()
+                  for pair, group in affected.groupby(['district', 'disease_name'])}
+    gender_counts = {pair: group['gender'].value_counts().to_dict()
+                     for pair, group in affected.groupby(['district', 'disease_name'])}
+    return case_counts, age_counts, gender_counts
+
+def actual_counts(aggregates):
+    age_counts = {pair: {g: n for g, n in counts.items() if n} for pair, counts in aggregates.age_counts.items()}
+    return (dict(aggregates.case_counts),
+            {pair: counts for pair, counts in age_counts.items() if counts},
+            {pair: dict(counts) for pair, counts in aggregates.gender_counts.items() if counts})
+
+def summary_differences(expected, actual, gender_counts):
+    """
+    Entries that differ, except a mainly_affected gender that is one of several
+    tied genders: streamed events break those ties in arrival order.
+    """
+    differences = []
+    for district in expected.keys() | actual.keys():
+        left = expected.get(district, {})
+        right = actual.get(district, {})
+        if left.get('district_info') != right.get('district_info'):
+            differences.append((district, 'district_info'))
+        left, right = left.get('disease_summary', {}), right.get('disease_summary', {})
+        for disease in left.keys() | right.keys():
+            a, b = left.get(disease), right.get(disease)
+            if a == b:
+                continue
+            counts = gender_counts.get((district, disease), {})
+            tied = [g for g, n in counts.items() if n == max(counts.values())]
+            if (a is None or b is None or a['cases'] != b['cases'] or a['possible_causes'] != b['possible_causes']
+                    or a['mainly_affected']['age_group'] != b['mainly_affected']['age_group']
+                    or len(tied) < 2 or b['mainly_affected']['gender'] not in tied):
+                differences.append((district, disease, a, b))
+    return differences
+
+def test_rebuild_matches_analysis():
+    clustered_df, df_patients, df_cases, _, _ = seed_and_stream()
+    aggregates = DistrictAggregates()
+    aggregates.rebuild(df_patients, df_cases, clustered_df)
+    # Seeded state breaks gender ties like the pandas path: exact equality
+    assert aggregates.to_district_data() == analyze_disease_patterns(df_patients, df_cases, clustered_df)
+
+def test_change_stream_matches_analysis():
+    clustered_df, df_patients, df_cases, collections, _ = seed_and_stream()
+    aggregates = DistrictAggregates()
+    aggregates.rebuild(df_patients, df_cases, clustered_df)
+    apply(aggregates, collections.events)
+    assert not aggregates.dirty
+
+    final_patients, final_cases = collections.frames()
+    expected = expected_counts(final_patients, final_cases)
+    assert actual_counts(aggregates) == expected
+    assert len(aggregates.patient_keys) == len(final_patients) and len(aggregates.cases) == len(final_cases)
+    assert not summary_differences(analyze_disease_patterns(final_patients, final_cases, clustered_df),
+                                   aggregates.to_district_data(), expected[2])
+
+def test_restored_checkpoint_resumes_the_stream():
+    clustered_df, df_patients, df_cases, collections, checkpoint_at = seed_and_stream()
+    aggregates = DistrictAggregates()
+    aggregates.rebuild(df_patients, df_cases, clustered_df)
+    apply(aggregates, collections.events[:checkpoint_at])
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'aggregates.pkl')
+        assert aggregates.checkpoint(path)
+        restored = DistrictAggregates()
+        assert restored.restore(path, clustered_df)
+    assert restored.resume_tokens == aggregates.resume_tokens
+    assert restored.to_district_data() == aggregates.to_district_data()
+
+    apply(aggregates, collections.events[checkpoint_at:])
+    apply(restored, collections.events[checkpoint_at:])
+    assert actual_counts(restored) == actual_counts(aggregates)
+    assert restored.to_district_data() == aggregates.to_district_data()
+
+if __name__ == "__main__":
+    failed = False
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            try:
+                test()
+                print(f"✅ {name}")
+            except AssertionError:
+                failed = True
+                print(f"❌ {name}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,101 @@
+# test_mongo_analysis.py
+import os
+import sys
+import json
+import argparse
+import pandas as pd
+
+import train_model
+from train_model import fetch_analytics_data, analyze_disease_patterns
+from mongo_analysis import analyze_disease_patterns_pipeline
+from bench_analyze import make_synthetic_data
+
+CLUSTERED_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/kerala_clustered_districts.csv")
+
+def seed_offline_db(n_cases=1000):
+    """
+    mongomock database with synthetic patients/cases plus the awkward shapes real
+    data has: extended-JSON ages, patients registered in another district,
+    missing genders, repeat cases and non-numeric patient ids.
+    """
+    import mongomock
+    clustered_df = pd.read_csv(CLUSTERED_CSV)
+    districts = list(clustered_df['district'])
+    df_patients, df_cases = make_synthetic_data(n_cases, districts)
+    patients = df_patients.to_dict('records')
+    cases = df_cases.to_dict('records')
+    # A disease of its own, so a wrong join flips its mainly_affected
+    a, b = districts[0], districts[1]
+    patients += [
+        {'patient_id': 'TN00000001', 'district': a, 'age': {'$numberInt': '70'}, 'gender': 'Female'},
+        {'patient_id': 'abc-123', 'district': a, 'age': 9, 'gender': None},
+        {'patient_id': 'P-7', 'district': b, 'age': 30, 'gender': 'Female'},
+        {'patient_id': 'KL-X1', 'district': a, 'age': 30, 'gender': 'Male'},
+        {'patient_id': 'KL-X2', 'district': a, 'age': 40, 'gender': 'Male'}
+    ]
+    # TN00000001 twice: one affected patient, two cases. P-7 is registered in b,
+    # so it is a case in a but not an affected patient there
+    cases += [
+        {'patient_id': patient_id, 'district': a, 'disease_name': 'Nipah'}
+        for patient_id in ['TN00000001', 'TN00000001', 'abc-123', 'P-7', 'KL-X1', 'KL-X2']
+    ]
+    db = mongomock.MongoClient().kerala_health_test
+    db.patients.insert_many(patients)
+    db.disease_cases.insert_many(cases)
+    return db, clustered_df
+
+def compare(expected, actual):
+    """
+    Print every district/disease where the two summaries differ; True if none do.
+    """
+    if json.dumps(expected, default=str) == json.dumps(actual, default=str):
+        return True
+    for district in expected.keys() | actual.keys():
+        left = expected.get(district, {}).get('disease_summary', {})
+        right = actual.get(district, {}).get('disease_summary', {})
+        for disease in left.keys() | right.keys():
+            a, b = left.get(disease), right.get(disease)
+            if json.dumps(a, default=str) != json.dumps(b, default=str):
+                print(f"  🔹 {district} / {disease}:\n      pandas:   {a}\n      pipeline: {b}")
+    return False
+
+def run_parity(db, clustered_df):
+    train_model.use_database(db)
+    train_model.LOCAL_SNAPSHOT = False
+    # --- pandas path (pulls every document) ---
+    df_patients, df_cases = fetch_analytics_data()
+    expected = analyze_disease_patterns(df_patients, df_cases, clustered_df)
+    # --- aggregation pipeline path (only aggregated rows leave MongoDB) ---
+    actual = analyze_disease_patterns_pipeline(db.patients, db.disease_cases, clustered_df)
+    return expected, actual
+
+def test_pipeline_matches_pandas_offline():
+    import pytest
+    pytest.importorskip("mongomock")
+    db, clustered_df = seed_offline_db()
+    expected, actual = run_parity(db, clustered_df)
+    assert compare(expected, actual)
+    nipah = expected[clustered_df['district'].iloc[0]]['disease_summary']['Nipah']
+    assert nipah['cases'] == 6
+    assert nipah['mainly_affected'] == {'age_group': '25-44', 'gender': 'Male'}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the aggregation pipeline against the pandas analysis")
+    parser.add_argument("--live", action="store_true", help="use MONGODB_CONNECTION_STRING instead of an in-process mongomock")
+    parser.add_argument("--cases", type=int, default=1000, help="synthetic cases for the offline check")
+    args = parser.parse_args()
+
+    if args.live:
+        clustered_df, _, _ = train_model.load_and_cluster()
+        expected, actual = run_parity(train_model.get_db(), clustered_df)
+    else:
+        try:
+            expected, actual = run_parity(*seed_offline_db(args.cases))
+        except ImportError:
+            sys.exit("❌ mongomock is not installed: pip install mongomock, or pass --live")
+
+    if compare(expected, actual):
+        print(f"✅ Pipeline output matches pandas output ({len(expected)} districts)")
+        sys.exit(0)
+    print("❌ Pipeline output differs from pandas output")
+    sys.exit(1)
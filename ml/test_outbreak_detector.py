@@ -0,0 +1,90 @@
+# test_outbreak_detector.py
+import os
+import tempfile
+import numpy as np
+
+from train_model import AGE_GROUPS
+from daily_rollups import DailyRollup
+from outbreak_detector import OutbreakDetector, AlertsReader, WARMUP_DAYS, MIN_CASES, ALERT_WINDOW_DAYS
+
+START_DAY = 19723  # 2024-01-01
+KEYS = [('Kollam', 'Cholera'), ('Kollam', 'Dengue'), ('Idukki', 'Cholera'), ('Idukki', 'Dengue')]
+
+def make_counts(n_days=120, seed=5):
+    """
+    Poisson daily counts per series: one starts late, one has a quiet gap, one
+    spikes on day 80 and has no cases the day after.
+    """
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson([4.0, 2.0, 6.0, 1.0], size=(n_days, len(KEYS)))
+    counts[:30, 1] = 0
+    counts[50:70, 3] = 0
+    counts[80, 2] = 40
+    counts[81, 2] = 0
+    return counts
+
+def stream(counts, start_day=START_DAY):
+    detector = OutbreakDetector()
+    for t, row in enumerate(counts):
+        for (district, disease), n in zip(KEYS, row):
+            for _ in range(int(n)):
+                detector.add(district, disease, start_day + t)
+    return detector
+
+def state(detector):
+    # Streamed series only move on with their own cases; compare them as of the latest day
+    states = {key: s.advanced_to(detector.latest_day) for key, s in detector.series.items()}
+    return {key: tuple(round(v, 9) if isinstance(v, float) else v
+                       for v in (s.day, s.count, s.mean, s.var, s.cusum, s.days, s.alert_day, s.alert_cases, s.alert_score))
+            for key, s in states.items()}
+
+def test_streaming_matches_backfill():
+    counts = make_counts()
+    for n_days in (1, 20, 81, 82, 83, len(counts)):
+        streamed = stream(counts[:n_days])
+        backfilled = OutbreakDetector.from_counts(counts[:n_days], START_DAY, KEYS)
+        assert state(streamed) == state(backfilled), n_days
+        assert streamed.alerts() == backfilled.alerts(), n_days
+        assert streamed.latest_day == backfilled.latest_day
+
+def test_from_rollup_matches_from_counts():
+    counts = make_counts()
+    rollup = DailyRollup(['Kollam', 'Idukki'], AGE_GROUPS)
+    for t, row in enumerate(counts):
+        for (district, disease), n in zip(KEYS, row):
+            for _ in range(int(n)):
+                rollup.add_case(district, disease, START_DAY + t)
+    assert state(OutbreakDetector.from_rollup(rollup)) == state(OutbreakDetector.from_counts(counts, START_DAY, KEYS))
+
+def test_spike_is_detected():
+    counts = make_counts()
+    spike = ('Idukki', 'Cholera')
+    # The spike is the open day: active
+    alerts = stream(counts[:81]).alerts()
+    assert [(a['district'], a['disease'], a['status']) for a in alerts] == [spike + ('active',)]
+    assert alerts[0]['cases'] == 40 and alerts[0]['expected'] < 10
+
+    # Closed but within the window: recent, then gone
+    detector = stream(counts[:81 + ALERT_WINDOW_DAYS - 1])
+    assert [(a['district'], a['disease'], a['status']) for a in detector.alerts()] == [spike + ('recent',)]
+    assert not stream(counts[:81 + ALERT_WINDOW_DAYS]).alerts()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'alerts.bin')
+        detector.write(path)
+        reader = AlertsReader(path)
+        assert reader.alerts == detector.alerts() and reader.latest_date == '2024-03-23'
+
+def test_no_alert_before_warmup_or_below_min_cases():
+    counts = np.full((WARMUP_DAYS + 5, len(KEYS)), 1)
+    # A jump during warm-up, and a large relative jump that stays under MIN_CASES
+    counts[WARMUP_DAYS - 3, 0] = 30
+    counts[WARMUP_DAYS + 4, 1] = MIN_CASES - 1
+    for n_days in range(1, len(counts) + 1):
+        assert not stream(counts[:n_days]).alerts()
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
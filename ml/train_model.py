@@ -5,25 +5,24 @@ import json
 import pandas as pd
 import numpy as np
 import pickle
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from pymongo import MongoClient
 from dotenv import load_dotenv
 from datetime import datetime
+from collections import defaultdict
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 from utils_masking import mask_patient_data, unmask_patient_data
+import model_registry
+import columnar_loader
+from local_snapshot import LocalSnapshot
+import district_snapshot
+import metrics
 
-# Load environment variables
+# Load environment variables (a local file read; the settings below come from it)
 load_dotenv()
-MONGO_URI = os.getenv("MONGODB_CONNECTION_STRING")
 DB_NAME = "kerala_health_system"
 
-# MongoDB connection
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
-patients_col = db.patients
-disease_col = db.disease_cases
-districts_col = db.districts
+# MongoDB connection: created by get_db() on first use, so importing this module
+# does no DNS lookups or connections (mongodb+srv:// URIs resolve in MongoClient())
+_db = None
 
 # Paths
 CSV_FILE = "../data/kerala_master_dataset.csv"
@@ -31,16 +30,50 @@ KMEANS_MODEL_PATH = "../models/kmeans_risk_model.pkl"
 SCALER_PATH = "../models/scaler.pkl"
 CLUSTERED_CSV = "../data/kerala_clustered_districts.csv"
 DISTRICT_JSON_PATH = "../district_data/district_data.json"
+DISTRICT_SNAPSHOT_PATH = "../district_data/district_data.snap"
+DISTRICT_ROLLUP_PATH = "../district_data/district_rollup.bin"
+DISTRICT_CUBE_PATH = "../district_data/district_cube.bin"
+HOSPITAL_INDEX_PATH = "../district_data/hospitals.bin"
+ALERTS_PATH = "../district_data/alerts.bin"
+SNAPSHOT_DIR = "../data/snapshot"
+
+# Keep a local columnar copy of the analytics columns and only pull new documents
+# (LOCAL_SNAPSHOT=0 reads both collections from MongoDB on every refresh)
+LOCAL_SNAPSHOT = os.getenv("LOCAL_SNAPSHOT", "1") == "1"
+
+# "pandas" pulls both collections and analyzes locally; "mongo" runs the
+# aggregation pipelines in mongo_analysis.py and only fetches aggregated rows
+ANALYSIS_ENGINE = os.getenv("ANALYSIS_ENGINE", "pandas")
 
 # --- Clustering Function ---
+FEATURES = ['piped_water_dwelling_pct', 'own_well_pct', 'community_water_pct',
+            'surface_water_pct', 'one_toilet_pct', 'two_toilet_pct', 'three_plus_toilet_pct',
+            'water_risk_rating', 'sanitation_risk_rating', 'crowding_risk_rating',
+            'healthcare_access_risk_rating', 'overall_risk_rating']
+
+@metrics.timed('cluster')
 def load_and_cluster(csv_file=CSV_FILE, n_clusters=4):
-    df = pd.read_csv(csv_file)
-    features = ['piped_water_dwelling_pct', 'own_well_pct', 'community_water_pct',
-                'surface_water_pct', 'one_toilet_pct', 'two_toilet_pct', 'three_plus_toilet_pct',
-                'water_risk_rating', 'sanitation_risk_rating', 'crowding_risk_rating',
-                'healthcare_access_risk_rating', 'overall_risk_rating']
+    # Refit only when the CSV, feature list or n_clusters changed (not on another sklearn version)
+    fingerprint = model_registry.compute_fingerprint(csv_file, FEATURES, n_clusters)
+    cached = model_registry.get_cached(fingerprint)
+    if cached is not None:
+        return cached
 
-    df_features = df[features].fillna(0)
+    df = pd.read_csv(csv_file)
+    saved = model_registry.load_saved(fingerprint, KMEANS_MODEL_PATH, SCALER_PATH)
+    if saved is not None:
+        scaler, kmeans = saved
+        df['risk_cluster'] = kmeans.labels_
+        if not os.path.exists(CLUSTERED_CSV):
+            df.to_csv(CLUSTERED_CSV, index=False)
+        print(f"✅ Clustering models loaded from '{os.path.dirname(KMEANS_MODEL_PATH)}' (inputs unchanged)")
+        model_registry.remember(fingerprint, df, scaler, kmeans)
+        return df, scaler, kmeans
+
+    # Only a refit needs these here; loading the saved models imports sklearn through pickle
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.cluster import KMeans
+    df_features = df[FEATURES].fillna(0)
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(df_features)
 
@@ -49,35 +82,117 @@ def load_and_cluster(csv_file=CSV_FILE, n_clusters=4):
     df['risk_cluster'] = clusters
 
     # Save models
-    os.makedirs("../models", exist_ok=True)
-    with open(KMEANS_MODEL_PATH, "wb") as f:
-        pickle.dump(kmeans, f)
-    with open(SCALER_PATH, "wb") as f:
-        pickle.dump(scaler, f)
+    model_registry.save(fingerprint, kmeans, scaler, KMEANS_MODEL_PATH, SCALER_PATH)
 
     df.to_csv(CLUSTERED_CSV, index=False)
-    print(f"✅ Clustering done. Models saved in '../models/'\n", df[['district', 'risk_cluster']])
+    print(f"✅ Clustering done. Models saved in '{os.path.dirname(KMEANS_MODEL_PATH)}'\n", df[['district', 'risk_cluster']])
+    model_registry.remember(fingerprint, df, scaler, kmeans)
     return df, scaler, kmeans
 
 # --- Fetch and Mask ---
+# Everything analyze_disease_patterns reads (and its column types); names and addresses are never needed
+PATIENT_ANALYTICS_FIELDS = {'patient_id': 'key', 'district': 'category', 'age': 'age', 'gender': 'category'}
+CASE_ANALYTICS_FIELDS = {'patient_id': 'key', 'district': 'category', 'disease_name': 'category',
+                         'admission_date': 'day', 'is_migrant_patient': 'category', 'severity': 'category',
+                         'hospital_id': 'category', 'disease_category': 'category'}
+
+def normalize_age(df_patients):
+    # Convert age from MongoDB extended JSON if needed
+    if 'age' in df_patients.columns and isinstance(df_patients.loc[0, 'age'], dict):
+        df_patients['age'] = df_patients['age'].apply(lambda x: int(x.get('$numberInt', 0)))
+    return df_patients
+
+# Collections are bound by get_db()/use_database()
+patients_snapshot = LocalSnapshot(None, PATIENT_ANALYTICS_FIELDS, os.path.join(SNAPSHOT_DIR, "patients"))
+cases_snapshot = LocalSnapshot(None, CASE_ANALYTICS_FIELDS, os.path.join(SNAPSHOT_DIR, "disease_cases"))
+
+def use_database(database):
+    """
+    Point every fetch at `database` instead of the configured cluster (e.g. a local stand-in).
+    """
+    global _db
+    _db = database
+    patients_snapshot.collection = database.patients
+    cases_snapshot.collection = database.disease_cases
+
+def get_db():
+    """
+    The configured database, connecting on first call.
+    """
+    if _db is None:
+        from pymongo import MongoClient
+        use_database(MongoClient(os.getenv("MONGODB_CONNECTION_STRING"))[DB_NAME])
+    return _db
+
+# Module-level names from before get_db(); resolved (and connected) on first access
+_LAZY_COLLECTIONS = {'patients_col': 'patients', 'disease_col': 'disease_cases',
+                     'districts_col': 'districts', 'hospitals_col': 'hospitals'}
+
+def __getattr__(name):
+    if name in _LAZY_COLLECTIONS:
+        return get_db()[_LAZY_COLLECTIONS[name]]
+    if name == 'db':
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@metrics.timed('fetch')
+def fetch_analytics_data(include_ids=False, chunk_size=columnar_loader.CHUNK_SIZE, reconcile=False):
+    """
+    Fetch only the columns aggregation needs, streamed into typed columns
+    (categorical district/disease/gender/patient_id, UInt8 age, int32 days).
+    With LOCAL_SNAPSHOT only documents newer than the local snapshot are pulled;
+    reconcile re-downloads it (for callers that know updates were missed).
+    No PII is read, so nothing is masked.
+    include_ids keeps _id for callers that track documents (incremental aggregates).
+    """
+    db = get_db()
+    if LOCAL_SNAPSHOT:
+        df_patients = patients_snapshot.sync(include_ids, reconcile)
+        df_cases = cases_snapshot.sync(include_ids, reconcile)
+    else:
+        df_patients = columnar_loader.load_columns(db.patients, PATIENT_ANALYTICS_FIELDS,
+                                                   chunk_size=chunk_size, include_ids=include_ids)
+        df_cases = columnar_loader.load_columns(db.disease_cases, CASE_ANALYTICS_FIELDS,
+                                                chunk_size=chunk_size, include_ids=include_ids)
+
+    if df_patients.empty or df_cases.empty:
+        print("⚠️ No live data found in MongoDB. Make sure atlas_setup ran.")
+        return pd.DataFrame(), pd.DataFrame()
+
+    metrics.count_rows('fetch', len(df_patients) + len(df_cases))
+    return df_patients, df_cases
+
+def fetch_hospitals():
+    """
+    Hospital records (ids, capacities, coordinates) for the hospital index.
+    """
+    projection = {'_id': 0, 'hospital_id': 1, 'name': 1, 'district': 1, 'type': 1,
+                  'bed_capacity': 1, 'monthly_capacity': 1, 'coordinates': 1}
+    return list(get_db().hospitals.find({}, projection))
+
+@metrics.timed('fetch_live')
 def fetch_live_data(mask=True):
-    patient_docs = list(patients_col.find({}))
-    case_docs = list(disease_col.find({}))
+    """
+    Full patient-level documents, masked by default. Only for paths that emit
+    patient rows; analytics should use fetch_analytics_data.
+    """
+    db = get_db()
+    patient_docs = list(db.patients.find({}))
+    case_docs = list(db.disease_cases.find({}))
 
     if not patient_docs or not case_docs:
         print("⚠️ No live data found in MongoDB. Make sure atlas_setup ran.")
         return pd.DataFrame(), pd.DataFrame(), {}
 
-    df_patients = pd.DataFrame(patient_docs)
+    df_patients = normalize_age(pd.DataFrame(patient_docs))
     df_cases = pd.DataFrame(case_docs)
 
-    # Convert age from MongoDB extended JSON if needed
-    if 'age' in df_patients.columns and isinstance(df_patients.loc[0, 'age'], dict):
-        df_patients['age'] = df_patients['age'].apply(lambda x: int(x.get('$numberInt', 0)))
-
+    metrics.count_rows('fetch_live', len(df_patients) + len(df_cases))
     mask_map = {}
     if mask:
-        df_patients, mask_map = mask_patient_data(df_patients)
+        with metrics.span('mask'):
+            df_patients, mask_map = mask_patient_data(df_patients)
+        metrics.count_rows('mask', len(df_patients))
 
     return df_patients, df_cases, mask_map
 
@@ -95,64 +210,135 @@ def get_risk_tag(district_info):
     return ', '.join(tags)
 
 # --- Disease Analysis ---
+RISK_THRESHOLDS = {
+    'water_risk_rating': 5,
+    'sanitation_risk_rating': 5,
+    'crowding_risk_rating': 5,
+    'healthcare_access_risk_rating': 5
+}
+
+AGE_GROUPS = ['0-14', '15-24', '25-44', '45-64', '65+']
+AGE_BINS = [-np.inf, 14, 24, 44, 64, np.inf]
+
+def get_age_group(age):
+    if age is None or age != age:
+        return None
+    if age <= 14:
+        return '0-14'
+    if 15 <= age <= 24:
+        return '15-24'
+    if 25 <= age <= 44:
+        return '25-44'
+    if 45 <= age <= 64:
+        return '45-64'
+    if age >= 65:
+        return '65+'
+    return None
+
+def get_possible_causes(district_info):
+    possible_causes = []
+    if district_info['water_risk_rating'] > RISK_THRESHOLDS['water_risk_rating']:
+        possible_causes.append("High water risk")
+    if district_info['sanitation_risk_rating'] > RISK_THRESHOLDS['sanitation_risk_rating']:
+        possible_causes.append("Poor sanitation")
+    if district_info['crowding_risk_rating'] > RISK_THRESHOLDS['crowding_risk_rating']:
+        possible_causes.append("High population density / crowding")
+    if district_info['healthcare_access_risk_rating'] > RISK_THRESHOLDS['healthcare_access_risk_rating']:
+        possible_causes.append("Low healthcare access")
+    return possible_causes
+
+def build_disease_entry(cases, age_counts, gender_counts, district_info):
+    """
+    Build one disease entry of the district summary from precomputed counts.
+    age_counts is keyed by AGE_GROUPS; gender_counts keeps value_counts order.
+    """
+    age_counts = {group: age_counts.get(group, 0) for group in AGE_GROUPS}
+    max_age_group = max(age_counts, key=age_counts.get)
+    main_gender = max(gender_counts, key=gender_counts.get) if gender_counts else None
+
+    return {
+        'cases': cases,
+        'mainly_affected': {'age_group': max_age_group, 'gender': main_gender},
+        'possible_causes': get_possible_causes(district_info)
+    }
+
+def get_district_record(district_info):
+    """
+    District attributes as typed, JSON-native fields (numpy scalars unwrapped, NaN -> None).
+    """
+    record = {}
+    for key, value in district_info.items():
+        if hasattr(value, 'item'):
+            value = value.item()
+        if isinstance(value, float) and value != value:
+            value = None
+        record[key] = value
+    return record
+
+def build_district_entry(district_info, disease_summary):
+    # District attributes are emitted once; every disease below shares them
+    return {'district_info': get_district_record(district_info), 'disease_summary': disease_summary}
+
+@metrics.timed('analyze')
 def analyze_disease_patterns(df_patients, df_cases, clustered_df, mask_map=None):
+    """
+    Per-district disease summary, computed in one pass:
+    cases are joined to their patients once, ages binned with a single cut and
+    every age/gender count comes out of one grouped reduction.
+    """
     summary = {}
     if df_patients.empty or df_cases.empty:
         return summary
+    metrics.count_rows('analyze', len(df_cases))
 
     if mask_map:
         df_patients = unmask_patient_data(df_patients, mask_map)
 
-    RISK_THRESHOLDS = {
-        'water_risk_rating': 5,
-        'sanitation_risk_rating': 5,
-        'crowding_risk_rating': 5,
-        'healthcare_access_risk_rating': 5
-    }
-
     districts = clustered_df['district'].unique()
+    cases = df_cases.loc[df_cases['district'].isin(districts), ['district', 'disease_name', 'patient_id']]
+    # sort=False keeps diseases in first-appearance order, like unique()
+    case_counts = cases.groupby(['district', 'disease_name'], sort=False, observed=True).size()
+
+    # A patient counts once per disease, and only if registered in the case's district.
+    # Both sides join on int codes over the full patient_id strings; missing ids join nothing.
+    patients = df_patients[['district', 'patient_id', 'age', 'gender']].reset_index(drop=True)
+    patients['row'] = np.arange(len(patients))
+    patient_codes, case_codes = columnar_loader.shared_codes(patients['patient_id'], cases['patient_id'])
+    patients['patient_id'] = patient_codes
+    cases = cases.assign(patient_id=case_codes)
+    patients = patients[patient_codes >= 0]
+    cases = cases[case_codes >= 0]
+    affected = cases.drop_duplicates().merge(patients, on=['district', 'patient_id'])
+    affected['age_group'] = pd.cut(affected['age'], bins=AGE_BINS, labels=AGE_GROUPS)
+
+    # row = first appearance, which is how value_counts orders gender ties
+    counts = affected.groupby(['district', 'disease_name', 'age_group', 'gender'],
+                              observed=True, dropna=False).agg(n=('row', 'size'), first=('row', 'min'))
+
+    age_counts = defaultdict(dict)
+    gender_rows = defaultdict(dict)
+    for (district, disease, age_group, gender), n, first in zip(counts.index, counts['n'], counts['first']):
+        pair = (district, disease)
+        if age_group == age_group:
+            age_counts[pair][age_group] = age_counts[pair].get(age_group, 0) + int(n)
+        if gender == gender:
+            total, seen = gender_rows[pair].get(gender, (0, first))
+            gender_rows[pair][gender] = (total + int(n), min(seen, first))
+
+    diseases_by_district = defaultdict(list)
+    for district, disease in case_counts.index:
+        diseases_by_district[district].append(disease)
+
     for district in districts:
-        district_patients = df_patients[df_patients['district'] == district]
-        district_cases = df_cases[df_cases['district'] == district]
         district_info = clustered_df[clustered_df['district'] == district].iloc[0]
-
         disease_summary = {}
-        diseases = district_cases['disease_name'].unique() if not district_cases.empty else []
-
-        for disease in diseases:
-            disease_cases = district_cases[district_cases['disease_name'] == disease]
-            affected_patients = district_patients[district_patients['patient_id'].isin(disease_cases['patient_id'])]
-
-            age_counts = {
-                '0-14': len(affected_patients[affected_patients['age'] <= 14]),
-                '15-24': len(affected_patients[(affected_patients['age'] >= 15) & (affected_patients['age'] <= 24)]),
-                '25-44': len(affected_patients[(affected_patients['age'] >= 25) & (affected_patients['age'] <= 44)]),
-                '45-64': len(affected_patients[(affected_patients['age'] >= 45) & (affected_patients['age'] <= 64)]),
-                '65+': len(affected_patients[affected_patients['age'] >= 65])
-            }
-            max_age_group = max(age_counts, key=age_counts.get)
-
-            gender_counts = affected_patients['gender'].value_counts().to_dict()
-            main_gender = max(gender_counts, key=gender_counts.get) if gender_counts else None
-
-            possible_causes = []
-            if district_info['water_risk_rating'] > RISK_THRESHOLDS['water_risk_rating']:
-                possible_causes.append("High water risk")
-            if district_info['sanitation_risk_rating'] > RISK_THRESHOLDS['sanitation_risk_rating']:
-                possible_causes.append("Poor sanitation")
-            if district_info['crowding_risk_rating'] > RISK_THRESHOLDS['crowding_risk_rating']:
-                possible_causes.append("High population density / crowding")
-            if district_info['healthcare_access_risk_rating'] > RISK_THRESHOLDS['healthcare_access_risk_rating']:
-                possible_causes.append("Low healthcare access")
-
-            disease_summary[disease] = {
-                'cases': len(disease_cases),
-                'mainly_affected': {'age_group': max_age_group, 'gender': main_gender},
-                'possible_causes': possible_causes,
-                'district_info': district_info
-            }
-
-        summary[district] = {'disease_summary': disease_summary}
+        for disease in diseases_by_district.get(district, []):
+            pair = (district, disease)
+            genders = sorted(gender_rows[pair].items(), key=lambda g: (-g[1][0], g[1][1]))
+            gender_counts = {gender: total for gender, (total, _) in genders}
+            disease_summary[disease] = build_disease_entry(int(case_counts[pair]), age_counts[pair], gender_counts, district_info)
+
+        summary[district] = build_district_entry(district_info, disease_summary)
 
     return summary
 
@@ -161,6 +347,7 @@ def print_summary(summary, top_n=None):
     for district, info in summary.items():
         print(f"\n🏥 {district} Disease Summary:")
         disease_data = info['disease_summary']
+        risk_tag = get_risk_tag(info['district_info'])
 
         sorted_diseases = sorted(disease_data.items(), key=lambda x: x[1]['cases'], reverse=True)
         if top_n:
@@ -170,7 +357,6 @@ def print_summary(summary, top_n=None):
             cases = data['cases']
             main = data['mainly_affected']
             causes = data['possible_causes']
-            risk_tag = get_risk_tag(data['district_info'])
 
             print(f"  🔹 {disease} [{risk_tag}]: {cases} cases")
             print(f"      - Primarily affected: Age {main.get('age_group','N/A')}, "
@@ -185,17 +371,48 @@ def get_fresh_district_data(df_patients, df_cases, clustered_df, mask_map=None):
         district_data[district] = info
     return district_data
 
+# --- Write JSON for API ---
+# v1: district_info was a stringified pandas Series repeated in every disease entry
+# v2: district_info typed and stored once per district, compact separators
+DISTRICT_SCHEMA_VERSION = 2
+
+@metrics.timed('write')
+def write_district_json(district_data):
+    """
+    Publish district_data as the JSON file and the memory-mapped snapshot the API reads.
+    Both are written to a temp file and renamed, so readers never see a partial write.
+    Returns the snapshot generation.
+    """
+    os.makedirs(os.path.dirname(DISTRICT_JSON_PATH), exist_ok=True)
+    payload = {'schema_version': DISTRICT_SCHEMA_VERSION, 'districts': district_data}
+    tmp = DISTRICT_JSON_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, separators=(',', ':'))
+    os.replace(tmp, DISTRICT_JSON_PATH)
+    generation = district_snapshot.write_snapshot(DISTRICT_SNAPSHOT_PATH, district_data, DISTRICT_SCHEMA_VERSION)
+    metrics.BYTES_WRITTEN.inc(os.path.getsize(DISTRICT_JSON_PATH), artifact='json')
+    metrics.BYTES_WRITTEN.inc(os.path.getsize(DISTRICT_SNAPSHOT_PATH), artifact='snapshot')
+    print(f"\n✅ District JSON refreshed at '{DISTRICT_JSON_PATH}' (snapshot generation {generation})")
+    return generation
+
 # --- NEW: Regenerate JSON for API ---
+@metrics.timed('refresh')
 def regenerate_district_json():
     os.makedirs(os.path.dirname(DISTRICT_JSON_PATH), exist_ok=True)
     clustered_df, scaler, kmeans = load_and_cluster()
-    df_patients, df_cases, mask_map = fetch_live_data(mask=True)
-    summary = analyze_disease_patterns(df_patients, df_cases, clustered_df, mask_map)
-    #print_summary(summary)
-    district_data = get_fresh_district_data(df_patients, df_cases, clustered_df, mask_map)
-    with open(DISTRICT_JSON_PATH, "w") as f:
-        json.dump(district_data, f, default=str, indent=4)
-    print(f"\n✅ District JSON refreshed at '{DISTRICT_JSON_PATH}'")
+    if ANALYSIS_ENGINE == "mongo":
+        from mongo_analysis import analyze_disease_patterns_pipeline
+        with metrics.span('analyze'):
+            db = get_db()
+            district_data = analyze_disease_patterns_pipeline(db.patients, db.disease_cases, clustered_df)
+        write_district_json(district_data)
+        return
+
+    # Aggregates only: no PII is fetched, so there is nothing to mask or unmask
+    df_patients, df_cases = fetch_analytics_data()
+    district_data = analyze_disease_patterns(df_patients, df_cases, clustered_df)
+    #print_summary(district_data)
+    write_district_json(district_data)
 
 # --- Main ---
 if __name__ == "__main__":
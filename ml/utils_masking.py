@@ -1,32 +1,133 @@
 # ml/utils_masking.py
+import os
+import sys
 import hashlib
-import random
 import string
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 
 # Fields we want to mask
 MASK_FIELDS = ['patient_id', 'name', 'age', 'address']
 
-def mask_patient_data(df):
+# Hashing is spread over processes only when there are enough distinct values to pay for it
+PARALLEL_MIN_VALUES = 100_000
+MASK_WORKERS = int(os.getenv("MASK_WORKERS", os.cpu_count() or 1))
+
+ALPHABET = np.frombuffer((string.ascii_letters + string.digits).encode(), dtype=np.uint8)
+
+# Masked tokens are sha256[:20] (80 bits): a value gets the same token whatever
+# else is in the batch. 10 chars (40 bits) already collided at ~1M distinct names;
+# at 80 bits even 100M distinct values have odds of about 4e-9.
+TOKEN_LENGTH = 20
+
+class FieldMask:
+    """
+    Reversible mapping for one field: an index of masked tokens and the raw
+    values in the same order. Lookups go through the index's hash table, built
+    on first use and kept with the mask.
+    """
+    __slots__ = ('tokens', 'values')
+
+    def __init__(self, tokens, values):
+        tokens = pd.Index(np.asarray(tokens, dtype=object))
+        # Values that print the same (30 and '30') share a token; the first one wins
+        first = ~tokens.duplicated()
+        self.tokens = tokens[first]
+        self.values = np.asarray(values, dtype=object)[first]
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def lookup(self, masked):
+        """
+        Raw values for an array of masked tokens; unknown tokens are returned unchanged.
+        """
+        masked = np.asarray(masked, dtype=object)
+        result = masked.copy()
+        if len(self.tokens) == 0 or len(masked) == 0:
+            return result
+        idx = self.tokens.get_indexer(masked)
+        hit = idx >= 0
+        result[hit] = self.values[idx[hit]]
+        return result
+
+    def nbytes(self):
+        """
+        Tokens plus the raw values: both are object arrays that only hold
+        pointers, so the Python objects they point at are counted too.
+        """
+        return (self.tokens.memory_usage(deep=True) + self.values.nbytes
+                + sum(sys.getsizeof(v) for v in self.values))
+
+class MaskMap(dict):
+    """
+    {field: FieldMask}. Kept per field so equal values in different fields
+    (e.g. an age and a patient_id) can't collide onto one key.
+    """
+
+    def nbytes(self):
+        return sum(field_mask.nbytes() for field_mask in self.values())
+
+def _hash_values(values):
+    return [hashlib.sha256(str(val).encode()).hexdigest()[:TOKEN_LENGTH] for val in values]
+
+def hash_values(values, workers=MASK_WORKERS):
+    """
+    Masked token for each distinct value, split across processes for large inputs.
+    """
+    if workers <= 1 or len(values) < PARALLEL_MIN_VALUES:
+        digests = _hash_values(values)
+    else:
+        chunks = np.array_split(np.asarray(values, dtype=object), workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            digests = []
+            for part in pool.map(_hash_values, chunks):
+                digests.extend(part)
+
+    tokens = np.array(digests, dtype=f'U{TOKEN_LENGTH}')
+    # Two values on one token would unmask to the wrong person; never let it pass silently
+    # (values with the same str(), like 30 and '30', share a token by design)
+    if len(pd.unique(tokens)) != len(pd.unique(np.array([str(v) for v in values], dtype=object))):
+        raise ValueError(f"sha256[:{TOKEN_LENGTH}] collision between distinct masked values")
+    return tokens
+
+def random_strings(lengths, rng=None):
+    """
+    One random alphanumeric string per entry of `lengths`, drawn in a single batch.
+    """
+    rng = rng or np.random.default_rng()
+    lengths = np.asarray(lengths, dtype=np.int64)
+    chars = ALPHABET[rng.integers(0, len(ALPHABET), int(lengths.sum()))].tobytes().decode('ascii')
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    return [chars[s:e] for s, e in zip(starts.tolist(), ends.tolist())]
+
+def mask_patient_data(df, workers=MASK_WORKERS):
     """
     Mask sensitive fields in patient DataFrame.
     Returns masked DataFrame and a mapping for unmasking.
     """
     df = df.copy()
-    mask_map = {}
+    mask_map = MaskMap()
 
     for field in MASK_FIELDS:
-        if field in df.columns:
-            masked_values = []
-            for val in df[field]:
-                if field == 'address':
-                    # replace with a random string of similar length
-                    masked_val = ''.join(random.choices(string.ascii_letters + string.digits, k=max(5, len(str(val)))))
-                else:
-                    # hash name, patient_id, age
-                    masked_val = hashlib.sha256(str(val).encode()).hexdigest()[:10]
-                masked_values.append(masked_val)
-                mask_map[masked_val] = val
-            df[field] = masked_values
+        if field not in df.columns:
+            continue
+        column = df[field].to_numpy(dtype=object)
+        if field == 'address':
+            # replace with a random string of similar length
+            lengths = np.maximum(5, pd.Series(column).astype(str).str.len().to_numpy())
+            masked = np.array(random_strings(lengths), dtype=object)
+            mask_map[field] = FieldMask(masked, column)
+        else:
+            # hash name, patient_id, age -- once per distinct value
+            codes, uniques = pd.factorize(column, use_na_sentinel=False)
+            uniques = np.asarray(uniques, dtype=object)
+            hashed = hash_values(uniques, workers)
+            masked = hashed[codes].astype(object)
+            mask_map[field] = FieldMask(hashed, uniques)
+        df[field] = masked
 
     return df, mask_map
 
@@ -36,6 +137,7 @@ def unmask_patient_data(df, mask_map):
     """
     df = df.copy()
     for field in MASK_FIELDS:
-        if field in df.columns:
-            df[field] = df[field].apply(lambda x: mask_map.get(x, x))
+        if field in df.columns and field in mask_map:
+            raw = mask_map[field].lookup(df[field].to_numpy(dtype=object))
+            df[field] = pd.Series(raw, index=df.index).infer_objects()
     return df
@@ -6,11 +6,28 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from faker import Faker
 
 load_dotenv()
 fake = Faker('en_IN')
 
+DISEASES = {
+    'water_borne': ['Cholera', 'Typhoid', 'Hepatitis A', 'Diarrhea'],
+    'vector_borne': ['Dengue', 'Chikungunya', 'Malaria'],
+    'respiratory': ['Tuberculosis', 'Pneumonia', 'Bronchitis']
+}
+DISEASE_CATEGORIES = list(DISEASES)
+GENDERS = np.array(['Male', 'Female'], dtype=object)
+SEVERITIES = np.array(['Mild', 'Moderate', 'Severe'], dtype=object)
+
+# Patient names are drawn from a pool generated once; Faker is far too slow per record
+NAME_POOL_SIZE = 5000
+INSERT_BATCH_SIZE = 10000
+INSERT_WORKERS = int(os.getenv("INSERT_WORKERS", 8))
+
 class KeralaHealthAtlasSetup:
     def __init__(self):
         self.connection_string = os.getenv('MONGODB_CONNECTION_STRING')
@@ -88,104 +105,139 @@ class KeralaHealthAtlasSetup:
         self.hospitals.insert_many(hospitals)
         print(f"✅ Generated {len(hospitals)} hospitals")
 
-    def generate_disease_data(self, months=6):
+    def _load_tables(self):
+        # Districts and their hospitals are read once, not per simulated day
+        districts = list(self.districts.find())
+        hospitals_by_district = defaultdict(list)
+        for hospital in self.hospitals.find({}, {'hospital_id': 1, 'district': 1}):
+            hospitals_by_district[hospital['district']].append(hospital['hospital_id'])
+        return [d for d in districts if hospitals_by_district[d['district_name']]], hospitals_by_district
+
+    def _insert_batch(self, patients_batch, cases_batch):
+        self.patients.insert_many(patients_batch, ordered=False)
+        self.disease_cases.insert_many(cases_batch, ordered=False)
+        return len(patients_batch)
+
+    def generate_disease_data(self, months=6, scale=1.0, seed=None, workers=INSERT_WORKERS):
+        """
+        Simulate daily cases per district. Each day's patients and cases are drawn
+        in NumPy batches and inserted unordered from a thread pool.
+        `scale` multiplies the daily case counts (scale=100 gives ~10M cases over 6 months).
+        """
         self.patients.delete_many({})
         self.disease_cases.delete_many({})
-        diseases = {
-            'water_borne': ['Cholera', 'Typhoid', 'Hepatitis A', 'Diarrhea'],
-            'vector_borne': ['Dengue', 'Chikungunya', 'Malaria'],
-            'respiratory': ['Tuberculosis', 'Pneumonia', 'Bronchitis']
-        }
+        rng = np.random.default_rng(seed)
+
+        district_docs, hospitals_by_district = self._load_tables()
+        if not district_docs:
+            print("⚠️ No districts with hospitals, nothing to generate")
+            return
+        names = np.array([d['district_name'] for d in district_docs], dtype=object)
+        pop_factor = np.array([d['demographics']['population_2023'] for d in district_docs]) / 1000000
+        overall_risk = np.array([d['risk_ratings']['overall_risk'] for d in district_docs], dtype=float)
+        water_risk = np.array([d['risk_ratings']['water_risk'] for d in district_docs], dtype=float)
+        crowding_risk = np.array([d['risk_ratings']['crowding_risk'] for d in district_docs], dtype=float)
+        migrant_prob = np.minimum(0.4, np.array([d['demographics']['migrant_density_per_1000'] for d in district_docs]) / 200)
+        risk_at_admission = [
+            {'water_risk': d['risk_ratings']['water_risk'], 'crowding_risk': d['risk_ratings']['crowding_risk'],
+             'overall_risk': d['risk_ratings']['overall_risk']}
+            for d in district_docs
+        ]
+        hospital_ids = [np.array(hospitals_by_district[name], dtype=object) for name in names]
+        hospital_counts = np.array([len(ids) for ids in hospital_ids])
+        # All hospitals in one array, addressed as offset[district] + index within the district
+        hospital_pool = np.concatenate(hospital_ids)
+        hospital_offsets = np.concatenate([[0], np.cumsum(hospital_counts)[:-1]])
+
+        name_pool = np.array([fake.name() for _ in range(NAME_POOL_SIZE)], dtype=object)
+        disease_names = np.array([d for category in DISEASE_CATEGORIES for d in DISEASES[category]], dtype=object)
+        disease_category = np.array([category for category in DISEASE_CATEGORIES for _ in DISEASES[category]], dtype=object)
+        category_start = np.cumsum([0] + [len(DISEASES[c]) for c in DISEASE_CATEGORIES])[:-1]
+        category_size = np.array([len(DISEASES[c]) for c in DISEASE_CATEGORIES])
 
         end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         start_date = end_date - timedelta(days=30*months)
-        patient_id, case_id = 1, 1
+        next_id = 1
+        total_generated = 0
         patients_batch, cases_batch = [], []
+        pending = set()
 
-        current_date = start_date
-        total_generated = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            def collect(done):
+                nonlocal total_generated
+                # Counted only once a batch has actually been written
+                for future in done:
+                    total_generated += future.result()
+                print(f"🩺 Inserted {total_generated} patients and cases so far...")
+
+            def submit():
+                nonlocal patients_batch, cases_batch, pending
+                # Bound the batches held in memory to a couple per worker
+                while len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(pool.submit(self._insert_batch, patients_batch, cases_batch))
+                patients_batch, cases_batch = [], []
+
+            current_date = start_date
+            while current_date <= end_date:
+                daily_cases = np.maximum(5, (rng.uniform(20, 50, len(names)) * pop_factor * (0.5 + overall_risk / 10) * scale).astype(int))
+                n = int(daily_cases.sum())
+                district = np.repeat(np.arange(len(names)), daily_cases)
+
+                hospital = hospital_pool[hospital_offsets[district] + (rng.random(n) * hospital_counts[district]).astype(int)]
+                is_migrant = rng.random(n) < migrant_prob[district]
+                ages = np.maximum(1, rng.normal(35, 20, n).astype(int))
+                genders = GENDERS[rng.integers(0, 2, n)]
+                patient_names = name_pool[rng.integers(0, NAME_POOL_SIZE, n)]
+                # Water-borne first, then vector-borne, otherwise respiratory
+                category = np.where(rng.random(n) < water_risk[district] / 20, 0,
+                                    np.where(rng.random(n) < crowding_risk[district] / 20, 1, 2))
+                disease = category_start[category] + (rng.random(n) * category_size[category]).astype(int)
+                severity = SEVERITIES[rng.integers(0, len(SEVERITIES), n)]
+                ids = range(next_id, next_id + n)
+                next_id += n
 
-        while current_date <= end_date:
-            for district_doc in self.districts.find():
-                district = district_doc['district_name']
-                hospitals = list(self.hospitals.find({'district': district}))
-                if not hospitals:
-                    continue
-
-                pop_factor = district_doc['demographics']['population_2023'] / 1000000
-                risk_factor = district_doc['risk_ratings']['overall_risk'] / 10
-                daily_cases = max(5, int(random.uniform(20, 50) * pop_factor * (0.5 + risk_factor)))
-
-                for _ in range(daily_cases):
-                    hospital = random.choice(hospitals)
-                    migrant_prob = min(0.4, district_doc['demographics']['migrant_density_per_1000'] / 200)
-                    is_migrant = random.random() < migrant_prob
-
-                    patient = {
-                        'patient_id': f"KL{patient_id:08d}",
-                        'name': fake.name(),
-                        'age': max(1, int(np.random.normal(35, 20))),
-                        'gender': random.choice(['Male', 'Female']),
-                        'district': district,
-                        'is_migrant': is_migrant,
+                for pid, d, name, age, gender, migrant, hosp, dis, sev in zip(
+                        ids, district.tolist(), patient_names.tolist(), ages.tolist(), genders.tolist(),
+                        is_migrant.tolist(), hospital.tolist(), disease.tolist(), severity.tolist()):
+                    patient_id = f"KL{pid:08d}"
+                    patients_batch.append({
+                        'patient_id': patient_id,
+                        'name': name,
+                        'age': age,
+                        'gender': gender,
+                        'district': names[d],
+                        'is_migrant': migrant,
                         'created_at': current_date
-                    }
-                    patients_batch.append(patient)
-
-                    # Disease selection
-                    water_risk = district_doc['risk_ratings']['water_risk']
-                    crowding_risk = district_doc['risk_ratings']['crowding_risk']
-                    if random.random() < (water_risk / 20):
-                        disease = random.choice(diseases['water_borne'])
-                        category = 'water_borne'
-                    elif random.random() < (crowding_risk / 20):
-                        disease = random.choice(diseases['vector_borne'])
-                        category = 'vector_borne'
-                    else:
-                        disease = random.choice(diseases['respiratory'])
-                        category = 'respiratory'
-
-                    case = {
-                        'case_id': f"CASE{case_id:08d}",
-                        'patient_id': patient['patient_id'],
-                        'hospital_id': hospital['hospital_id'],
-                        'district': district,
-                        'disease_name': disease,
-                        'disease_category': category,
+                    })
+                    cases_batch.append({
+                        'case_id': f"CASE{pid:08d}",
+                        'patient_id': patient_id,
+                        'hospital_id': hosp,
+                        'district': names[d],
+                        'disease_name': disease_names[dis],
+                        'disease_category': disease_category[dis],
                         'admission_date': current_date,
-                        'is_migrant_patient': is_migrant,
-                        'severity': random.choice(['Mild', 'Moderate', 'Severe']),
+                        'is_migrant_patient': migrant,
+                        'severity': sev,
                         'outcome': 'Recovered',
-                        'district_risk_at_admission': {
-                            'water_risk': water_risk,
-                            'crowding_risk': crowding_risk,
-                            'overall_risk': district_doc['risk_ratings']['overall_risk']
-                        },
+                        'district_risk_at_admission': risk_at_admission[d],
                         'created_at': current_date
-                    }
-                    cases_batch.append(case)
-
-                    patient_id += 1
-                    case_id += 1
-                    total_generated += 1
-
-                    if len(patients_batch) >= 5000:  # insert in big batches for performance
-                        self.patients.insert_many(patients_batch)
-                        self.disease_cases.insert_many(cases_batch)
-                        patients_batch, cases_batch = [], []
-
-                        print(f"🩺 Inserted {total_generated} patients and cases so far...")
+                    })
+                    if len(patients_batch) >= INSERT_BATCH_SIZE:
+                        submit()
 
-            current_date += timedelta(days=1)
-            if (current_date - start_date).days % 30 == 0:
-                print(f"📅 Data generated up to {current_date.strftime('%Y-%m-%d')}")
+                current_date += timedelta(days=1)
+                if (current_date - start_date).days % 30 == 0:
+                    print(f"📅 Data generated up to {current_date.strftime('%Y-%m-%d')}")
 
-        # Insert remaining
-        if patients_batch:
-            self.patients.insert_many(patients_batch)
-            self.disease_cases.insert_many(cases_batch)
+            # Insert remaining
+            if patients_batch:
+                submit()
+            collect(pending)
 
-        print(f"✅ Total generated: {self.patients.count_documents({})} patients and {self.disease_cases.count_documents({})} disease cases")
+        print(f"✅ Total generated: {self.patients.estimated_document_count()} patients and {self.disease_cases.estimated_document_count()} disease cases")
 
     def validate_correlations(self):
         print("\n🔍 Validating correlations...")
@@ -201,13 +253,22 @@ class KeralaHealthAtlasSetup:
         for r in results[:5]:
             print(f"  {r['_id']}: {r['cases']} cases (Water Risk: {r['avg_water_risk']:.1f})")
 
-def run_full_setup():
+def run_full_setup(months=6, scale=1.0, seed=None, workers=INSERT_WORKERS):
+    if seed is not None:
+        random.seed(seed)
+        Faker.seed(seed)
     atlas = KeralaHealthAtlasSetup()
     atlas.load_district_data()
     atlas.generate_hospitals()
-    atlas.generate_disease_data(months=6)
+    atlas.generate_disease_data(months=months, scale=scale, seed=seed, workers=workers)
     atlas.validate_correlations()
     print("🎉 MongoDB Atlas setup complete!")
 
 if __name__ == "__main__":
-    run_full_setup()
+    parser = argparse.ArgumentParser(description="Load districts and generate synthetic hospitals, patients and cases")
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on daily case counts")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=INSERT_WORKERS, help="concurrent insert_many threads")
+    args = parser.parse_args()
+    run_full_setup(months=args.months, scale=args.scale, seed=args.seed, workers=args.workers)
@@ -0,0 +1,254 @@
+# mongo_scripts/export_data.py
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, date
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from bson import ObjectId, json_util
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../ml")))
+from utils_masking import MASK_FIELDS, mask_patient_data
+
+load_dotenv()
+
+COLLECTIONS = ['patients', 'disease_cases']
+# Documents per output file: also the masking batch, so it bounds memory per worker
+CHUNK_SIZE = 50_000
+# _id ranges per collection; several per worker keeps the pool busy when sizes differ
+PARTITIONS_PER_WORKER = 2
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", 4))
+MANIFEST = "manifest.json"
+FORMATS = {'ndjson': '.ndjson.gz', 'parquet': '.parquet'}
+
+class ExportMismatchError(ValueError):
+    pass
+
+def _json_default(value):
+    # Relaxed extended JSON for the BSON types that show up in these collections
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    if isinstance(value, (datetime, date)):
+        return {'$date': value.isoformat()}
+    return json_util.default(value)
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(json_util.dumps(data, indent=2))
+    os.replace(tmp, path)
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json_util.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+# --- Partitioning ---
+def plan_partitions(collection, n_partitions):
+    """
+    Split a collection into roughly equal _id ranges [lo, hi) by walking the _id
+    index. None means unbounded. Boundaries are stored in the manifest, so a
+    resumed export uses the same ranges.
+    """
+    count = collection.estimated_document_count()
+    step = count // n_partitions
+    bounds = []
+    if step > 0:
+        for i in range(1, n_partitions):
+            doc = next(iter(collection.find({}, {'_id': 1}).sort('_id', 1).skip(i * step).limit(1)), None)
+            if doc is not None and (not bounds or doc['_id'] > bounds[-1]):
+                bounds.append(doc['_id'])
+    edges = [None] + bounds + [None]
+    return [{'lo': lo, 'hi': hi} for lo, hi in zip(edges[:-1], edges[1:])]
+
+# --- Chunks ---
+def mask_batch(docs):
+    """
+    Mask MASK_FIELDS in place for a batch of documents with one mask_patient_data call.
+    Tokens are deterministic hashes, so the same patient_id masks the same way in
+    every chunk and collection.
+    """
+    fields = [field for field in MASK_FIELDS if any(field in doc for doc in docs)]
+    if not fields:
+        return docs
+    # object dtype keeps ints as ints (35, not 35.0), so tokens match train_model's masking
+    df = pd.DataFrame({field: [doc.get(field) for doc in docs] for field in fields}, dtype=object)
+    # One chunk is far below utils_masking's parallel threshold; stay in this thread
+    masked, _ = mask_patient_data(df, workers=1)
+    columns = {field: masked[field].tolist() for field in fields}
+    for i, doc in enumerate(docs):
+        for field in fields:
+            if field in doc:
+                doc[field] = columns[field][i]
+    return docs
+
+def write_chunk(path, docs, fmt):
+    tmp = path + ".tmp"
+    if fmt == 'parquet':
+        df = pd.DataFrame.from_records(docs)
+        for column in df.columns:
+            if df[column].map(lambda v: isinstance(v, ObjectId)).any():
+                df[column] = df[column].map(lambda v: str(v) if isinstance(v, ObjectId) else v)
+        df.to_parquet(tmp, index=False)
+    else:
+        with gzip.open(tmp, 'wb', compresslevel=6) as f:
+            f.write(''.join(json.dumps(doc, default=_json_default, separators=(',', ':')) + '\n'
+                            for doc in docs).encode())
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+class Exporter:
+    """
+    Export collections into fixed-size compressed chunks, one _id partition per
+    task. Each partition streams its range in _id order and records the last
+    exported _id after every chunk, so an interrupted run resumes from the next
+    chunk instead of the start.
+    """
+
+    def __init__(self, db, output_dir, fmt='ndjson', mask=True, chunk_size=CHUNK_SIZE, workers=EXPORT_WORKERS):
+        self.db = db
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.mask = mask
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self._lock = threading.Lock()
+        self.exported = 0
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.output_dir, MANIFEST)
+
+    def _progress_path(self, name, index):
+        return os.path.join(self.output_dir, name, f"part-{index:03d}.progress.json")
+
+    def load_or_plan(self, collections):
+        options = {'format': self.fmt, 'masked': self.mask, 'chunk_size': self.chunk_size}
+        manifest = _read_json(self.manifest_path)
+        if manifest is not None:
+            if manifest['options'] != options or sorted(manifest['collections']) != sorted(collections):
+                raise ExportMismatchError(f"'{self.output_dir}' holds an export with different options "
+                                          f"{manifest['options']}; remove it or pick another --output")
+            print(f"⏩ Resuming export in '{self.output_dir}'")
+            return manifest
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        n_partitions = max(1, self.workers * PARTITIONS_PER_WORKER)
+        manifest = {
+            'options': options,
+            'started_at': datetime.now().isoformat(),
+            'complete': False,
+            'collections': {name: {'partitions': plan_partitions(self.db[name], n_partitions)} for name in collections}
+        }
+        for name in collections:
+            os.makedirs(os.path.join(self.output_dir, name), exist_ok=True)
+        _write_json(self.manifest_path, manifest)
+        return manifest
+
+    def export_partition(self, name, index, bounds):
+        progress_path = self._progress_path(name, index)
+        progress = _read_json(progress_path) or {'last_id': None, 'files': [], 'documents': 0, 'bytes': 0, 'done': False}
+        if progress['done']:
+            return progress
+
+        query = {}
+        if bounds['lo'] is not None:
+            query['$gte'] = bounds['lo']
+        if bounds['hi'] is not None:
+            query['$lt'] = bounds['hi']
+        if progress['last_id'] is not None:
+            query.pop('$gte', None)
+            query['$gt'] = progress['last_id']
+        cursor = self.db[name].find({'_id': query} if query else {}).sort('_id', 1).batch_size(min(self.chunk_size, 10_000))
+
+        def flush(docs):
+            if self.mask:
+                mask_batch(docs)
+            filename = f"part-{index:03d}-{len(progress['files']):05d}{FORMATS[self.fmt]}"
+            size = write_chunk(os.path.join(self.output_dir, name, filename), docs, self.fmt)
+            # The chunk is in place before the progress that points past it
+            progress['last_id'] = docs[-1]['_id']
+            progress['files'].append(filename)
+            progress['documents'] += len(docs)
+            progress['bytes'] += size
+            _write_json(progress_path, progress)
+            with self._lock:
+                self.exported += len(docs)
+                print(f"📦 {name} part {index}: {progress['documents']:,} documents ({self.exported:,} exported this run)")
+
+        docs = []
+        for doc in cursor:
+            docs.append(doc)
+            if len(docs) == self.chunk_size:
+                flush(docs)
+                docs = []
+        if docs:
+            flush(docs)
+        progress['done'] = True
+        _write_json(progress_path, progress)
+        return progress
+
+    def run(self, collections=COLLECTIONS):
+        manifest = self.load_or_plan(collections)
+        start = time.perf_counter()
+        tasks = [(name, index, bounds)
+                 for name in collections
+                 for index, bounds in enumerate(manifest['collections'][name]['partitions'])]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda task: self.export_partition(*task), tasks))
+
+        for name in collections:
+            parts = [progress for (task_name, _, _), progress in zip(tasks, results) if task_name == name]
+            manifest['collections'][name].update({
+                'documents': sum(p['documents'] for p in parts),
+                'bytes': sum(p['bytes'] for p in parts),
+                'files': [os.path.join(name, f) for p in parts for f in p['files']]
+            })
+        manifest['complete'] = True
+        manifest['finished_at'] = datetime.now().isoformat()
+        _write_json(self.manifest_path, manifest)
+
+        elapsed = time.perf_counter() - start
+        for name in collections:
+            info = manifest['collections'][name]
+            print(f"✅ {name}: {info['documents']:,} documents in {len(info['files'])} files ({info['bytes'] / 1e6:,.1f} MB)")
+        print(f"✅ Exported {self.exported:,} documents this run in {elapsed:.1f}s -> '{self.output_dir}'")
+        return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Export patients and disease_cases as masked, compressed, resumable chunks")
+    parser.add_argument("--output", default="export", help="output directory; rerun with the same one to resume")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--collections", nargs="+", choices=COLLECTIONS, default=COLLECTIONS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="documents per output file")
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS, help="concurrent partition cursors")
+    parser.add_argument("--raw", action="store_true", help=f"skip masking of {', '.join(MASK_FIELDS)}")
+    args = parser.parse_args()
+
+    if args.format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            sys.exit("❌ Parquet export needs pyarrow: pip install pyarrow")
+
+    connection_string = os.getenv('MONGODB_CONNECTION_STRING')
+    if not connection_string:
+        raise ValueError("Set MONGODB_CONNECTION_STRING in .env")
+    client = MongoClient(connection_string)
+    exporter = Exporter(client.kerala_health_system, args.output, fmt=args.format, mask=not args.raw,
+                        chunk_size=args.chunk_size, workers=args.workers)
+    try:
+        exporter.run(args.collections)
+    except ExportMismatchError as e:
+        sys.exit(f"❌ {e}")
+
+if __name__ == "__main__":
+    main()